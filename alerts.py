@@ -0,0 +1,158 @@
+import json, os, subprocess, time
+from datetime import datetime
+from storage import parse_duration, write_json_atomically
+
+ALERTS_FILE = "alert_rules.json"
+ALERTS_LOG_FILE = "screen_time_alerts.log"
+ACTIONS = ("log", "command", "notify")
+
+class Rule:
+	"""
+	A daily budget for a process: once the process has run limit seconds on a day, the rule's action is run. The
+	action is "log" (a line appended to file, or to the alerts log), "command" (command is run, as a list of
+	arguments or a shell command line) or "notify" (a json notification is written to file). A rule fires at most
+	once every cooldown seconds, however often its limit is crossed.
+	"""
+
+	def __init__(self, name, process, limit, action="log", command=None, file=None, cooldown=3600):
+		self.name = name
+		self.process = process
+		self.limit = limit
+		self.action = action
+		self.command = command
+		self.file = file
+		self.cooldown = cooldown
+
+	@property
+	def key(self):
+		"""Identifies the crossing state of a rule. A rule whose limit is changed starts over."""
+		return (self.name, self.process, self.limit)
+
+def parse_rule(rule_data):
+	"""Returns the Rule described by a dictionary of the rules file, or None if it isn't a valid rule"""
+	if type(rule_data) != dict or type(rule_data.get("process")) != str:
+		return None
+	try:
+		limit = parse_duration(rule_data.get("limit"))
+		cooldown = parse_duration(rule_data.get("cooldown", 3600))
+	except (ValueError, AttributeError):
+		return None
+	action = rule_data.get("action", "log")
+	if type(limit) != int or limit <= 0 or type(cooldown) != int or action not in ACTIONS:
+		return None
+	if action == "command" and type(rule_data.get("command")) not in (str, list):
+		return None
+	if action == "notify" and type(rule_data.get("file")) != str:
+		return None
+	name = rule_data.get("name") or f"{rule_data['process']} {rule_data['limit']}"
+	return Rule(name, rule_data["process"], limit, action, rule_data.get("command"), rule_data.get("file"), cooldown)
+
+def load_rules(file_name=ALERTS_FILE):
+	"""
+	Returns the rules in the rules file, a json list of {"name", "process", "limit", "action", "command", "file",
+	"cooldown"} dictionaries. Durations are seconds or "H:MM". Invalid rules are left out and there are no rules if
+	the file doesn't exist or isn't valid, so a mistake in the file never stops the monitor.
+	"""
+	try:
+		with open(file_name) as file:
+			rules_data = json.load(file)
+	except (FileNotFoundError, json.decoder.JSONDecodeError):
+		return []
+	if type(rules_data) != list:
+		return []
+	return [rule for rule in map(parse_rule, rules_data) if rule is not None]
+
+def format_duration(seconds):
+	return f"{seconds // 3600}:{seconds % 3600 // 60:02}"
+
+class AlertEngine:
+	"""
+	Evaluates the rules as time is credited. Rules are indexed by process so a credit only looks at the rules of its
+	own process, and the counter of a rule is the process's time for the day, which the monitor keeps anyway. A rule
+	fires when the counter crosses its limit and not again that day. The actions of the rules that fired are kept in
+	self.pending so they can be run outside of the tick. When log_only is set, as it is in a replay, the actions that
+	would run a command or write a notification are only written to the alerts log.
+	"""
+
+	def __init__(self, rules=(), log_file=ALERTS_LOG_FILE, clock=time):
+		self.log_file = log_file
+		self.clock = clock
+		self.rules = {} # {process: [rules]}
+		self.date = None # Date the crossings in self.fired happened on
+		self.fired = set() # Keys of the rules that crossed their limit on self.date
+		self.last_fired = {} # {rule name: timestamp} of the last time each rule's action was run
+		self.pending = [] # (rule, seconds, timestamp) of the actions waiting to be run
+		self.log_only = False # True when the command and notify actions are logged instead of run
+		self.set_rules(rules)
+
+	def set_rules(self, rules):
+		"""Replaces the rules. Rules that didn't change keep whether they fired today."""
+		self.rules = {}
+		for rule in rules:
+			self.rules.setdefault(rule.process, []).append(rule)
+		self.fired.intersection_update(rule.key for rule in rules)
+
+	def prime(self, date, processes_data):
+		"""
+		Marks the rules whose process is already over its limit on date as fired. It's called when the program starts
+		so a restart doesn't run the actions of the limits crossed before it again.
+		"""
+		self.date = date
+		self.fired = {
+			rule.key for process, rules in self.rules.items() for rule in rules
+			if process in processes_data and processes_data[process][1] >= rule.limit
+		}
+
+	def update(self, date, process, seconds):
+		"""Checks the rules of process now that it has run seconds on date. It's called for every credit so it's O(1)."""
+		rules = self.rules.get(process)
+		if not rules:
+			return
+		if date != self.date: # Every rule can fire again on a new day
+			self.date = date
+			self.fired = set()
+		for rule in rules:
+			if seconds < rule.limit or rule.key in self.fired:
+				continue
+			self.fired.add(rule.key)
+			now = self.clock.time()
+			last_fired = self.last_fired.get(rule.name)
+			if last_fired is not None and now - last_fired < rule.cooldown:
+				continue # Rate limited. The crossing still counts so it doesn't fire later the same day.
+			self.last_fired[rule.name] = now
+			self.pending.append((rule, seconds, now))
+
+	def take_pending(self):
+		pending, self.pending = self.pending, []
+		return pending
+
+	def run_actions(self, alerts):
+		"""Runs the actions of alerts, (rule, seconds, timestamp) tuples. Failures are written to the alerts log."""
+		for rule, seconds, timestamp in alerts:
+			try:
+				self.run_action(rule, seconds, timestamp)
+			except OSError as error:
+				self.log(f"{rule.name}: the {rule.action} action failed: {error}", timestamp)
+
+	def run_action(self, rule, seconds, timestamp):
+		message = f"{rule.name}: {rule.process} ran {format_duration(seconds)}, over its limit of {format_duration(rule.limit)}"
+		if rule.action == "log":
+			self.log(message, timestamp, rule.file)
+		elif self.log_only:
+			self.log(f"{message} (the {rule.action} action wasn't run)", timestamp)
+		elif rule.action == "notify":
+			write_json_atomically(
+				{"rule": rule.name, "process": rule.process, "seconds": seconds, "limit": rule.limit, "time": int(timestamp), "message": message},
+				rule.file
+			)
+		else:
+			environment = dict(
+				os.environ, SCREEN_TIME_RULE=rule.name, SCREEN_TIME_PROCESS=rule.process,
+				SCREEN_TIME_SECONDS=str(seconds), SCREEN_TIME_LIMIT=str(rule.limit)
+			)
+			# The command isn't waited for so a slow command never holds up the monitor
+			subprocess.Popen(rule.command, shell=type(rule.command) == str, env=environment)
+
+	def log(self, message, timestamp, file_name=None):
+		with open(file_name or self.log_file, "a") as file:
+			file.write(f"{datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
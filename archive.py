@@ -0,0 +1,207 @@
+import mmap, os, struct, sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date as Date, timedelta
+from storage import DATA_FILE, JOURNAL_FILE, JournalStore, write_text_atomically
+from histogram import BUCKETS, TYPE_CODE
+
+ARCHIVE_FILE = "screen_time_archive.bin"
+MAGIC = b"STAR"
+VERSION = 1
+# magic, version, number of dates, process names, rows and histograms, then the size of the name table in bytes
+HEADER = struct.Struct("<4sIIIIII")
+
+# The archive holds the days that are over as columns of little-endian uint32s after the header:
+#   name table      every process name once, as a uint16 length and utf-8 bytes, padded to a multiple of 4 bytes
+#   dates           date.toordinal() of each date in ascending order
+#   row starts      the first row of each date, followed by the number of rows
+#   name ids        index in the name table of each row's process
+#   seconds         the duration of each row
+#   histogram slots 1 + the index of each row's hourly histogram or 0 if the row has none
+#   histograms      BUCKETS uint32s per histogram
+# Every column has a fixed width so a date is found by a binary search over the dates and its rows are slices of the
+# other columns. Sessions aren't archived.
+
+def to_column(values):
+	"""Returns values as the bytes of a little-endian uint32 column"""
+	column = array(TYPE_CODE, values)
+	if sys.byteorder == "big":
+		column.byteswap()
+	return column.tobytes()
+
+def encode_names(names):
+	"""Returns the name table holding names"""
+	table = bytearray()
+	for name in names:
+		encoded = name.encode()
+		table += struct.pack("<H", len(encoded)) + encoded
+	table += bytes(-len(table) % 4)
+	return bytes(table)
+
+def write_archive(screen_time_data, file_name=ARCHIVE_FILE):
+	"""Writes screen_time_data, {date: {process: process_data}}, to an archive file and returns the number of rows written"""
+	name_ids, dates, row_starts, rows_names, rows_seconds, histogram_slots, histograms = {}, [], [], [], [], [], []
+	for date in sorted(screen_time_data):
+		dates.append(Date.fromisoformat(date).toordinal())
+		row_starts.append(len(rows_names))
+		for process, process_data in screen_time_data[date].items():
+			rows_names.append(name_ids.setdefault(process, len(name_ids))) # Each name is only stored once
+			rows_seconds.append(process_data[1])
+			if len(process_data) == 4:
+				histograms.extend(process_data[3])
+				histogram_slots.append(len(histograms) // BUCKETS)
+			else:
+				histogram_slots.append(0)
+	row_starts.append(len(rows_names))
+
+	names = encode_names(name_ids)
+	header = HEADER.pack(MAGIC, VERSION, len(dates), len(name_ids), len(rows_names), len(histograms) // BUCKETS, len(names))
+	write_text_atomically(b"".join((
+		header, names, to_column(dates), to_column(row_starts), to_column(rows_names), to_column(rows_seconds),
+		to_column(histogram_slots), to_column(histograms)
+	)), file_name)
+	return len(rows_names)
+
+class Archive:
+	"""
+	Reads an archive file through mmap. Columns are memoryviews of the mapped file so reading a date only touches the
+	pages of its rows and nothing is parsed but the name table. Archives are read-only and replaced as a whole.
+	"""
+
+	def __init__(self, file_name=ARCHIVE_FILE):
+		with open(file_name, "rb") as file:
+			self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		self.views = []
+		try:
+			if len(self.mmap) < HEADER.size:
+				raise ValueError("The archive is truncated")
+			magic, version, date_count, name_count, row_count, histogram_count, names_size = HEADER.unpack_from(self.mmap)
+			if magic != MAGIC or version != VERSION:
+				raise ValueError(f"{file_name} isn't a version {VERSION} screen time archive")
+			self.names = []
+			offset = HEADER.size
+			for _ in range(name_count):
+				(length,) = struct.unpack_from("<H", self.mmap, offset)
+				self.names.append(self.mmap[offset + 2:offset + 2 + length].decode())
+				offset += 2 + length
+			offset = HEADER.size + names_size
+			self.dates, offset = self.column(offset, date_count)
+			self.row_starts, offset = self.column(offset, date_count + 1)
+			self.name_ids, offset = self.column(offset, row_count)
+			self.seconds, offset = self.column(offset, row_count)
+			self.histogram_slots, offset = self.column(offset, row_count)
+			self.histograms, offset = self.column(offset, histogram_count * BUCKETS)
+		except Exception:
+			self.close()
+			raise
+		self.name_index = None # {name: id} made by the first read_process
+
+	def column(self, offset, count):
+		"""Returns a view of the count uint32s at offset and the offset that follows them"""
+		end = offset + 4 * count
+		if end > len(self.mmap):
+			raise ValueError("The archive is truncated")
+		if sys.byteorder == "big": # The columns are little-endian so they're copied and swapped
+			column = array(TYPE_CODE, self.mmap[offset:end])
+			column.byteswap()
+		else:
+			column = memoryview(self.mmap)[offset:end].cast(TYPE_CODE)
+			self.views.append(column)
+		return column, end
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def close(self):
+		for view in self.views:
+			view.release() # The mmap can't be closed while there are views of it
+		self.views = []
+		self.mmap.close()
+
+	@property
+	def first_date(self):
+		return str(Date.fromordinal(self.dates[0])) if len(self.dates) else None
+
+	@property
+	def last_date(self):
+		return str(Date.fromordinal(self.dates[-1])) if len(self.dates) else None
+
+	def date_span(self, start_date, end_date):
+		"""Returns the indices of the first date from start_date and of the first date after end_date"""
+		first = bisect_left(self.dates, Date.fromisoformat(start_date).toordinal())
+		return first, bisect_right(self.dates, Date.fromisoformat(end_date).toordinal(), first)
+
+	def process_data(self, row):
+		"""Returns a row as the [running, seconds, sessions(, histogram)] data the rest of the program uses"""
+		slot = self.histogram_slots[row]
+		if not slot:
+			return [False, self.seconds[row], []]
+		return [False, self.seconds[row], [], array(TYPE_CODE, self.histograms[(slot - 1) * BUCKETS:slot * BUCKETS])]
+
+	def read_range(self, start_date, end_date):
+		"""Returns a dictionary of the data for each date from start_date to end_date (both inclusive)"""
+		screen_time_data = {}
+		first, last = self.date_span(start_date, end_date)
+		for index in range(first, last):
+			rows = range(self.row_starts[index], self.row_starts[index + 1])
+			screen_time_data[str(Date.fromordinal(self.dates[index]))] = {
+				self.names[self.name_ids[row]]: self.process_data(row) for row in rows
+			}
+		return screen_time_data
+
+	def read_date(self, date):
+		"""Returns the data of every process for date or None if the archive has no record for date"""
+		return self.read_range(date, date).get(date)
+
+	def read_process(self, process, start_date, end_date):
+		"""Returns a dictionary of process's data for each date from start_date to end_date that it has a record for"""
+		if self.name_index is None:
+			self.name_index = {name: name_id for name_id, name in enumerate(self.names)}
+		name_id = self.name_index.get(process)
+		if name_id is None:
+			return {}
+		screen_time_data = {}
+		first, last = self.date_span(start_date, end_date)
+		for index in range(first, last):
+			for row in range(self.row_starts[index], self.row_starts[index + 1]):
+				if self.name_ids[row] == name_id:
+					screen_time_data[str(Date.fromordinal(self.dates[index]))] = {process: self.process_data(row)}
+					break
+		return screen_time_data
+
+	def load(self):
+		"""Returns the data of every date in the archive"""
+		if not len(self.dates):
+			return {}
+		return self.read_range(self.first_date, self.last_date)
+
+def with_archive(read_range, archive):
+	"""
+	Returns a read_range(first_date, last_date) that reads the dates up to the archive's last date from the archive and
+	only calls read_range for the dates after it.
+	"""
+	def read_archived_range(first_date, last_date):
+		screen_time_data = archive.read_range(first_date, last_date)
+		if archive.last_date is None or last_date > archive.last_date:
+			if archive.last_date is not None:
+				first_date = max(first_date, str(Date.fromisoformat(archive.last_date) + timedelta(days=1)))
+			screen_time_data.update(read_range(first_date, last_date))
+		return screen_time_data
+	return read_archived_range
+
+def convert_json_to_archive(data_file=DATA_FILE, journal_file=JOURNAL_FILE, archive_file=ARCHIVE_FILE, before=None):
+	"""
+	Adds the dates before before (every date if it's None) of the screen time data saved by a JournalStore to the
+	archive, keeping the dates the archive already holds that aren't in the json file. Returns the number of rows written.
+	"""
+	screen_time_data = {}
+	if os.path.exists(archive_file):
+		with Archive(archive_file) as archive:
+			screen_time_data = archive.load()
+	for date, processes_data in JournalStore(data_file, journal_file).load().items():
+		if before is None or date < before:
+			screen_time_data[date] = processes_data
+	return write_archive(screen_time_data, archive_file)
@@ -0,0 +1,205 @@
+"""
+Benchmarks the background process and the CLI against synthetic data: a process listing with thousands of entries,
+hundreds of target processes and a multi-year screen_time_data.json. Every benchmark runs in a temporary directory so
+the real data files are never touched. Results are printed (or written with --output) as json, e.g
+
+	python benchmark.py --processes 10000 --targets 300 --years 3 --output bench_output.txt
+	python benchmark.py --compare bench_output.txt
+"""
+import argparse, json, os, sys, tempfile, time, tracemalloc, random, io, contextlib
+from datetime import date, timedelta
+
+def generate_targets(count):
+	"""Returns count target process names. One in twenty is a glob pattern."""
+	targets = []
+	for i in range(count):
+		targets.append(f"plugin_host_{i}-*.exe" if i % 20 == 0 else f"app_{i}.exe")
+	return targets
+
+def generate_process_names(count, targets, seed=0):
+	"""Returns count running process names where about a third of the targets are running, some more than once"""
+	generator = random.Random(seed)
+	running = [target.replace("*", "3.8") for target in targets if generator.random() < 0.33]
+	names = [f"service_{i}.exe" for i in range(max(0, count - len(running) * 2))]
+	names.extend(running * 2) # multiple instances of each running target
+	generator.shuffle(names)
+	return names[:count]
+
+def generate_tasklist_output(process_names):
+	"""Returns the output tasklist would print for process_names"""
+	return "".join(f'"{name}","{pid}","Console","1","{pid % 90000:,} K"\n' for pid, name in enumerate(process_names, 1000))
+
+def generate_history(years, targets, end_date=None, seed=0):
+	"""Returns screen time data with an entry for every target on every day of the given number of years"""
+	generator = random.Random(seed)
+	end_date = end_date or date.today()
+	screen_time_data = {}
+	for day in range(years * 365, -1, -1):
+		current_date = str(end_date - timedelta(days=day))
+		screen_time_data[current_date] = {target: [False, generator.randrange(0, 8 * 3600, 60), []] for target in targets}
+	return screen_time_data
+
+def percentile(sorted_values, fraction):
+	return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def measure(function, repeat, setup=None):
+	"""
+	Times repeat calls of function and returns their latency percentiles, throughput and the peak memory allocated by
+	one more call. setup is called before every call and isn't timed.
+	"""
+	timings = []
+	for _ in range(repeat):
+		if setup:
+			setup()
+		start = time.perf_counter()
+		function()
+		timings.append(time.perf_counter() - start)
+
+	if setup:
+		setup()
+	tracemalloc.start()
+	function()
+	peak_memory = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	timings.sort()
+	total = sum(timings)
+	return {
+		"runs": repeat,
+		"mean_ms": total / repeat * 1000,
+		"min_ms": timings[0] * 1000,
+		"p50_ms": percentile(timings, 0.50) * 1000,
+		"p95_ms": percentile(timings, 0.95) * 1000,
+		"p99_ms": percentile(timings, 0.99) * 1000,
+		"max_ms": timings[-1] * 1000,
+		"ops_per_second": repeat / total if total else None,
+		"peak_memory_bytes": peak_memory,
+	}
+
+class TasklistOutput:
+	"""Stands in for the result of subprocess.run so the tasklist parser can be timed without windows"""
+	def __init__(self, stdout):
+		self.stdout = stdout
+
+def run_benchmarks(processes, targets, years, repeat):
+	"""Runs every benchmark in the current directory and returns their results"""
+	target_processes = generate_targets(targets)
+	process_names = generate_process_names(processes, target_processes)
+	history = generate_history(years, target_processes)
+	with open("target_processes.json", "w") as file:
+		json.dump(target_processes, file)
+	with open("settings.json", "w") as file:
+		json.dump({"process_source": "fake", "watch_config": False}, file)
+
+	import screen_time_bg, screen_time, process_sources
+	from storage import JournalStore, write_json_atomically, create_file_data
+	from settings import get_settings
+	daemon = screen_time_bg.create_daemon(get_settings(), process_sources.FakeSource(process_names))
+	monitor = daemon.monitors[0]
+	results = {}
+
+	# A scan costs the most when every process is new to it, as at startup, and the least when nothing changed
+	def forget_processes():
+		daemon.scanner.previous_snapshot = {}
+		monitor.instance_targets = {}
+	def scan():
+		return daemon.match(daemon.scan())
+	results["scan_cold"] = measure(scan, repeat, setup=forget_processes)
+	scan()
+	results["scan_processes"] = measure(scan, repeat) # Steady state: the same processes are running
+	generator, next_pid = random.Random(0), len(process_names) + 1
+	def churn_processes():
+		"""Replaces one process in a hundred with a new one, as processes start and exit between two scans"""
+		nonlocal next_pid
+		processes = daemon.scanner.process_source.processes
+		for pid in generator.sample(sorted(processes), max(1, len(processes) // 100)):
+			del processes[pid]
+			processes[next_pid] = generator.choice(process_names)
+			next_pid += 1
+	results["scan_churn"] = measure(scan, repeat, setup=churn_processes)
+
+	tasklist_output = TasklistOutput(generate_tasklist_output(process_names))
+	backup_run = process_sources.subprocess.run
+	process_sources.subprocess.run = lambda *args, **kwargs: tasklist_output
+	try:
+		results["tasklist_parse"] = measure(process_sources.TasklistSource().process_names, repeat)
+	finally:
+		process_sources.subprocess.run = backup_run
+
+	write_json_atomically(create_file_data(history), "screen_time_data.json")
+	results["get_processes_data"] = measure(monitor.get_processes_data, repeat, setup=lambda: setattr(monitor, "store", JournalStore()))
+
+	monitor.store = JournalStore(compact_every=10**9) # Saves only append to the journal
+	running_processes = scan()
+	def tick_and_save():
+		daemon.apply_scan(running_processes)
+		daemon.save_screen_time_data()
+	results["save_screen_time_data"] = measure(tick_and_save, repeat)
+	results["save_screen_time_data"]["journal_bytes"] = os.path.getsize("screen_time_data.journal")
+	results["compact"] = measure(lambda: monitor.store.compact(monitor.screen_time_data), repeat)
+	results["compact"]["snapshot_bytes"] = os.path.getsize("screen_time_data.json")
+
+	some_date = sorted(history)[len(history) // 2]
+	results["read_data"] = measure(lambda: screen_time.read_data(some_date), repeat)
+	def print_process_data():
+		with contextlib.redirect_stdout(io.StringIO()):
+			screen_time.print_process_data("all", some_date)
+	results["print_process_data"] = measure(print_process_data, repeat)
+
+	from totals import MonthlyTotals
+	totals = MonthlyTotals()
+	totals.build(history)
+	totals.save()
+	year_start = str(date.fromisoformat(some_date) - timedelta(days=364))
+	results["range_totals_year"] = measure(lambda: screen_time.read_range_totals(year_start, some_date), repeat)
+
+	from archive import write_archive
+	write_archive(history, "screen_time_archive.bin") # Past days are read from the archive from here on
+	results["archive_read_date"] = measure(lambda: screen_time.read_archived_data(some_date), repeat)
+	results["archive_read_date"]["archive_bytes"] = os.path.getsize("screen_time_archive.bin")
+	results["archive_range_totals_year"] = measure(lambda: screen_time.read_range_totals(year_start, some_date), repeat)
+	return results
+
+def compare(old_results, new_results):
+	"""Returns a line per benchmark with how much its p50 latency changed between two runs"""
+	lines = []
+	for name, result in new_results["results"].items():
+		old_result = old_results["results"].get(name)
+		if old_result and old_result["p50_ms"]:
+			change = (result["p50_ms"] - old_result["p50_ms"]) / old_result["p50_ms"] * 100
+			lines.append(f"{name:<24}{old_result['p50_ms']:>12.3f} ms{result['p50_ms']:>12.3f} ms{change:>+9.1f}%")
+	return lines
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the screen time monitor and CLI against synthetic data")
+	parser.add_argument("--processes", type=int, default=10000, help="number of running processes in a scan")
+	parser.add_argument("--targets", type=int, default=300, help="number of target processes")
+	parser.add_argument("--years", type=int, default=3, help="years of screen time history")
+	parser.add_argument("--repeat", type=int, default=20, help="number of timed runs of each benchmark")
+	parser.add_argument("--output", help="file the json results are written to instead of stdout")
+	parser.add_argument("--compare", help="json results of an earlier run to compare this run against")
+	args = parser.parse_args()
+
+	parameters = {"processes": args.processes, "targets": args.targets, "years": args.years, "repeat": args.repeat}
+	working_directory = os.getcwd()
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+	with tempfile.TemporaryDirectory() as temp_dir:
+		os.chdir(temp_dir)
+		try:
+			results = {"parameters": parameters, "python": sys.version.split()[0], "results": run_benchmarks(**parameters)}
+		finally:
+			os.chdir(working_directory)
+
+	output = json.dumps(results, indent=2)
+	if args.output:
+		with open(args.output, "w") as file:
+			file.write(output)
+	else:
+		print(output)
+
+	if args.compare:
+		with open(args.compare) as file:
+			print("\n".join(compare(json.load(file), results)), file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,92 @@
+import os, sys, struct, ctypes, ctypes.util
+
+# inotify constants from <sys/inotify.h>
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, length of the name that follows
+
+class InotifyWatcher:
+	"""
+	Watches a file with linux's inotify so a change to it is pushed by the kernel instead of being found by stat-ing
+	the file. The file's directory is watched because editors often save a file by replacing it with a new one.
+	"""
+
+	def __init__(self, file_name, libc):
+		self.file_name = os.path.basename(file_name).encode()
+		self.fd = libc.inotify_init1(IN_NONBLOCK)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		directory = os.path.dirname(os.path.abspath(file_name)).encode()
+		if libc.inotify_add_watch(self.fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE) < 0:
+			os.close(self.fd)
+			raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+	def changed(self):
+		"""Returns True if the file has been written, replaced, created or deleted since the last call"""
+		changed = False
+		while True:
+			try:
+				events = os.read(self.fd, 4096)
+			except BlockingIOError:
+				return changed
+			offset = 0
+			while offset < len(events):
+				_, _, _, name_length = EVENT_HEADER.unpack_from(events, offset)
+				offset += EVENT_HEADER.size
+				if events[offset:offset + name_length].rstrip(b"\0") == self.file_name:
+					changed = True
+				offset += name_length
+
+	def close(self):
+		os.close(self.fd)
+
+def get_watcher(file_name):
+	"""Returns an InotifyWatcher for file_name or None if inotify isn't available on this computer"""
+	if not sys.platform.startswith("linux"):
+		return None
+	libc_name = ctypes.util.find_library("c")
+	if not libc_name:
+		return None
+	try:
+		return InotifyWatcher(file_name, ctypes.CDLL(libc_name, use_errno=True))
+	except (OSError, AttributeError):
+		return None
+
+class ConfigCache:
+	"""
+	Keeps what loader returned for a config file and only calls loader again when the file changes. A change is
+	noticed from the watcher if one is given, otherwise from a change in the file's modification time or size.
+	get() returns the same object for as long as the file doesn't change.
+	"""
+
+	def __init__(self, file_name, loader, watcher=None):
+		self.file_name = file_name
+		self.loader = loader
+		self.watcher = watcher
+		self.signature = None # (modification time, size) of the file when it was last loaded
+		self.value = None
+		self.loaded = False
+		self.reloads = 0 # Number of times the file was loaded
+
+	def file_signature(self):
+		try:
+			stat = os.stat(self.file_name)
+		except FileNotFoundError:
+			return None
+		return (stat.st_mtime_ns, stat.st_size)
+
+	def get(self):
+		"""Returns the file's content as returned by loader, reloading it only if the file has changed"""
+		if self.loaded and self.watcher is not None and not self.watcher.changed():
+			return self.value
+
+		signature = self.file_signature()
+		if not self.loaded or signature != self.signature:
+			self.value = self.loader()
+			self.signature = signature
+			self.loaded = True
+			self.reloads += 1
+		return self.value
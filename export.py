@@ -0,0 +1,76 @@
+import csv, json
+from datetime import date as Date, timedelta
+from storage import write_json_atomically
+from retention import period_bounds
+
+FIELDS = ["date", "process", "seconds", "sessions"]
+
+def month_spans(start_date, end_date):
+	"""
+	Yields the (first, last) dates of each month from start_date to end_date, cut to the range. If start_date is empty
+	the first month isn't known so the whole range is yielded at once.
+	"""
+	if not start_date:
+		yield start_date, end_date
+		return
+	if start_date > end_date:
+		return
+	month_start = Date.fromisoformat(start_date).replace(day=1)
+	while str(month_start) <= end_date:
+		first_date, last_date = period_bounds(str(month_start)[:7])
+		yield max(first_date, start_date), min(last_date, end_date)
+		month_start = Date.fromisoformat(last_date) + timedelta(days=1)
+
+def iter_records(read_range, start_date, end_date, processes=None, sessions=False):
+	"""
+	Yields a {"date", "process", "seconds"(, "sessions")} record for every process (or only the ones in processes) on
+	every date from start_date to end_date. read_range(first, last) is called for one month at a time so a store that
+	reads ranges (sqlite, sharded) only holds a month in memory. Records are ordered by date and then by process so two
+	exports of the same data are identical.
+	"""
+	for first_date, last_date in month_spans(start_date, end_date):
+		month_data = read_range(first_date, last_date)
+		for date in sorted(month_data):
+			for process in sorted(month_data[date]):
+				if processes and process not in processes:
+					continue
+				process_data = month_data[date][process]
+				record = {"date": date, "process": process, "seconds": process_data[1]}
+				if sessions:
+					record["sessions"] = process_data[2]
+				yield record
+
+def write_csv(records, file, sessions=False):
+	"""Writes records to file as csv with a header line and returns the number of records written. Sessions are json."""
+	writer = csv.writer(file, lineterminator="\n")
+	writer.writerow(FIELDS if sessions else FIELDS[:3])
+	count = 0
+	for record in records:
+		row = [record["date"], record["process"], record["seconds"]]
+		if sessions:
+			row.append(json.dumps(record["sessions"], separators=(",", ":")))
+		writer.writerow(row)
+		count += 1
+	return count
+
+def write_ndjson(records, file, sessions=False):
+	"""Writes records to file as one json object per line and returns the number of records written"""
+	count = 0
+	for record in records:
+		file.write(json.dumps(record, separators=(",", ":")) + "\n")
+		count += 1
+	return count
+
+WRITERS = {"csv": write_csv, "ndjson": write_ndjson}
+
+def read_cursor(file_name):
+	"""Returns the last date exported by the export that wrote the cursor file, or "" if there's no cursor yet"""
+	try:
+		with open(file_name) as file:
+			cursor = json.load(file)
+	except (FileNotFoundError, json.decoder.JSONDecodeError):
+		return ""
+	return cursor.get("last_date", "") if type(cursor) == dict else ""
+
+def write_cursor(file_name, last_date):
+	write_json_atomically({"last_date": last_date}, file_name)
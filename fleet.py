@@ -0,0 +1,175 @@
+"""
+Merges the screen time data collected from many machines and reports how long each process ran on each host and
+across the whole fleet. A fleet directory holds the files of each host, named after the host:
+
+	<host>.json      a screen_time_data.json, with the <host>.journal it was saved with next to it if there is one
+	<host>.bin       an archive made by the archive command
+
+A host may have both, in which case the dates after the archive's last date are read from the json file. The hosts
+are read and summed in a pool of processes and their totals are then added together, e.g
+
+	python fleet.py report fleet_data --from 2022-10-01 --to 2022-10-31 --top 10
+	python fleet.py merge fleet_data --output fleet_totals.json
+
+The output only depends on the files, not on the number of workers or the order the hosts finish in.
+"""
+import argparse, json, os, sys
+from concurrent.futures import ProcessPoolExecutor
+from storage import upgrade_screen_time_data, replay_journal
+from archive import Archive, with_archive
+from totals import top_processes
+
+FIRST_DATE, LAST_DATE = "0001-01-01", "9999-12-31"
+
+def find_hosts(directory):
+	"""Returns a (host, json file or None, archive file or None) tuple for every host in directory, sorted by host"""
+	hosts = {}
+	for file_name in os.listdir(directory):
+		host, extension = os.path.splitext(file_name)
+		if extension in (".json", ".bin"):
+			files = hosts.setdefault(host, [None, None])
+			files[extension == ".bin"] = os.path.join(directory, file_name)
+	return [(host, *hosts[host]) for host in sorted(hosts)]
+
+def check_screen_time_data(screen_time_data, file_name):
+	"""Raises a ValueError unless screen_time_data is a {date: {process: [running, seconds, ...]}} dictionary"""
+	for date, processes_data in screen_time_data.items():
+		if type(processes_data) != dict:
+			raise ValueError(f"{file_name}: {date} doesn't hold a dictionary of processes")
+		for process, process_data in processes_data.items():
+			if type(process_data) != list or len(process_data) < 2 or type(process_data[1]) not in (int, float):
+				raise ValueError(f"{file_name}: the data of {process} on {date} isn't valid")
+
+def read_json_file(json_file):
+	"""
+	Returns the {date: {process: process_data}} of a host's json file and the journal saved with it. Unlike
+	JournalStore.load, a file that's missing, cut short or not screen time data raises an error, so a broken host is
+	reported instead of being counted as a host that ran nothing.
+	"""
+	with open(json_file) as file:
+		file_data = json.load(file)
+	try:
+		screen_time_data = upgrade_screen_time_data(file_data)
+	except (AttributeError, TypeError, ValueError, IndexError):
+		screen_time_data = None
+	if screen_time_data is None:
+		raise ValueError(f"{json_file} isn't screen time data")
+	replay_journal(screen_time_data, os.path.splitext(json_file)[0] + ".journal")
+	check_screen_time_data(screen_time_data, json_file)
+	return screen_time_data
+
+def read_host(json_file, archive_file, start_date, end_date):
+	"""Returns the {date: {process: process_data}} of a host from start_date to end_date"""
+	def read_json_range(first_date, last_date):
+		if json_file is None:
+			return {}
+		screen_time_data = read_json_file(json_file)
+		return {date: data for date, data in screen_time_data.items() if first_date <= date <= last_date}
+
+	if archive_file is None:
+		return read_json_range(start_date, end_date)
+	with Archive(archive_file) as archive:
+		return with_archive(read_json_range, archive)(start_date, end_date)
+
+def aggregate_host(task):
+	"""
+	Returns the (host, {date: {process: seconds}}, error) totals of a host given a (host, json file, archive file,
+	start date, end date) task. It runs in a worker process so only the totals are sent back, not the sessions and
+	histograms. error is None unless the host's files couldn't be read.
+	"""
+	host, json_file, archive_file, start_date, end_date = task
+	try:
+		screen_time_data = read_host(json_file, archive_file, start_date, end_date)
+	except Exception as error: # Whatever is wrong with one host's files, the other hosts are still merged
+		return host, {}, f"{type(error).__name__}: {error}"
+	dates = {}
+	for date, processes_data in screen_time_data.items():
+		seconds = {process: process_data[1] for process, process_data in processes_data.items() if process_data[1]}
+		if seconds:
+			dates[date] = seconds
+	return host, dates, None
+
+def add_seconds(totals, seconds):
+	"""Adds every {process: seconds} in seconds to totals"""
+	for process, process_seconds in seconds.items():
+		totals[process] = totals.get(process, 0) + process_seconds
+
+def sort_dates(dates):
+	return {date: dict(sorted(dates[date].items())) for date in sorted(dates)}
+
+def merge_aggregates(aggregates):
+	"""
+	Adds up the (host, dates, error) totals of every host into per-host and fleet-wide totals of each process for each
+	date and for the whole range. Keys are sorted so two merges of the same hosts are identical.
+	"""
+	hosts, fleet_dates, fleet_totals, errors = {}, {}, {}, {}
+	for host, dates, error in aggregates:
+		if error is not None:
+			errors[host] = error
+			continue
+		host_totals = {}
+		for date, seconds in dates.items():
+			add_seconds(host_totals, seconds)
+			add_seconds(fleet_dates.setdefault(date, {}), seconds)
+		add_seconds(fleet_totals, host_totals)
+		hosts[host] = {"dates": sort_dates(dates), "totals": dict(sorted(host_totals.items()))}
+	fleet = {"hosts": len(hosts), "dates": sort_dates(fleet_dates), "totals": dict(sorted(fleet_totals.items()))}
+	return {"fleet": fleet, "hosts": dict(sorted(hosts.items())), "errors": dict(sorted(errors.items()))}
+
+def merge_fleet(directory, start_date=FIRST_DATE, end_date=LAST_DATE, workers=None):
+	"""
+	Reads every host in directory and returns their merged totals (see merge_aggregates). The hosts are read in
+	workers processes (one per cpu if it's None, or in this process if it's 1). Results come back in the order of the
+	hosts, whatever order they finish in, so the merge is the same for any number of workers.
+	"""
+	tasks = [(host, json_file, archive_file, start_date, end_date) for host, json_file, archive_file in find_hosts(directory)]
+	if workers == 1 or len(tasks) <= 1:
+		return merge_aggregates(map(aggregate_host, tasks))
+	workers = workers or os.cpu_count() or 1
+	# Hosts are sent in chunks so the cost of handing a task to a worker is shared by several hosts
+	chunksize = max(1, len(tasks) // (workers * 4))
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		return merge_aggregates(executor.map(aggregate_host, tasks, chunksize=chunksize))
+
+def write_report(merged, file, top=None):
+	"""Writes how long each process ran across the fleet and on each host as text"""
+	from screen_time import change_format
+	def write_totals(totals):
+		for process, seconds in top_processes(totals, top):
+			file.write("  " + process + (" " * (42-len(process))) + change_format(seconds) + "\n")
+
+	dates = list(merged["fleet"]["dates"])
+	span = f"{dates[0]} to {dates[-1]}" if dates else "no data"
+	file.write(f"Fleet of {merged['fleet']['hosts']} hosts ({span})\n")
+	write_totals(merged["fleet"]["totals"])
+	for host, host_data in merged["hosts"].items():
+		file.write(f"\n{host}\n")
+		write_totals(host_data["totals"])
+	for host, error in merged["errors"].items():
+		file.write(f"\n{host} couldn't be read: {error}\n")
+
+def main():
+	parser = argparse.ArgumentParser(description="Merges the screen time data of many machines")
+	parser.add_argument("mode", choices=["merge", "report"], help="merge writes the totals as json, report as text")
+	parser.add_argument("directory", help="directory holding a <host>.json and/or <host>.bin for every host")
+	parser.add_argument("--from", dest="start_date", default=FIRST_DATE, help="first date merged")
+	parser.add_argument("--to", dest="end_date", default=LAST_DATE, help="last date merged")
+	parser.add_argument("--workers", type=int, help="number of worker processes. One per cpu by default")
+	parser.add_argument("--top", type=int, help="number of processes listed for the fleet and each host by report")
+	parser.add_argument("--output", help="file the results are written to instead of stdout")
+	args = parser.parse_args()
+
+	merged = merge_fleet(args.directory, args.start_date, args.end_date, args.workers)
+	file = open(args.output, "w") if args.output else sys.stdout
+	try:
+		if args.mode == "merge":
+			json.dump(merged, file, indent=2)
+			file.write("\n")
+		else:
+			write_report(merged, file, args.top)
+	finally:
+		if args.output:
+			file.close()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,55 @@
+import sys, base64
+from array import array
+from operator import add
+
+BUCKETS = 24 # One bucket per hour of the day
+BUCKET_SECONDS = 86400 // BUCKETS
+# array's type codes have a platform dependent size. The one that's 4 bytes long is used so files are the same everywhere.
+TYPE_CODE = "I" if array("I").itemsize == 4 else "L"
+
+def new_histogram():
+	return array(TYPE_CODE, bytes(4 * BUCKETS))
+
+def add_time(histogram, end, seconds):
+	"""
+	Adds seconds that ended end seconds after midnight to the buckets they fall in. Time is credited at most every few
+	minutes so it falls in one or two buckets.
+	"""
+	while seconds > 0 and end > 0:
+		bucket = (end - 1) // BUCKET_SECONDS
+		part = min(seconds, end - bucket * BUCKET_SECONDS)
+		histogram[bucket] += part
+		end -= part
+		seconds -= part
+
+def to_bytes(histogram):
+	"""Returns the histogram's buckets as little-endian 32 bit integers"""
+	if sys.byteorder == "big":
+		histogram = array(TYPE_CODE, histogram)
+		histogram.byteswap()
+	return histogram.tobytes()
+
+def encode(histogram):
+	"""Returns the histogram as base64 of to_bytes, which is how it's saved in json"""
+	return base64.b64encode(to_bytes(histogram)).decode()
+
+def decode(value):
+	"""Returns the histogram saved as value, a string made by encode or bytes made by to_bytes"""
+	histogram = array(TYPE_CODE)
+	histogram.frombytes(base64.b64decode(value) if type(value) == str else value)
+	if sys.byteorder == "big":
+		histogram.byteswap()
+	return histogram
+
+def json_default(value):
+	"""Lets json.dumps save histograms. It's passed as the default argument of json.dumps."""
+	if isinstance(value, array):
+		return encode(value)
+	raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def sum_histograms(histograms):
+	"""Returns the bucket by bucket sum of histograms. The sum is done by map in C rather than by a loop in python."""
+	total = new_histogram()
+	for histogram in histograms:
+		total = array(TYPE_CODE, map(add, total, histogram))
+	return total
@@ -0,0 +1,80 @@
+import os
+try:
+	import fcntl
+except ImportError: # windows
+	fcntl = None
+	import msvcrt
+
+LOCK_FILE = "screen_time.pid"
+# Windows locks are mandatory so the lock is taken on a byte past the pid, which can then still be read by the CLI
+LOCK_OFFSET = 1024
+
+def try_lock(fd):
+	"""Takes an exclusive lock on an open file without waiting. Returns False if another process holds it."""
+	try:
+		if fcntl:
+			fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+		else:
+			os.lseek(fd, LOCK_OFFSET, os.SEEK_SET)
+			msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+	except OSError:
+		return False
+	return True
+
+def unlock(fd):
+	if fcntl:
+		fcntl.flock(fd, fcntl.LOCK_UN)
+	else:
+		os.lseek(fd, LOCK_OFFSET, os.SEEK_SET)
+		msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class InstanceLock:
+	"""
+	Makes sure only one background process runs at a time. The process holds a lock on the pid file for as long as it
+	runs and writes its pid to it. The operating system releases the lock when the process exits, even if it crashes,
+	so a pid file left behind by a dead process is never mistaken for a running one.
+	"""
+
+	def __init__(self, file_name=LOCK_FILE):
+		self.file_name = file_name
+		self.fd = None
+
+	def acquire(self):
+		"""Takes the lock and writes this process's pid. Returns False if another process holds the lock."""
+		fd = os.open(self.file_name, os.O_RDWR | os.O_CREAT, 0o644)
+		if not try_lock(fd):
+			os.close(fd)
+			return False
+		os.ftruncate(fd, 0)
+		os.lseek(fd, 0, os.SEEK_SET)
+		os.write(fd, str(os.getpid()).encode())
+		self.fd = fd
+		return True
+
+	def release(self):
+		"""
+		Empties the pid file and releases the lock. The file isn't removed since another process could have opened it
+		already and would then lock a file that no longer has a name.
+		"""
+		if self.fd is None:
+			return
+		os.ftruncate(self.fd, 0)
+		unlock(self.fd)
+		os.close(self.fd)
+		self.fd = None
+
+def read_daemon_pid(file_name=LOCK_FILE):
+	"""Returns the pid of the background process holding the lock on the pid file or None if it isn't running"""
+	try:
+		fd = os.open(file_name, os.O_RDWR)
+	except FileNotFoundError:
+		return None
+	try:
+		if try_lock(fd): # Nothing holds the lock so the pid in the file, if any, is stale
+			unlock(fd)
+			return None
+		os.lseek(fd, 0, os.SEEK_SET)
+		pid = os.read(fd, 32).decode().strip()
+		return int(pid) if pid.isdigit() else None
+	finally:
+		os.close(fd)
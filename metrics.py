@@ -0,0 +1,89 @@
+import os, sys, cProfile
+from collections import deque
+from storage import write_text_atomically
+
+def current_rss():
+	"""Returns the resident set size of this process in bytes, or None if it can't be found on this computer"""
+	try:
+		with open("/proc/self/statm") as file:
+			return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		pass
+	try:
+		import resource
+	except ImportError:
+		return None
+	# ru_maxrss is the peak rather than the current size. It's in kilobytes on linux and bytes on macOS.
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == "darwin" else peak * 1024
+
+class Metrics:
+	"""
+	Keeps the last size samples of each kind of measurement (e.g a "tick" or a "save") in ring buffers so memory use
+	stays the same however long the program runs. A sample is a dictionary of numbers.
+	"""
+
+	def __init__(self, size=1440):
+		self.size = size
+		self.samples = {} # kind: deque of samples
+		self.totals = {} # kind: number of samples ever recorded
+
+	def record(self, kind, **values):
+		if kind not in self.samples:
+			self.samples[kind] = deque(maxlen=self.size)
+			self.totals[kind] = 0
+		self.samples[kind].append(values)
+		self.totals[kind] += 1
+
+	def latest(self, kind):
+		"""Returns the last sample of kind or None if there isn't one"""
+		samples = self.samples.get(kind)
+		return samples[-1] if samples else None
+
+	def to_prometheus(self):
+		"""
+		Returns the metrics in prometheus' text format. Every field of a kind gives the last value plus its average and
+		maximum over the ring buffer, e.g screen_time_tick_scan_seconds{stat="avg"}.
+		"""
+		lines = []
+		for kind, samples in self.samples.items():
+			name = f"screen_time_{kind}_total"
+			lines.append(f"# TYPE {name} counter")
+			lines.append(f"{name} {self.totals[kind]}")
+			fields = []
+			for sample in samples:
+				fields.extend(field for field in sample if field not in fields)
+			for field in fields:
+				values = [sample[field] for sample in samples if sample.get(field) is not None]
+				if not values:
+					continue
+				name = f"screen_time_{kind}_{field}"
+				lines.append(f"# TYPE {name} gauge")
+				lines.append(f'{name}{{stat="last"}} {values[-1]}')
+				lines.append(f'{name}{{stat="avg"}} {sum(values) / len(values)}')
+				lines.append(f'{name}{{stat="max"}} {max(values)}')
+		return "\n".join(lines) + "\n"
+
+	def write_snapshot(self, file_name):
+		write_text_atomically(self.to_prometheus(), file_name)
+
+class TickProfiler:
+	"""Profiles the functions called through it with cProfile for a number of ticks and then saves the stats to a file"""
+
+	def __init__(self, ticks=0, file_name="screen_time.prof"):
+		self.ticks_left = ticks
+		self.file_name = file_name
+		self.profile = cProfile.Profile() if ticks else None
+
+	def call(self, function, *args):
+		"""Calls function with args, profiling the call if there are ticks left to profile"""
+		if self.ticks_left > 0:
+			return self.profile.runcall(function, *args)
+		return function(*args)
+
+	def tick_done(self):
+		"""Counts a profiled tick and saves the stats once the last one is done"""
+		if self.ticks_left > 0:
+			self.ticks_left -= 1
+			if self.ticks_left == 0:
+				self.profile.dump_stats(self.file_name)
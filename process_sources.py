@@ -0,0 +1,174 @@
+import subprocess, os, sys
+
+TASKLIST_COMMAND = "tasklist /fi \"sessionname eq console\" /fo csv /nh"
+try:
+	PAGE_SIZE, CLOCK_TICKS = os.sysconf("SC_PAGE_SIZE"), os.sysconf("SC_CLK_TCK") # Units of the sizes and times in /proc
+except (AttributeError, ValueError): # windows
+	PAGE_SIZE, CLOCK_TICKS = 4096, 100
+COMM_LENGTH = 15 # The kernel cuts the names in /proc/<pid>/comm to this many characters
+
+class TasklistSource:
+	"""Lists the running processes by parsing the output of the windows tasklist command"""
+	name = "tasklist"
+
+	def __init__(self):
+		self.memory = {} # {pid: bytes} of the memory each process used at the last snapshot
+
+	def process_names(self):
+		"""Returns the name of every process in the current console session"""
+		return list(self.snapshot().values())
+
+	def snapshot(self, previous_snapshot=None):
+		"""Returns a {pid: name} dictionary of every process in the current console session"""
+		all_processes = subprocess.run(TASKLIST_COMMAND, stdout=subprocess.PIPE, text=True)
+		# '"SynTPEnh.exe","6268","Console","54","15,832 K"' : This is how each line of the output is formated
+		snapshot, memory = {}, {}
+		for process_description in all_processes.stdout.split('\n'):
+			columns = process_description.strip().strip('"').split('","')
+			if len(columns) > 1 and columns[1].isdigit():
+				pid = int(columns[1])
+				snapshot[pid] = columns[0]
+				if len(columns) > 4:
+					# The separator of the thousands depends on the locale so only the digits are kept
+					kilobytes = "".join(character for character in columns[4] if character.isdigit())
+					if kilobytes:
+						memory[pid] = int(kilobytes) * 1024
+		self.memory = memory
+		return snapshot
+
+	def resource_usage(self, pids):
+		"""
+		Returns a {pid: (memory in bytes, cpu seconds)} dictionary for the pids in the last snapshot. The memory comes
+		from the snapshot's output so nothing is run again. tasklist doesn't list cpu time so it's always None.
+		"""
+		return {pid: (self.memory[pid], None) for pid in pids if pid in self.memory}
+
+class ProcSource:
+	"""
+	Lists the running processes by reading /proc/<pid>/comm on linux. No subprocess is spawned so
+	a scan is just a walk of the /proc directory. A name that may have been cut short is completed from the
+	process's command line or executable.
+	"""
+	name = "proc"
+
+	def __init__(self, proc_dir="/proc"):
+		self.proc_dir = proc_dir
+		self.names = {} # {pid: (start time, name)} of the processes listed by the last snapshot
+
+	def process_names(self):
+		"""Returns the name of every process that can be read from the proc directory"""
+		return list(self.snapshot().values())
+
+	def snapshot(self, previous_snapshot=None):
+		"""
+		Returns a {pid: name} dictionary of every process that can be read from the proc directory. Only the start time
+		in /proc/<pid>/stat is read for the processes of the last snapshot and their name is read again only if it
+		changed, which means the pid was reused by a new process. previous_snapshot is ignored since the names are kept
+		here along with their start times.
+		"""
+		names = {}
+		for pid in os.listdir(self.proc_dir):
+			if not pid.isdigit():
+				continue
+			pid = int(pid)
+			fields = self.read_stat(pid)
+			if fields is None or len(fields) < 20:
+				continue # The process exited between listing the directory and reading it
+			start_time = fields[19] # The 22nd field, in clock ticks since boot
+			last = self.names.get(pid)
+			if last is not None and last[0] == start_time:
+				names[pid] = last
+				continue
+			try:
+				with open(os.path.join(self.proc_dir, str(pid), "comm")) as file:
+					name = file.read().rstrip('\n')
+			except OSError:
+				continue
+			if len(name) == COMM_LENGTH:
+				name = self.full_name(pid, name)
+			names[pid] = (start_time, name)
+		self.names = names
+		return {pid: name for pid, (_, name) in names.items()}
+
+	def read_stat(self, pid):
+		"""
+		Returns the fields of /proc/<pid>/stat from the 3rd one on, or None if the process exited. The name between the
+		parentheses may hold spaces so the fields are counted from after it, as documented in proc(5).
+		"""
+		try:
+			with open(os.path.join(self.proc_dir, str(pid), "stat")) as file:
+				stat = file.read()
+		except OSError:
+			return None
+		return stat[stat.rfind(")") + 2:].split()
+
+	def full_name(self, pid, comm):
+		"""
+		Returns the name of a process whose comm is COMM_LENGTH characters long, so it may have been cut short. It's the
+		file name of the first argument of the command line, or of the executable, if it starts with comm, and comm
+		otherwise (e.g. for a process that changed its command line or whose executable can't be read).
+		"""
+		process_dir = os.path.join(self.proc_dir, str(pid))
+		try:
+			with open(os.path.join(process_dir, "cmdline"), "rb") as file:
+				names = [os.path.basename(file.read().split(b"\0")[0].decode(errors="replace"))]
+		except OSError:
+			names = []
+		try:
+			names.append(os.path.basename(os.readlink(os.path.join(process_dir, "exe"))))
+		except OSError:
+			pass
+		return next((name for name in names if name.startswith(comm)), comm)
+
+	def resource_usage(self, pids):
+		"""
+		Returns a {pid: (resident memory in bytes, cpu seconds)} dictionary for pids. Only /proc/<pid>/stat is read for
+		each pid, so the cost depends on the number of pids asked for rather than on the number of running processes.
+		"""
+		usage = {}
+		for pid in pids:
+			fields = self.read_stat(pid)
+			if fields is None:
+				continue
+			# utime and stime are the 14th and 15th fields and rss the 24th
+			try:
+				usage[pid] = (int(fields[21]) * PAGE_SIZE, (int(fields[11]) + int(fields[12])) / CLOCK_TICKS)
+			except (IndexError, ValueError):
+				continue
+		return usage
+
+class FakeSource:
+	"""
+	Returns a preset list of processes. It's used for tests and simulations. The processes are a {pid: name}
+	dictionary or a list of names, in which case each name's pid is its position in the list plus one.
+	"""
+	name = "fake"
+
+	def __init__(self, processes=None, usage=None):
+		if type(processes) != dict:
+			processes = {pid: name for pid, name in enumerate(processes or [], 1)}
+		self.processes = processes
+		self.usage = usage or {} # {pid: (memory in bytes, cpu seconds)} returned by resource_usage
+
+	def process_names(self):
+		return list(self.processes.values())
+
+	def snapshot(self, previous_snapshot=None):
+		return dict(self.processes)
+
+	def resource_usage(self, pids):
+		return {pid: self.usage[pid] for pid in pids if pid in self.usage}
+
+PROCESS_SOURCES = {"tasklist": TasklistSource, "proc": ProcSource, "fake": FakeSource}
+
+def get_process_source(name=None):
+	"""
+	Returns an instance of the process source called name. If name is None, /proc is used
+	on linux and tasklist everywhere else.
+	"""
+	if name is None:
+		name = "proc" if sys.platform.startswith("linux") and os.path.isdir("/proc") else "tasklist"
+	try:
+		return PROCESS_SOURCES[name]()
+	except KeyError:
+		raise ValueError(f"Unknown process source: {name}") from None
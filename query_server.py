@@ -0,0 +1,92 @@
+import json, os, socket, asyncio
+from histogram import json_default
+
+SOCKET_FILE = "screen_time.sock"
+
+def answer_query(request, screen_time_data, current_date, has_full_history, rollups=None):
+	"""
+	Answers a query about screen time data held in memory by the background process. request is a dictionary whose
+	"command" is one of:
+		today                      the data of every process for the current date
+		date (date)                the data of every process for date
+		process (process, [date])  a process's data for date, or the current date if there's no date
+		range (from, to)           the total seconds of each process from one date to the other (both inclusive)
+	The answer is {"ok": True, "data": ...} or {"ok": False, "error": ...}. When the data asked for isn't in memory
+	data is None. has_full_history is False if screen_time_data only holds recent dates. The totals of the periods
+	rolled up by the retention policy are in rollups.
+	"""
+	command = request.get("command")
+	if command == "today":
+		return {"ok": True, "date": current_date, "data": screen_time_data.get(current_date)}
+	if command == "date":
+		return {"ok": True, "date": request.get("date"), "data": screen_time_data.get(request.get("date"))}
+	if command == "process":
+		date = request.get("date") or current_date
+		return {"ok": True, "date": date, "data": screen_time_data.get(date, {}).get(request.get("process"))}
+	if command == "range":
+		if not has_full_history:
+			return {"ok": False, "error": "Only recent dates are held in memory"}
+		start_date, end_date = request.get("from"), request.get("to")
+		if not start_date or not end_date:
+			return {"ok": False, "error": "A range needs a from and a to date"}
+		totals = rollups.totals(start_date, end_date) if rollups else {}
+		for date, processes_data in screen_time_data.items():
+			if start_date <= date <= end_date:
+				for process, process_data in processes_data.items():
+					totals[process] = totals.get(process, 0) + process_data[1]
+		return {"ok": True, "data": totals}
+	return {"ok": False, "error": f"Unknown command: {command}"}
+
+async def handle_connection(reader, writer, answer):
+	"""Reads one json request line from a connection and writes one json answer line back"""
+	try:
+		request = json.loads(await reader.readline())
+	except json.decoder.JSONDecodeError:
+		request = None
+	response = answer(request) if type(request) == dict else {"ok": False, "error": "Invalid request"}
+	writer.write(json.dumps(response, default=json_default).encode() + b"\n")
+	try:
+		await writer.drain()
+	finally:
+		writer.close()
+
+def remove_stale_socket(socket_file):
+	"""Removes socket_file if no process is listening on it. Returns False if another process is listening."""
+	if not os.path.exists(socket_file):
+		return True
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+		try:
+			client.connect(socket_file)
+		except (ConnectionRefusedError, FileNotFoundError):
+			os.remove(socket_file)
+			return True
+	return False
+
+async def start_query_server(answer, socket_file=SOCKET_FILE):
+	"""
+	Starts serving queries on a unix domain socket from the running event loop and returns the server, or None if unix
+	sockets aren't supported on this computer. answer is called with each request and returns its answer. It runs on
+	the event loop like everything that changes the data so it never sees a change half way through.
+	"""
+	if not hasattr(socket, "AF_UNIX") or not remove_stale_socket(socket_file):
+		return None
+	return await asyncio.start_unix_server(lambda reader, writer: handle_connection(reader, writer, answer), socket_file)
+
+async def stop_query_server(server, socket_file=SOCKET_FILE):
+	server.close()
+	await server.wait_closed()
+	os.remove(socket_file)
+
+def query_daemon(request, socket_file=SOCKET_FILE, timeout=1):
+	"""Sends a request to the background process and returns its answer, or None if the background process isn't running"""
+	if not hasattr(socket, "AF_UNIX"):
+		return None
+	try:
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+			client.settimeout(timeout)
+			client.connect(socket_file)
+			client.sendall(json.dumps(request).encode() + b"\n")
+			with client.makefile("rb") as response:
+				return json.loads(response.readline())
+	except (OSError, json.decoder.JSONDecodeError):
+		return None
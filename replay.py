@@ -0,0 +1,274 @@
+"""
+Records the scans of the background process and replays recorded or generated scans through the Daemon with a virtual
+clock, so weeks of monitoring run in seconds. Set the "record_file" setting to record the scans of the background
+process, then replay them (or a generated month) in a temporary directory, e.g
+
+	python replay.py --recording screen_time_scans.ndjson.gz
+	python replay.py --days 30 --targets 20 --processes 300 --output replay_output.txt
+
+The data of a replay is written to --data-dir if it's given so it can be inspected with the CLI.
+"""
+import argparse, gzip, json, os, random, shutil, sys, tempfile, time, zlib
+from datetime import datetime
+from process_sources import FakeSource
+from scheduler import Scheduler
+
+RECORDING_VERSION = 1
+
+def part_file(file_name):
+	"""Returns the plain file the scans of a .gz recording are written to until the recorder is closed"""
+	return file_name + ".part"
+
+def ends_with_newline(file_name):
+	with open(file_name, "rb") as file:
+		if not file.seek(0, os.SEEK_END):
+			return True
+		file.seek(-1, os.SEEK_END)
+		return file.read(1) == b"\n"
+
+def compress_part(file_name):
+	"""
+	Appends the plain part of a .gz recording to it as a new gzip member and removes the part. A part left behind by a
+	recorder that was killed is compressed the same way by the next recorder, so the .gz never holds a cut off member.
+	"""
+	part = part_file(file_name)
+	if not os.path.exists(part):
+		return
+	with open(part, "rb") as file:
+		data = file.read()
+	if data:
+		if not data.endswith(b"\n"):
+			data += b"\n" # The last line was cut short so the next run's lines start on a line of their own
+		with open(file_name, "ab") as file:
+			file.write(gzip.compress(data))
+			file.flush()
+			os.fsync(file.fileno())
+	os.remove(part)
+
+class RecordingSource:
+	"""
+	Wraps a process source and appends each of its snapshots to a recording. A snapshot is written as a line holding
+	its timestamp, the [pid, name] pairs that are new or renamed since the last snapshot and the pids that exited:
+	[timestamp, [[pid, name], ...], [pid, ...]]. Only the changes are written so a scan rarely costs more than a few bytes.
+	A recording whose name ends with .gz is written to a plain .part file that's compressed onto it when the recorder
+	is closed, so a killed recorder never leaves a gzip stream that can't be read.
+	"""
+
+	def __init__(self, source, file_name, clock=time):
+		self.source = source
+		self.name = source.name
+		self.clock = clock
+		self.file_name = file_name
+		if file_name.endswith(".gz"):
+			compress_part(file_name) # Left behind if the last recorder was killed
+			file_name = part_file(file_name)
+			is_new = not os.path.exists(self.file_name) or os.path.getsize(self.file_name) == 0
+		else:
+			is_new = not os.path.exists(file_name) or os.path.getsize(file_name) == 0
+		self.file = open(file_name, "a")
+		if is_new:
+			self.file.write(json.dumps({"version": RECORDING_VERSION, "source": source.name}) + "\n")
+		else:
+			if os.path.exists(file_name) and not ends_with_newline(file_name):
+				self.file.write("\n") # The last line was cut short when the last recorder was killed
+			self.file.write("null\n") # Starts over from an empty snapshot since the last one may be from another run
+		self.last_snapshot = {}
+
+	def process_names(self):
+		return list(self.snapshot().values())
+
+	def resource_usage(self, pids):
+		return self.source.resource_usage(pids) # Usage isn't recorded
+
+	def snapshot(self, previous_snapshot=None):
+		snapshot = self.source.snapshot(previous_snapshot)
+		changed = [[pid, name] for pid, name in snapshot.items() - self.last_snapshot.items()]
+		exited = [pid for pid in self.last_snapshot if pid not in snapshot]
+		self.file.write(json.dumps([round(self.clock.time(), 3), changed, exited], separators=(",", ":")) + "\n")
+		self.file.flush() # A line is never lost when the program is stopped
+		self.last_snapshot = snapshot
+		return snapshot
+
+	def close(self):
+		self.file.close()
+		if self.file_name.endswith(".gz"):
+			compress_part(self.file_name)
+
+def recording_lines(file_name):
+	"""
+	Yields the lines of a recording. A .gz recording is read up to the last complete gzip member and then from its
+	.part if a recorder is still writing it or was killed.
+	"""
+	if not file_name.endswith(".gz"):
+		with open(file_name) as file:
+			yield from file
+		return
+	if os.path.exists(file_name):
+		try:
+			with gzip.open(file_name, "rt") as file:
+				yield from file
+		except (EOFError, zlib.error, gzip.BadGzipFile):
+			pass # Cut off by a crash. The lines before it were read.
+	if os.path.exists(part_file(file_name)):
+		with open(part_file(file_name)) as file:
+			yield from file
+
+def read_recording(file_name):
+	"""Yields the (timestamp, {pid: name}) snapshots of a recording in the order they were recorded"""
+	snapshot = {}
+	lines = recording_lines(file_name)
+	header = json.loads(next(lines, "{}"))
+	if type(header) != dict or header.get("version") != RECORDING_VERSION:
+		raise ValueError(f"{file_name} isn't a version {RECORDING_VERSION} recording")
+	for line in lines:
+		try:
+			record = json.loads(line)
+		except json.decoder.JSONDecodeError:
+			continue # The line was only partly written. The next run starts with a null line.
+		if record is None:
+			snapshot = {}
+			continue
+		timestamp, changed, exited = record
+		snapshot = dict(snapshot)
+		for pid in exited:
+			del snapshot[pid]
+		snapshot.update((pid, name) for pid, name in changed)
+		yield timestamp, snapshot
+
+def generate_snapshots(start, days, targets, processes=300, interval=60, seed=0):
+	"""
+	Yields a (timestamp, {pid: name}) snapshot every interval seconds for days days from start, a unix timestamp. There
+	are processes background processes and the targets start and exit at random, mostly during the day.
+	"""
+	generator = random.Random(seed)
+	snapshot = {pid: f"service_{pid}.exe" for pid in range(1, processes + 1)}
+	next_pid = processes + 1
+	for tick in range(days * 86400 // interval + 1):
+		timestamp = start + tick * interval
+		awake = 8 <= datetime.fromtimestamp(timestamp).hour < 23
+		snapshot = dict(snapshot)
+		for pid in [pid for pid in snapshot if pid > processes and generator.random() < 0.02]:
+			del snapshot[pid]
+		for target in targets:
+			if generator.random() < (0.01 if awake else 0.001):
+				snapshot[next_pid] = target
+				next_pid += 1
+		yield timestamp, snapshot
+
+class VirtualClock:
+	"""Stands in for the time module in a replay. Time only moves when it's set to the next scan's timestamp."""
+
+	def __init__(self, now=0.0):
+		self.now = now
+
+	def time(self):
+		return self.now
+
+	def monotonic(self):
+		return self.now
+
+	def sleep(self, seconds):
+		self.now += seconds
+
+def replay(daemon, snapshots, interval=60, save_interval=3600, max_gap=None):
+	"""
+	Runs daemon, a Daemon from screen_time_bg.create_daemon, over snapshots, (timestamp, {pid: name}) pairs in time
+	order, as fast as it can. The scheduler measures time with a virtual clock set to each timestamp so days roll over
+	and gaps are credited as if the scans were real, and the monitors and their alerts take their time from it too.
+	Alerts are only logged, not run. The data of every profile is saved every save_interval virtual seconds. Returns
+	statistics of the run.
+	"""
+	clock = VirtualClock()
+	for monitor in daemon.monitors:
+		monitor.clock = monitor.alerts.clock = clock
+		monitor.alerts.log_only = True # A replay never runs commands or writes notifications
+	source = FakeSource({})
+	daemon.scanner.process_source = source
+	daemon.scheduler = Scheduler(interval, max_gap, clock=clock)
+	tick_seconds, first_timestamp, next_save = [], None, None
+	started = time.perf_counter()
+	for timestamp, snapshot in snapshots:
+		clock.now = timestamp
+		now = datetime.fromtimestamp(timestamp)
+		if first_timestamp is None:
+			first_timestamp = timestamp
+			for monitor in daemon.monitors:
+				monitor.current_date = str(now.date())
+				monitor.get_processes_data()
+		source.processes = snapshot
+		tick_start = time.perf_counter()
+		daemon.tick(now)
+		tick_seconds.append(time.perf_counter() - tick_start)
+		if next_save is None or timestamp >= next_save:
+			daemon.save_screen_time_data()
+			next_save = timestamp + save_interval
+	daemon.save_screen_time_data()
+	wall_seconds = time.perf_counter() - started
+
+	if not tick_seconds:
+		return {"ticks": 0}
+	simulated_seconds = timestamp - first_timestamp
+	tick_seconds.sort()
+	return {
+		"ticks": len(tick_seconds),
+		"simulated_seconds": simulated_seconds,
+		"wall_seconds": wall_seconds,
+		"speedup": simulated_seconds / wall_seconds if wall_seconds else None,
+		"tick_p50_ms": tick_seconds[len(tick_seconds) // 2] * 1000,
+		"tick_p95_ms": tick_seconds[min(len(tick_seconds) - 1, int(0.95 * len(tick_seconds)))] * 1000,
+		"tick_max_ms": tick_seconds[-1] * 1000,
+		"dates": len(daemon.monitors[0].screen_time_data),
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description="Replays recorded or generated scans through the screen time monitor")
+	parser.add_argument("--recording", help="recording made with the record_file setting. Scans are generated if it's missing")
+	parser.add_argument("--days", type=int, default=30, help="days of generated scans")
+	parser.add_argument("--targets", type=int, default=20, help="number of generated target processes")
+	parser.add_argument("--processes", type=int, default=300, help="number of generated background processes")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the generated scans")
+	parser.add_argument("--interval", type=int, default=60, help="seconds between two scans")
+	parser.add_argument(
+		"--save-interval", type=int, default=3600, help="virtual seconds between two saves. 60 saves as often as the background process"
+	)
+	parser.add_argument("--data-dir", help="directory the screen time data is written to instead of a temporary one")
+	parser.add_argument("--output", help="file the json results are written to instead of stdout")
+	args = parser.parse_args()
+
+	if args.recording:
+		recording = os.path.abspath(args.recording)
+		with open("target_processes.json") as file:
+			target_processes = json.load(file)
+		snapshots = read_recording(recording)
+	else:
+		target_processes = [f"app_{i}.exe" for i in range(args.targets)]
+		start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp() - args.days * 86400
+		snapshots = generate_snapshots(start, args.days, target_processes, args.processes, args.interval, args.seed)
+
+	working_directory = os.getcwd()
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+	data_dir = args.data_dir or tempfile.mkdtemp()
+	os.makedirs(data_dir, exist_ok=True)
+	os.chdir(data_dir) # The monitor's files are relative to the working directory
+	try:
+		with open("target_processes.json", "w") as file:
+			json.dump(target_processes, file)
+		with open("settings.json", "w") as file:
+			json.dump({"process_source": "fake", "watch_config": False}, file)
+		from screen_time_bg import create_daemon # screen_time_bg imports this module to record scans
+		from settings import get_settings
+		results = replay(create_daemon(get_settings()), snapshots, args.interval, args.save_interval)
+	finally:
+		os.chdir(working_directory)
+		if not args.data_dir:
+			shutil.rmtree(data_dir)
+
+	output = json.dumps(results, indent=2)
+	if args.output:
+		with open(args.output, "w") as file:
+			file.write(output)
+	else:
+		print(output)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,140 @@
+import json
+from array import array
+from storage import write_json_atomically
+
+RESOURCES_FILE = "screen_time_resources.json"
+KINDS = ("memory", "cpu") # Bytes of memory and percent of a cpu used by all the instances of a process
+
+def read_summaries(file_name=RESOURCES_FILE):
+	"""Returns the {date: {process: {kind: summary}}} saved in the resources file, or {} if there's none"""
+	try:
+		with open(file_name) as file:
+			summaries = json.load(file)
+	except (FileNotFoundError, json.decoder.JSONDecodeError):
+		return {}
+	return summaries if type(summaries) == dict else {}
+
+class RingBuffer:
+	"""Keeps the last size numbers added to it in a fixed-size array of doubles, so its memory use never grows"""
+
+	def __init__(self, size):
+		self.values = array("d", bytes(8 * size))
+		self.size = size
+		self.count = 0 # Numbers ever added
+
+	def append(self, value):
+		self.values[self.count % self.size] = value
+		self.count += 1
+
+	def __len__(self):
+		return min(self.count, self.size)
+
+	def to_list(self):
+		"""Returns the numbers held, oldest first"""
+		if self.count <= self.size:
+			return self.values[:self.count].tolist()
+		start = self.count % self.size
+		return (self.values[start:] + self.values[:start]).tolist()
+
+class Series:
+	"""
+	The samples of one kind of resource used by one process during a day. The minimum, maximum and average are kept as
+	running counters over every sample. The 95th percentile is worked out from the last samples in the ring buffer.
+	"""
+
+	def __init__(self, size):
+		self.samples = RingBuffer(size)
+		self.total = 0.0
+		self.minimum = None
+		self.maximum = None
+
+	def add(self, value):
+		self.samples.append(value)
+		self.total += value
+		self.minimum = value if self.minimum is None else min(self.minimum, value)
+		self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+	def summary(self):
+		"""Returns the {"min", "avg", "max", "p95"} of the samples"""
+		samples = sorted(self.samples.to_list())
+		p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+		return {
+			"min": round(self.minimum, 1), "avg": round(self.total / self.samples.count, 1),
+			"max": round(self.maximum, 1), "p95": round(p95, 1)
+		}
+
+class ResourceSampler:
+	"""
+	Samples the memory and cpu used by the running target processes on every tick, summed over their instances. Each
+	day's samples are kept in ring buffers of size samples per process and summed up in a
+	{date: {process: {kind: {"min", "avg", "max", "p95"}}}} file. Only the target instances are sampled so a tick
+	costs the same however many other processes are running.
+	"""
+
+	def __init__(self, file_name=RESOURCES_FILE, size=1440):
+		self.file_name = file_name
+		self.size = size
+		self.date = None # Date of the samples in self.series
+		self.series = {} # {(process, kind): Series} of self.date
+		self.cpu_times = {} # {pid: cpu seconds} of each sampled instance at the last tick
+		self.summaries = read_summaries(file_name) # Summaries of the days before self.date
+		self.changed = False # True when there are samples that haven't been saved
+
+	def sample(self, date, instance_targets, usage, elapsed):
+		"""
+		Adds a sample of each target process in instance_targets ({pid: target}) from usage, the
+		{pid: (memory in bytes, cpu seconds)} of the instances. The cpu used is the cpu time the instances added in
+		the elapsed seconds since the last tick, so an instance's cpu is only known from its second sample.
+		"""
+		if date != self.date:
+			self.end_day()
+			self.date = date
+		memory, cpu, cpu_times = {}, {}, {}
+		for pid, target in instance_targets.items():
+			pid_usage = usage.get(pid)
+			if pid_usage is None:
+				continue
+			memory_bytes, cpu_seconds = pid_usage
+			if memory_bytes is not None:
+				memory[target] = memory.get(target, 0) + memory_bytes
+			if cpu_seconds is not None:
+				cpu_times[pid] = cpu_seconds
+				last_cpu_seconds = self.cpu_times.get(pid)
+				if last_cpu_seconds is not None and elapsed > 0:
+					cpu[target] = cpu.get(target, 0) + max(0, cpu_seconds - last_cpu_seconds) * 100 / elapsed
+		self.cpu_times = cpu_times # Instances that exited are forgotten
+		for kind, values in zip(KINDS, (memory, cpu)):
+			for process, value in values.items():
+				series = self.series.get((process, kind))
+				if series is None:
+					series = self.series[(process, kind)] = Series(self.size)
+				series.add(value)
+				self.changed = True
+
+	def day_summary(self):
+		"""Returns the summary of the samples of self.date"""
+		summary = {}
+		for (process, kind), series in sorted(self.series.items()):
+			summary.setdefault(process, {})[kind] = series.summary()
+		return summary
+
+	def end_day(self):
+		"""Sums up the samples of the day that's over and empties the ring buffers for the next one"""
+		if self.date is not None and self.series:
+			self.summaries[self.date] = self.day_summary()
+			self.changed = True
+		self.series = {}
+
+	def to_file_data(self):
+		"""
+		Returns the summaries of every day, including the day being sampled so far, to be saved, possibly by another
+		thread, and marks them as saved
+		"""
+		self.changed = False
+		summaries = dict(self.summaries)
+		if self.series:
+			summaries[self.date] = self.day_summary()
+		return summaries
+
+	def save(self, file_data=None):
+		write_json_atomically(file_data or self.to_file_data(), self.file_name)
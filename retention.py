@@ -0,0 +1,133 @@
+import json
+from datetime import date as Date, timedelta
+from storage import SCHEMA_VERSION, write_json_atomically
+
+ROLLUPS_FILE = "screen_time_rollups.json"
+
+def period_of(date, period):
+	"""Returns the name of the week ("2022-W42") or month ("2022-10") that an iso format date falls in"""
+	if period == "month":
+		return date[:7]
+	if period == "week":
+		year, week, _ = Date.fromisoformat(date).isocalendar()
+		return f"{year}-W{week:02}"
+	raise ValueError(f"Unknown rollup period: {period}")
+
+def period_bounds(name):
+	"""Returns the first and last date of a period named by period_of as iso format strings"""
+	if "-W" in name:
+		year, week = name.split("-W")
+		start = Date.fromisocalendar(int(year), int(week), 1)
+		return str(start), str(start + timedelta(days=6))
+	start = Date.fromisoformat(name + "-01")
+	next_month = (start + timedelta(days=31)).replace(day=1)
+	return str(start), str(next_month - timedelta(days=1))
+
+class Rollups:
+	"""
+	Total seconds of each process for the weeks or months whose days were removed by the retention policy, kept in a
+	small json file: {"schema_version": ..., "rolled_through": date, "periods": {period: {process: seconds}}}.
+	rolled_through is the last date whose data has been added, so data that's rolled up again after a crash isn't
+	counted twice.
+	"""
+
+	def __init__(self, file_name=ROLLUPS_FILE):
+		self.file_name = file_name
+		self.rolled_through = ""
+		self.periods = {}
+		try:
+			with open(file_name) as file:
+				file_data = json.load(file)
+		except (FileNotFoundError, json.decoder.JSONDecodeError):
+			return
+		if type(file_data) == dict and type(file_data.get("periods")) == dict:
+			self.rolled_through = file_data.get("rolled_through", "")
+			self.periods = file_data["periods"]
+
+	def to_file_data(self):
+		return {"schema_version": SCHEMA_VERSION, "rolled_through": self.rolled_through, "periods": self.periods}
+
+	def save(self, file_data=None):
+		"""Writes the rollups (or file_data made by to_file_data on another thread) to the rollups file"""
+		write_json_atomically(file_data or self.to_file_data(), self.file_name)
+
+	def apply(self, plan):
+		"""Adds a plan's totals and removes its expired periods. The plan's dates should only be removed once this is saved."""
+		for period, totals in plan.additions.items():
+			period_totals = self.periods.setdefault(period, {})
+			for process, seconds in totals.items():
+				period_totals[process] = period_totals.get(process, 0) + seconds
+		for period in plan.expired_periods:
+			self.periods.pop(period, None)
+		self.rolled_through = plan.rolled_through
+
+	def totals(self, start_date, end_date):
+		"""
+		Returns the total seconds of each process over the periods that lie entirely from start_date to end_date.
+		A period that only partly overlaps the range can't be split so it's left out.
+		"""
+		totals = {}
+		for name, processes in self.periods.items():
+			first_date, last_date = period_bounds(name)
+			if start_date <= first_date and last_date <= end_date:
+				for process, seconds in processes.items():
+					totals[process] = totals.get(process, 0) + seconds
+		return totals
+
+class RetentionPlan:
+	"""The changes a RetentionPolicy decided on. It's made in a worker thread and applied on the event loop."""
+
+	def __init__(self):
+		self.dates = [] # Dates whose data is removed
+		self.additions = {} # {period: {process: seconds}} to add to the rollups
+		self.expired_periods = [] # Rollups older than the horizon
+		self.rolled_through = ""
+
+class RetentionPolicy:
+	"""
+	Keeps the data of the last detail_days days as it is. Older days are summed into one total per process for each
+	week or month (rollup_period) and removed, once the whole period is older than detail_days. Rollups older than
+	horizon_days are removed too. None for detail_days keeps every day and None for horizon_days keeps every rollup.
+	"""
+
+	def __init__(self, detail_days=None, rollup_period="month", horizon_days=None):
+		self.detail_days = detail_days
+		self.rollup_period = rollup_period
+		self.horizon_days = horizon_days
+
+	def boundary(self, today):
+		"""Returns the first date whose data is kept as it is. Every earlier date is rolled up."""
+		if self.detail_days is None:
+			return ""
+		cutoff = str(Date.fromisoformat(today) - timedelta(days=self.detail_days))
+		return period_bounds(period_of(cutoff, self.rollup_period))[0]
+
+	def horizon(self, today):
+		"""Returns the first date whose rollups are kept"""
+		if self.horizon_days is None:
+			return ""
+		return str(Date.fromisoformat(today) - timedelta(days=self.horizon_days))
+
+	def plan(self, old_data, today, rollups):
+		"""
+		Returns a RetentionPlan for old_data, the {date: {process: process_data}} of the dates before boundary(today).
+		It only reads old_data and rollups so it can run in a worker thread.
+		"""
+		plan = RetentionPlan()
+		boundary, horizon = self.boundary(today), self.horizon(today)
+		plan.rolled_through = rollups.rolled_through
+		for date in sorted(old_data):
+			if date >= boundary:
+				continue
+			plan.dates.append(date)
+			if date <= rollups.rolled_through:
+				continue # Its data was rolled up before it could be removed
+			period = period_of(date, self.rollup_period)
+			if period_bounds(period)[1] < horizon:
+				continue # Too old to be kept even as a rollup
+			totals = plan.additions.setdefault(period, {})
+			for process, process_data in old_data[date].items():
+				totals[process] = totals.get(process, 0) + process_data[1]
+			plan.rolled_through = max(plan.rolled_through, date)
+		plan.expired_periods = [name for name in rollups.periods if period_bounds(name)[1] < horizon]
+		return plan
@@ -0,0 +1,61 @@
+import time
+
+class Scheduler:
+	"""
+	Wakes the monitor up every interval seconds and measures how much time really passed between two
+	observations. Both use time.monotonic so changes to the computer's clock don't affect them.
+	"""
+
+	def __init__(self, interval=60, max_gap=None, clock=time):
+		self.interval = interval
+		# Longest time credited between two observations. Anything longer means the computer was asleep or hibernating.
+		self.max_gap = max_gap if max_gap is not None else 2 * interval
+		self.clock = clock # Anything with monotonic() and sleep() functions
+		self.next_tick = None # monotonic time of the next tick
+		self.last_observation = None # monotonic time of the last call to elapsed()
+		self.carry = 0.0 # Fraction of a second not yet returned by elapsed()
+
+	def elapsed(self):
+		"""
+		Returns the whole number of seconds since the last call (0 on the first call), capped at max_gap.
+		The fraction of a second left over is carried into the next call so rounding never adds up.
+		"""
+		now = self.clock.monotonic()
+		last_observation, self.last_observation = self.last_observation, now
+		if last_observation is None:
+			return 0
+
+		gap = now - last_observation
+		if gap > self.max_gap:
+			self.carry = 0.0
+			return int(self.max_gap)
+		seconds = gap + self.carry
+		whole_seconds = int(seconds)
+		self.carry = seconds - whole_seconds
+		return whole_seconds
+
+	def delay(self):
+		"""
+		Returns the number of seconds until the next tick. The first tick is due immediately and the rest are due at fixed
+		multiples of interval from it, so the time spent scanning and saving doesn't push the schedule back. Ticks that
+		were missed are skipped.
+		"""
+		now = self.clock.monotonic()
+		if self.next_tick is None:
+			self.next_tick = now
+			return 0
+		self.next_tick += self.interval
+		if self.next_tick <= now:
+			missed_ticks = (now - self.next_tick) // self.interval + 1
+			self.next_tick += missed_ticks * self.interval
+		return self.next_tick - now
+
+	def lateness(self):
+		"""Returns how many seconds after the time it was due the current tick is running"""
+		if self.next_tick is None:
+			return 0.0
+		return max(0.0, self.clock.monotonic() - self.next_tick)
+
+	def wait(self):
+		"""Sleeps until the next tick"""
+		self.clock.sleep(self.delay())
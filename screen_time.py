@@ -1,15 +1,35 @@
-import sys, json
-from datetime import datetime
+import sys, json, os, contextlib
+from datetime import datetime, date as Date, timedelta
+from storage import JournalStore, get_store, migrate_json_to_sqlite, migrate_json_to_shards
+from settings import get_settings, get_profiles
+from query_server import query_daemon
+from totals import MonthlyTotals, range_totals, days_in_range, top_processes
+from histogram import BUCKETS, decode, sum_histograms
+from archive import Archive, with_archive, convert_json_to_archive
+from export import WRITERS, iter_records, read_cursor, write_cursor
+from instance_lock import read_daemon_pid
+from resources import read_summaries
+from target_matcher import TargetList
 
 current_date = str(datetime.now().date())
 HELP_TEXT = ("This Program monitors how long a process runs for a day.\n\n" 
-			 " screen_time [-add process] | [-remove process] | [date[process]] | [list]\n\n" + 
+			 " screen_time [-profile name] [-add process] | [-remove process] | [date[process]] | [list]\n\n" + 
+			 " -profile      Selects the profile the command is about when the background\n" +
+			 "                process monitors several profiles. It comes before the command.\n\n" +
 			 " -add          Adds a process to the list of processes that's been monitored.\n" +
 			 "                If a process is not added with this command, It can't be \n" +
 			 "                monitored. It takes at least one process name as a parameter.\n\n" +
 			 " -remove       removes a process from the list of processes that's been \n" +
 			 "                monitored. It takes at least one process name as a parameter.\n\n" +
+			 " -group name process...\n" +
+			 "                Adds a group whose time is how long any of its processes ran.\n" +
+			 "                Processes running at the same time are only counted once. A\n" +
+			 "                group is queried like a process and removed with -remove\n\n" +
+			 " -alias name process...\n" +
+			 "                Monitors an app that runs under several process names (or glob\n" +
+			 "                patterns) as one process called name\n\n" +
 			 " list          Lists all the processes being monitored.\n\n"+
+			 " status        Outputs whether screen_time_bg is running and its pid\n\n" +
 			 " date[process] A date (format: 'year-month-date'). It may be optionally followed\n"+
 			 " 				  by the name of the process. If a name of a process follows, It\n" +
 			 "                outputs how long a monitored process ran on that date. If not,\n" + 
@@ -17,6 +37,33 @@ HELP_TEXT = ("This Program monitors how long a process runs for a day.\n\n"
 			 " process       Outputs the total amount of time a process has spent running\n" + 
 			 "                for the day as long as the process is in the list of processes\n" +
 			 "                being monitored\n\n"+
+			 " -from date -to date [process]\n" +
+			 "                Outputs how long all monitored processes (or a process) ran\n" +
+			 "                from one date to the other e.g screentime -from 2023-03-01 -to 2023-03-17\n\n" +
+			 " week [process] Outputs how long the monitored processes ran since monday\n\n" +
+			 " month [process]\n" +
+			 "                Outputs how long the monitored processes ran since the first day\n" +
+			 "                of the month. -from, week and month may be followed by -top n to\n" +
+			 "                only output the n processes that ran the longest and by -average\n" +
+			 "                to also output how long each process ran per day on average\n\n" +
+			 " profile [-from date -to date] [process]\n" +
+			 "                Outputs how long all monitored processes (or a process) ran\n" +
+			 "                in each hour of the day, today or from one date to the other\n\n" +
+			 " export [csv|ndjson] [-from date] [-to date] [-process process]... [-sessions]\n" +
+			 "        [-output file] [-cursor file]\n" +
+			 "                Writes the screen time of every date and process as csv (the\n" +
+			 "                default) or one json object per line to the console or a file.\n" +
+			 "                -sessions adds the sessions of each process. With -cursor, only\n" +
+			 "                the days that are over and weren't exported with the same cursor\n" +
+			 "                file before are written\n\n" +
+			 " resources [date]\n" +
+			 "                Outputs the memory and cpu used by each monitored process\n" +
+			 "                today or on a date, when the \"sample_resources\" setting is on\n\n" +
+			 " archive       Copies the days before today in screen_time_data.json into a\n" +
+			 "                compact binary archive that past days are read from afterwards\n\n" +
+			 " migrate       Copies the screen time data in screen_time_data.json into the\n" +
+			 "                sqlite database or the monthly shards used when the \"storage\"\n" +
+			 "                setting is \"sqlite\" or \"sharded\"\n\n" +
 			 " reset         Resets the program's data to default. Removes all monitored \n" + 
 			 "                process. Clears screen_time data about all monitored processes\n\n" + 
 			 "For the program to be able to monitor a process, screen_time_bg.exe background\n" + 
@@ -25,11 +72,13 @@ HELP_TEXT = ("This Program monitors how long a process runs for a day.\n\n"
 			 "processes being monitored have been running.") # needs to be edited
 
 
-command_list = ["-add", "-remove", "list", "/?", "-date"] # 2023-03-17
+profile = None # Name of the profile selected with -profile. None selects the first profile
+
+command_list = ["-add", "-remove", "list", "/?", "-date", "migrate", "-from", "week", "month", "profile", "archive", "export", "status", "resources", "-group", "-alias"] # 2023-03-17
 
 def handle_file_exception():
 	"""Sets target_processes.json data to an empty list"""
-	with open("target_processes.json", "w") as file:
+	with open(get_profile_settings()["target_file"], "w") as file:
 		json.dump([], file)
 	sys.exit("No process has been added yet! Please add a process with the -add command.")
 
@@ -44,9 +93,16 @@ def handle_file_read(file_name):
 	except FileNotFoundError:
 		handle_file_exception()
 
+def get_profile_settings():
+	"""Returns the settings of the profile selected with -profile"""
+	for name, profile_settings in get_profiles(get_settings()):
+		if profile is None or name == profile:
+			return profile_settings
+	sys.exit(f"Unknown profile: {profile}")
+
 def get_target_processes():
 	"""Returns the list of target processes"""
-	target_processes = handle_file_read("target_processes.json")
+	target_processes = handle_file_read(get_profile_settings()["target_file"])
 	if type(target_processes) != list:
 		# if the content of the json file is valid json but doesn't return a dict type
 		handle_file_exception()
@@ -54,24 +110,21 @@ def get_target_processes():
 		sys.exit("No process has been added yet! Please add a process with the -add command.")
 	return target_processes
 
-def change_format(time_string):
-	"""Changes the time string command format from 00:00 to 00 hrs 00 mins"""
-	new_string = time_string.split(":")
-	return new_string[0] + " hrs " + new_string[1] + " mins"
-
-def handle_screen_data_exception():
-	print("Error! damaged or invalid file contents in screen_time_data.json. Reformatting the file...")
-	with open("screen_time_data.json", "w") as file:
-		json.dump({}, file)
-	sys.exit("File has been reformatted and all screen time data has been cleared.")
+def change_format(seconds):
+	"""Changes a duration in seconds to the 0 hrs 00 mins format"""
+	hours, seconds = divmod(seconds, 3600)
+	return f"{hours} hrs {seconds // 60:02} mins"
 
 def read_data(date):
-	"""Reads a process's screen_time_data from a file"""
-	screen_time_data = handle_file_read("screen_time_data.json")
-	if type(screen_time_data) != dict:
-	# if the content of the json file is valid json but doesn't return a dict type
-		handle_screen_data_exception()
-	elif not screen_time_data:
+	"""Reads the screen_time_data of every process for a date (or the current date if date is None)"""
+	settings = get_profile_settings()
+	if settings["storage"] != "json":
+		return read_store_data(get_store(settings), date)
+
+	# The background process only writes screen_time_data.json when it compacts its journal, so until then the data is
+	# only in the journal. A missing or damaged file is read as empty and never changed here.
+	screen_time_data = JournalStore(settings["data_file"], settings["journal_file"]).load()
+	if not screen_time_data:
 		sys.exit("No screen time data available. Run screen_time_bckground.exe to update screen time data")
 
 	if date:
@@ -82,20 +135,287 @@ def read_data(date):
 		sys.exit("No record for the date specified!")
 	return data
 
+def read_store_data(store, date):
+	"""Reads a date's screen_time_data with an indexed lookup instead of loading the whole history"""
+	data = store.read_date(date or current_date)
+	store.close()
+	if not data and date:
+		sys.exit("No record for the date specified!")
+	elif not data:
+		sys.exit("No screen time data available. Run screen_time_bckground.exe to update screen time data")
+	return data
+
+def migrate_data():
+	"""Copies the data in screen_time_data.json into the storage selected by the "storage" setting"""
+	settings = get_profile_settings()
+	if settings["storage"] == "sharded":
+		records = migrate_json_to_shards(settings["data_file"], settings["journal_file"], history_dir=settings["history_dir"])
+		sys.exit(f"{records} records were copied to {settings['history_dir']}")
+	rows = migrate_json_to_sqlite(settings["data_file"], settings["journal_file"], database_file=settings["database_file"])
+	sys.exit(f"{rows} records were copied to the database")
+
+def archive_data():
+	"""Copies the days before today in screen_time_data.json into the archive"""
+	settings = get_profile_settings()
+	rows = convert_json_to_archive(settings["data_file"], settings["journal_file"], archive_file=settings["archive_file"], before=current_date)
+	sys.exit(f"{rows} records were copied to {settings['archive_file']}")
+
+def read_archived_data(date):
+	"""Returns a past date's screen_time_data from the archive or None if there's no archive or it doesn't hold the date"""
+	archive_file = get_profile_settings()["archive_file"]
+	if not date or date >= current_date or not os.path.exists(archive_file):
+		return None
+	with Archive(archive_file) as archive:
+		return archive.read_date(date)
+
+def print_status():
+	"""Prints whether the background process is running, which is known from the lock it holds on the pid file"""
+	pid = read_daemon_pid(get_settings()["lock_file"])
+	if pid is None:
+		sys.exit("screen_time_bg isn't running")
+	sys.exit(f"screen_time_bg is running (pid {pid})")
+
+def read_live_data(date):
+	"""
+	Asks the background process for a date's screen_time_data. The background process answers from memory so the
+	data is always current. None is returned if the background process isn't running or doesn't hold the date.
+	"""
+	answer = query_daemon({"command": "date", "date": date or current_date, "profile": profile}, get_settings()["query_socket"])
+	if answer and answer["ok"]:
+		return answer["data"]
+	return None
+
 def print_process_data(process_name, date=None):
 	""" Prints out a process's screen_time_data onto the console."""
-	data = read_data(date)
+	data = read_archived_data(date) or read_live_data(date) or read_data(date)
 	if process_name == "all":
 		for key, value in data.items():
 			print(key + (" " * (44-len(key))) + change_format(value[1]))
 		return
 
 	print(process_name + (" " * (44-len(process_name))) + change_format(data[process_name][1]))
+	for member in TargetList(get_target_processes()).groups.get(process_name, []): # A group is followed by its members
+		if member in data:
+			print("  " + member + (" " * (42-len(member))) + change_format(data[member][1]))
+
+
+def open_range_reader(stack, settings):
+	"""
+	Returns a read_range(first_date, last_date) over the screen time data whose files are closed by stack. The dates the
+	archive holds are read from it. Stores that load the whole history on every read only load it once, when it's needed.
+	"""
+	store = get_store(settings)
+	stack.callback(store.close)
+	read_range = store.read_range
+	if store.has_full_history:
+		history = None
+		def read_range(first_date, last_date):
+			nonlocal history
+			if history is None:
+				history = store.load()
+			return {date: data for date, data in history.items() if first_date <= date <= last_date}
+	if os.path.exists(settings["archive_file"]):
+		read_range = with_archive(read_range, stack.enter_context(Archive(settings["archive_file"])))
+	return read_range
+
+def first_recorded_date(settings):
+	"""
+	Returns the first date the archive or the store has data for, or "" if there's none. Stores that load the whole
+	history on every read give "" as well since they're read at once anyway.
+	"""
+	if os.path.exists(settings["archive_file"]):
+		with Archive(settings["archive_file"]) as archive:
+			if archive.first_date is not None:
+				return archive.first_date
+	store = get_store(settings)
+	try:
+		return "" if store.has_full_history else store.first_date() or ""
+	finally:
+		store.close()
+
+def read_range_totals(start_date, end_date):
+	"""
+	Returns the total seconds of each process from start_date to end_date. Whole months are read from the monthly totals
+	kept by the background process so only the days at the edges of the range are read from the screen time data.
+	"""
+	settings = get_profile_settings()
+	with contextlib.ExitStack() as stack:
+		read_range = open_range_reader(stack, settings)
+		return range_totals(MonthlyTotals(settings["totals_file"]), read_range, start_date, end_date, current_date)
 
+def print_range_totals(start_date, end_date, process_name="all", top=None, average=False):
+	"""Prints how long each process ran from start_date to end_date and, if average is True, how long per day"""
+	totals = read_range_totals(start_date, end_date)
+	if process_name != "all":
+		totals = {process_name: totals.get(process_name, 0)}
+	days = days_in_range(start_date, end_date, current_date)
+	for process, seconds in top_processes(totals, top):
+		line = process + (" " * (44-len(process))) + change_format(seconds)
+		if average and days:
+			line += "    " + change_format(seconds // days) + " a day"
+		print(line)
+
+def parse_range_options(args):
+	"""Removes the -top n and -average options from args and returns the remaining args, n (or None) and average"""
+	args, top, average = list(args), None, False
+	if "-average" in args:
+		args.remove("-average")
+		average = True
+	if "-top" in args:
+		index = args.index("-top")
+		if index + 1 >= len(args) or not args[index + 1].isdigit():
+			sys.exit("Invalid use of command!")
+		top = int(args[index + 1])
+		del args[index:index + 2]
+	return args, top, average
+
+def range_command(args):
+	"""Handles the -from date -to date, week and month commands. args are the command line arguments after the program's name."""
+	args, top, average = parse_range_options(args)
+	today = Date.fromisoformat(current_date)
+	if args[0] == "-from":
+		if len(args) < 4 or args[2] != "-to":
+			sys.exit("Invalid use of command!")
+		start_date, end_date, args = args[1], args[3], args[4:]
+		try:
+			Date.fromisoformat(start_date), Date.fromisoformat(end_date)
+		except ValueError:
+			sys.exit("Invalid date! Dates are written as year-month-date e.g 2023-03-17")
+	elif args[0] == "week":
+		start_date, end_date, args = str(today - timedelta(days=today.weekday())), current_date, args[1:]
+	else:
+		start_date, end_date, args = str(today.replace(day=1)), current_date, args[1:]
+	if len(args) > 1:
+		sys.exit("Invalid use of command!")
+	print_range_totals(start_date, end_date, args[0] if args else "all", top, average)
+	sys.exit()
+
+def read_profile(start_date, end_date, process_name="all"):
+	"""
+	Returns the seconds that a process (or all processes) ran in each hour of the day from start_date to end_date,
+	summed from the hourly histograms of each day. Days recorded before histograms were kept don't add anything.
+	"""
+	days = None
+	if start_date == end_date == current_date:
+		live_data = read_live_data(current_date)
+		days = {current_date: live_data} if live_data else None
+	if days is None:
+		with contextlib.ExitStack() as stack:
+			days = open_range_reader(stack, get_profile_settings())(start_date, end_date)
+	histograms = []
+	for processes_data in days.values():
+		for process, process_data in processes_data.items():
+			if len(process_data) == 4 and process_name in ("all", process):
+				histograms.append(decode(process_data[3]) if type(process_data[3]) == str else process_data[3])
+	return sum_histograms(histograms)
+
+def print_profile(histogram):
+	"""Prints a line for each hour with a bar as long as the time spent in it relative to the busiest hour"""
+	longest = max(histogram) or 1
+	for hour in range(BUCKETS):
+		bar = "#" * round(40 * histogram[hour] / longest)
+		print(f"{hour:02}:00  " + bar + (" " * (42-len(bar))) + change_format(histogram[hour]))
+
+def profile_command(args):
+	"""Handles the profile [-from date -to date] [process] command. args are the arguments after "profile"."""
+	start_date = end_date = current_date
+	if args and args[0] == "-from":
+		if len(args) < 4 or args[2] != "-to":
+			sys.exit("Invalid use of command!")
+		start_date, end_date, args = args[1], args[3], args[4:]
+		try:
+			Date.fromisoformat(start_date), Date.fromisoformat(end_date)
+		except ValueError:
+			sys.exit("Invalid date! Dates are written as year-month-date e.g 2023-03-17")
+	if len(args) > 1:
+		sys.exit("Invalid use of command!")
+	print_profile(read_profile(start_date, end_date, args[0] if args else "all"))
+	sys.exit()
+
+def format_memory(memory_bytes):
+	"""Changes a number of bytes to the 0.0 MB format"""
+	return f"{memory_bytes / 2**20:.1f} MB"
+
+def print_resources(date):
+	"""Prints the average and most memory and cpu used by each sampled process on date"""
+	summary = read_summaries(get_profile_settings()["resources_file"]).get(date)
+	if not summary:
+		sys.exit(f"No resource samples for {date}. Set the \"sample_resources\" setting to sample them")
+	print("process" + (" " * 37) + "memory avg / max" + (" " * 12) + "cpu avg / p95")
+	for process, kinds in sorted(summary.items()):
+		line = process + (" " * (44-len(process)))
+		memory, cpu = kinds.get("memory"), kinds.get("cpu")
+		column = f"{format_memory(memory['avg'])} / {format_memory(memory['max'])}" if memory else "-"
+		line += column + (" " * (28-len(column)))
+		line += f"{cpu['avg']:.1f}% / {cpu['p95']:.1f}%" if cpu else "-"
+		print(line)
+
+def resources_command(args):
+	"""Handles the resources [date] command. args are the arguments after "resources"."""
+	if len(args) > 1:
+		sys.exit("Invalid use of command!")
+	date = args[0] if args else current_date
+	try:
+		Date.fromisoformat(date)
+	except ValueError:
+		sys.exit("Invalid date! Dates are written as year-month-date e.g 2023-03-17")
+	print_resources(date)
+	sys.exit()
+
+def parse_export_options(args):
+	"""Returns the format, the -from, -to, -output and -cursor options, the processes and -sessions of export's args"""
+	args = list(args)
+	export_format = args.pop(0) if args and args[0] in WRITERS else "csv"
+	options = {"-from": "", "-to": current_date, "-output": None, "-cursor": None}
+	processes, sessions = set(), False
+	while args:
+		option = args.pop(0)
+		if option == "-sessions":
+			sessions = True
+		elif (option in options or option == "-process") and args:
+			if option == "-process":
+				processes.add(args.pop(0))
+			else:
+				options[option] = args.pop(0)
+		else:
+			sys.exit("Invalid use of command!")
+	try:
+		for date in (options["-from"], options["-to"]):
+			if date:
+				Date.fromisoformat(date)
+	except ValueError:
+		sys.exit("Invalid date! Dates are written as year-month-date e.g 2023-03-17")
+	return export_format, options, processes, sessions
+
+def export_command(args):
+	"""
+	Handles the export command. args are the arguments after "export". Records are written as they're read, a month at
+	a time. With the sqlite and sharded storages only that month is read, so memory use doesn't grow with the history.
+	The json storage has no way to read part of its file so its whole history is loaded once.
+	"""
+	export_format, options, processes, sessions = parse_export_options(args)
+	start_date, end_date = options["-from"], options["-to"]
+	last_exported = None
+	if options["-cursor"]:
+		last_exported = read_cursor(options["-cursor"])
+		if last_exported:
+			start_date = max(start_date, str(Date.fromisoformat(last_exported) + timedelta(days=1)))
+		end_date = min(end_date, str(Date.fromisoformat(current_date) - timedelta(days=1))) # Today's data still changes
+	settings = get_profile_settings()
+	if not start_date: # Starts from the first month with any data instead of reading the whole history at once
+		start_date = first_recorded_date(settings)
+
+	with contextlib.ExitStack() as stack:
+		read_range = open_range_reader(stack, settings)
+		output = stack.enter_context(open(options["-output"], "w", newline="")) if options["-output"] else sys.stdout
+		records = WRITERS[export_format](iter_records(read_range, start_date, end_date, processes, sessions), output, sessions)
+	if last_exported is not None and end_date > last_exported:
+		write_cursor(options["-cursor"], end_date)
+	sys.exit(f"{records} records were exported to {options['-output']}" if options["-output"] else None)
 
 def save_data():
 	"""Saves the list of processes being monitored in a json file"""
-	with open("target_processes.json", "w") as file:
+	with open(get_profile_settings()["target_file"], "w") as file:
 		json.dump(target_processes, file)
 
 def add_processes(args):
@@ -105,8 +425,26 @@ def add_processes(args):
 	save_data()
 	sys.exit("process added successfully")
 		
+def find_named_item(name):
+	"""Returns the index of the group or alias called name in target_processes, or None if there's none"""
+	for index, item in enumerate(target_processes):
+		if type(item) == dict and name in (item.get("group"), item.get("alias")):
+			return index
+	return None
+
+def add_named_item(args, kind, key):
+	"""Adds the group or alias (kind) called args[2] with the processes after it, replacing one with the same name"""
+	if len(args) < 4:
+		sys.exit("Invalid use of command!")
+	index = find_named_item(args[2])
+	if index is not None:
+		del target_processes[index]
+	target_processes.append({kind: args[2], key: [process.lower() for process in args[3:]]})
+	save_data()
+	sys.exit(f"{kind} added successfully")
+
 def remove_processes(args):
-	"""Removes a process from target_processes list"""
+	"""Removes a process, group or alias from target_processes list"""
 	removed_processes = []
 	for process in args[2:]: # Loops through all arguments immediately following '-remove'	
 		if process in removed_processes: # if -remove receives more than one process name arguments that are the same
@@ -115,19 +453,47 @@ def remove_processes(args):
 			target_processes.remove(process)
 			removed_processes.append(process)
 		except ValueError:
-			sys.exit(f"Error: {process} is not being monitored!")
+			index = find_named_item(process)
+			if index is None:
+				sys.exit(f"Error: {process} is not being monitored!")
+			del target_processes[index]
+			removed_processes.append(process)
 
 	save_data()
 	sys.exit("All valid processes were removed successfully")
 
+def describe_target(item):
+	"""Returns how an item of the target list is listed by the list command"""
+	if type(item) != dict:
+		return item
+	if "group" in item:
+		return f"{item['group']} (group of {', '.join(map(str, item.get('members', [])))})"
+	return f"{item.get('alias')} (alias of {', '.join(map(str, item.get('names', [])))})"
+
 def process_commands(): # needs to be refactored!
+	global profile, target_processes
+	if len(sys.argv) > 2 and sys.argv[1] == "-profile": # Selects the profile every other command is about
+		profile = sys.argv[2]
+		del sys.argv[1:3]
 	target_processes = get_target_processes()
 	sys.argv[1] = sys.argv[1].lower()
+	if sys.argv[1] in ("-from", "week", "month"):
+		range_command(sys.argv[1:])
+	if sys.argv[1] == "profile":
+		profile_command(sys.argv[2:])
+	if sys.argv[1] == "export":
+		export_command(sys.argv[2:])
+	if sys.argv[1] == "resources":
+		resources_command(sys.argv[2:])
 	if len(sys.argv) > 2:
 		if sys.argv[1] == "-add":
 			add_processes(sys.argv)
 		if sys.argv[1] == "-remove":
 			remove_processes(sys.argv)
+		if sys.argv[1] == "-group":
+			add_named_item(sys.argv, "group", "members")
+		if sys.argv[1] == "-alias":
+			add_named_item(sys.argv, "alias", "names")
 		if sys.argv[1] == "-date":
 			if len(sys.argv) == 4:
 				print_process_data(sys.argv[3], sys.argv[2])
@@ -135,13 +501,19 @@ def process_commands(): # needs to be refactored!
 				print_process_data("all", sys.argv[2])
 	elif len(sys.argv) == 2:
 		if sys.argv[1] == "list":
-			for process in target_processes:
-				print(process)
+			for item in target_processes:
+				print(describe_target(item))
 			sys.exit()
+		elif sys.argv[1] == "migrate":
+			migrate_data()
+		elif sys.argv[1] == "archive":
+			archive_data()
+		elif sys.argv[1] == "status":
+			print_status()
 		elif sys.argv[1] == "/?":
 			print(HELP_TEXT)
 			sys.exit()
-		elif sys.argv[1] in target_processes:
+		elif sys.argv[1] in TargetList(target_processes).names: # A process, alias or group
 			print_process_data(sys.argv[1])
 		elif sys.argv[1] in command_list:
 			sys.exit("Invalid use of command!")
@@ -1,7 +1,20 @@
-import subprocess, time, json, sys
-from datetime import datetime, timedelta
-
-ONE_MINUTE = timedelta(minutes=1)
+import json, sys, asyncio, time, os
+from datetime import date as Date, datetime, timedelta
+from process_sources import get_process_source
+from settings import get_settings, get_profiles
+from target_matcher import TargetList
+from storage import get_store, write_json_atomically
+from scheduler import Scheduler
+from config_cache import ConfigCache, get_watcher
+from query_server import answer_query, start_query_server
+from metrics import Metrics, TickProfiler, current_rss
+from retention import RetentionPolicy, Rollups
+from totals import MonthlyTotals
+from histogram import new_histogram, add_time
+from resources import ResourceSampler
+from alerts import AlertEngine, load_rules
+from replay import RecordingSource
+from instance_lock import InstanceLock, read_daemon_pid
 
 def remove_duplicates(list_item):
 	"""Removes duplicate items from a list and returns a new list"""
@@ -24,9 +37,12 @@ def handle_file_read(file_name):
 		return None
 	return data
 
-def get_target_processes():
-	"""Gets the list of processes that are being monitored by the program from a json file"""
-	user_target_processes = handle_file_read("target_processes.json")
+def get_target_processes(file_name="target_processes.json"):
+	"""
+	Gets the list of processes that are being monitored by the program from a json file. Besides process names, the
+	list may hold aliases and groups (see target_matcher.TargetList).
+	"""
+	user_target_processes = handle_file_read(file_name)
 
 	if type(user_target_processes) == list:
 		if not user_target_processes:
@@ -34,187 +50,650 @@ def get_target_processes():
 			sys.exit()
 	else: # user_target_processes is not a list type
 		sys.exit()
-	return remove_duplicates(user_target_processes)
-
-def check_for_multiple_instances():
-	"""Checks if the process is already running on the computer"""
-
-	all_processes = subprocess.run("tasklist /fi \"sessionname eq console\" /fo csv /nh", stdout=subprocess.PIPE, text=True)
-	all_processes = all_processes.stdout.split('\n')
-	# '"SynTPEnh.exe","6268","Console","54","15,832 K"' : This is how each item in all_processes list is formated
-
-	process_name = ''
-	for process_description in all_processes:
-		for char in process_description:
-			if char == ',':
-				# The first comma we encounter means we already have the process complete name
-				process_name = process_name.strip('"')
-				if process_name == "cmd.exe": 
-					sys.exit() # Two instances of the program can't be allowed to run at the same time
-			process_name += char
-		process_name = ''
+	process_names = [item for item in user_target_processes if type(item) == str]
+	return (remove_duplicates(process_names) if process_names else []) + [item for item in user_target_processes if type(item) != str]
+
+def check_for_multiple_instances(instance_lock):
+	"""
+	Exits if the program is already running on the computer. Two instances of the program can't be allowed to run at
+	the same time since they'd both count the same time and overwrite each other's data. The lock is held until exit.
+	"""
+	if not instance_lock.acquire():
+		sys.exit(f"screen_time_bg is already running (pid {read_daemon_pid(instance_lock.file_name)})")
+
+def read_last_scan(state_file):
+	"""Returns the timestamp of the last scan saved in the state file, or None if it isn't known"""
+	try:
+		with open(state_file) as file:
+			state = json.load(file)
+	except (FileNotFoundError, json.decoder.JSONDecodeError):
+		return None
+	last_scan = state.get("last_scan") if type(state) == dict else None
+	return last_scan if type(last_scan) == int else None
+
+class Scanner:
+	"""
+	Lists the running processes once per tick for every profile. The changes since the last scan are worked out here
+	once so each profile only has to match the pids that started or exited.
+	"""
+
+	def __init__(self, process_source):
+		self.process_source = process_source # Where the list of running processes comes from
+		self.previous_snapshot = {} # {pid: name} of every process listed by the last scan
+		self.processes_scanned = 0 # Number of processes listed by the last scan
+
+	def scan(self):
+		"""
+		Returns the {pid: name} snapshot of the running processes, the (pid, name) items that appeared since the last
+		scan and the ones that are gone. A pid whose name changed was reused by a new process so it's in both.
+		"""
+		snapshot = self.process_source.snapshot(self.previous_snapshot)
+		previous_snapshot, self.previous_snapshot = self.previous_snapshot, snapshot
+		self.processes_scanned = len(snapshot)
+		return snapshot, snapshot.items() - previous_snapshot.items(), previous_snapshot.items() - snapshot.items()
 
 class Monitor:
 	"""
-	This class monitors all target processes that are currently running and stores how long they've been
-	running in a json file. This json file is updated every one minute as long as the program runs.
+	Monitors the target processes of one profile and stores how long they've been running. Each profile has its own
+	target list, store and totals. The processes are scanned by the Daemon, which hands every profile the same scan.
 	"""
-	current_date = str(datetime.now().date())
-	target_processes = get_target_processes() # List that stores the name of the process the program is monitoring
 
-	processes_data = {} # Stores the processes' data for the current date. Just a variable for shorter lines of code
+	def __init__(self, settings, name="default", clock=time):
+		self.name = name
+		self.settings = settings
+		self.clock = clock # Where the time of the timestamps that aren't given comes from, a virtual clock in a replay
+		self.current_date = str(datetime.now().date())
+		# Reloads the target list only when it changes
+		target_file = settings["target_file"]
+		self.target_cache = ConfigCache(
+			target_file, lambda: get_target_processes(target_file), get_watcher(target_file) if settings["watch_config"] else None
+		)
+		self.target_list = self.target_cache.get() # The target list as it is in the file
+		targets = TargetList(self.target_list)
+		self.target_processes = targets.names # Names of the processes, aliases and groups the program is monitoring
+		self.matcher = targets.matcher() # Matches process names against the targets and aliases
+		self.targets = targets # Knows which groups each target is a member of
+		# Reloads the alert rules only when they change
+		alerts_file = settings["alerts_file"]
+		self.alert_cache = ConfigCache(
+			alerts_file, lambda: load_rules(alerts_file), get_watcher(alerts_file) if settings["watch_config"] else None
+		)
+		self.alert_rules = self.alert_cache.get()
+		self.alerts = AlertEngine(self.alert_rules, settings["alerts_log_file"], clock) # Checks the daily limits as time is credited
+		self.store = get_store(settings) # Where the screen time data is saved
+		# Decides which old days are rolled up into weekly or monthly totals and removed
+		self.retention = RetentionPolicy(settings["detail_days"], settings["rollup_period"], settings["horizon_days"])
+		self.rollups = Rollups(settings["rollups_file"]) # Totals of the days the retention policy removed
+		self.totals = MonthlyTotals(settings["totals_file"]) # Total seconds of each process for every month, used by range queries
+		# Memory and cpu used by the running target processes, with a day of samples per process if sample_resources is set
+		self.resources = None
+		if settings["sample_resources"]:
+			self.resources = ResourceSampler(settings["resources_file"], max(1, 86400 // settings["sampling_interval"]))
+		self.instance_targets = {} # {pid: target} of the running instances of target processes
+		self.session_changes = ([], []) # (target, pid) of the instances that started and exited since the last apply_scan
+		self.rematch_needed = False # True when the targets changed and every running process has to be matched again
+		self.last_scan = None # Timestamp of the last scan applied, the last time the running instances were seen
+		self.saved_last_scan = None # self.last_scan as it is in the state file
+
+		self.processes_data = {} # Stores the processes' data for the current date. Just a variable for shorter lines of code
+
+		self.screen_time_data = {} # Stores a date and a dictionary containing processes' data as a key-value pair as shown below
+		# {"2022-10-21": {"chrome.exe": [false, 0, []], "firefox.exe": [true, 1800, [[4120, 1666339200, null]]]}}.
+		# Times are in seconds and the third item lists the sessions of each instance as [pid, start, end] timestamps. Once
+		# time is credited, a fourth item holds a histogram of the seconds for each hour of the day (see histogram.py)
+
+	def answer_query(self, request):
+		"""Answers a request sent to the query server from the data held in memory"""
+		return answer_query(request, self.screen_time_data, self.current_date, self.store.has_full_history, self.rollups)
+
+	def record(self, process):
+		"""Records the change made to a process's data for the current date so it's saved by the next commit"""
+		self.store.set_entry(self.current_date, process, self.processes_data[process])
+
+	def record_time(self, process):
+		"""Records a credit to a process's time, which is saved without the process's sessions"""
+		self.store.set_time(self.current_date, process, self.processes_data[process])
 
-	screen_time_data = {} # Stores a date and a dictionary containing processes' data as a key-value pair as shown below
-	# {"2022-10-21": {"chrome.exe": [false, "0:00"], "firefox.exe": [false, "0:30"]}}.
+	def record_running(self, process):
+		"""Records a change to a process's running flag, which is saved without the process's sessions"""
+		self.store.set_running(self.current_date, process, self.processes_data[process])
 
-	@staticmethod
-	def create_entries_for_target_processes():
-		"""Adds data of the processes being monitored for the current date in Monitor.screen_time_data"""
+	def record_session(self, process, index):
+		"""Records the session at index in a process's sessions, which just started or ended, without the others"""
+		self.store.set_session(self.current_date, process, self.processes_data[process], index)
+
+	def create_entries_for_target_processes(self):
+		"""Adds data of the processes being monitored for the current date in self.screen_time_data"""
 		processes_data = {}
-		for process in Monitor.target_processes:
+		for process in self.target_processes:
 			# first item indicates if the process is currently running or not. Second is how long it has run after being monitored
-			processes_data[process] = [False, "0:00"]
-		Monitor.screen_time_data[Monitor.current_date] = processes_data
-		Monitor.processes_data = Monitor.screen_time_data[Monitor.current_date]
+			processes_data[process] = [False, 0, []]
+		self.screen_time_data[self.current_date] = processes_data
+		self.processes_data = self.screen_time_data[self.current_date]
+		for process in processes_data:
+			self.record(process)
 
-	@staticmethod
-	def update_processes_data():
+	def update_processes_data(self):
 		"""
-		Removes the data of processes no longer in Monitor.target_processes and adds the data of the 
-		new processes in Monitor.target_processes to the Monitor.screen_time_data entry for the current date
+		Removes the data of processes no longer in self.target_processes and adds the data of the
+		new processes in self.target_processes to the self.screen_time_data entry for the current date
 		"""
 		new_dict = {}
+		old_dict = self.screen_time_data[self.current_date]
 
-		for process in Monitor.target_processes:
-			process_data = Monitor.screen_time_data[Monitor.current_date].get(process)
-			if process_data: # if process is not new 
+		for process in self.target_processes:
+			process_data = old_dict.get(process)
+			if process_data: # if process is not new
 				new_dict[process] = process_data
-			else: # if process is new 
-				new_dict[process] = [False, "0:00"] # Set the new process data to default values
-
-		Monitor.screen_time_data[Monitor.current_date] = new_dict # Data for only the processes in Monitor.target_processes
-		Monitor.processes_data = Monitor.screen_time_data[Monitor.current_date]
-			
-	@staticmethod
-	def get_processes_data():
-		"""Gets the screen time data for the target processes from a json file."""
-		Monitor.screen_time_data = handle_file_read("screen_time_data.json")
-
-		if type(Monitor.screen_time_data) == dict:
-			if Monitor.screen_time_data.get(Monitor.current_date):
-				Monitor.update_processes_data()
-				return
-	
-		Monitor.screen_time_data = {}
-		Monitor.create_entries_for_target_processes()
-
-	@staticmethod
-	def reset_running_flags():
-		"""
-		Resets the running flag of each process in the processes_data dictionary to False. This method is 
-		called to reset any process's running flag that's still True from the last time the program ran.
-		"""
-		for process in Monitor.processes_data:
-			if Monitor.processes_data[process][0]:
-				Monitor.processes_data[process][0] = False
-
-	@staticmethod
-	def save_screen_time_data():
-		with open("screen_time_data.json", "w") as screen_data_file:
-			json.dump(Monitor.screen_time_data, screen_data_file)
-
-	@staticmethod
-	def create_timedelta(string):
-		"""
-		Splits the string parameter (that's in time format) into it's different components (hours, minutes, seconds).
-		It then uses the hours and minutes parts to create a timedelta object and return it.
-		"""
-		string = string.split(":")
-		return timedelta(hours=int(string[0]), minutes=int(string[1]))
-
-	@staticmethod
-	def scan_processes():
-		"""Scans the processes on the computer to check if a target process is among them """
-
-		all_processes = subprocess.run("tasklist /fi \"sessionname eq console\" /fo csv /nh", stdout=subprocess.PIPE, text=True)
-		all_processes = all_processes.stdout.split('\n')
-		# '"SynTPEnh.exe","6268","Console","54","15,832 K"' : This is how each item in all_processes list is formated
-		
-		process_name = ''
-		for process_description in all_processes:
-			for char in process_description:
-				if char == ',':
-					# The first comma we encounter means we already have the process complete name
-					process_name = process_name.strip('"')
-					Monitor.validate_and_update_process_data(process_name)
-					break
-				process_name += char
-			process_name = ''
-
-			# if all target processes has been found
-			if len(Monitor.target_processes) == 0:
-				break
-
-	@staticmethod
-	def validate_and_update_process_data(process_name):
-		"""Checks if process_name parameter is in target processes and then updates the process data if it is."""
-
-		for i in range(len(Monitor.target_processes)):
-			if Monitor.target_processes[i] == process_name:
-				if Monitor.processes_data[process_name][0]: # if the process was running before
-					# Add one minute to the time spent running by the program and truncate the result; the seconds part is not needed 
-					Monitor.processes_data[process_name][1] = str(Monitor.create_timedelta(Monitor.processes_data[process_name][1]) + ONE_MINUTE)[:4]
+			else: # if process is new
+				new_dict[process] = [False, 0, []] # Set the new process data to default values
+				self.store.set_entry(self.current_date, process, new_dict[process])
+
+		for process in old_dict:
+			if process not in new_dict: # if process is no longer monitored
+				self.remove_entry(process, old_dict[process])
+
+		self.screen_time_data[self.current_date] = new_dict # Data for only the processes in self.target_processes
+		self.processes_data = self.screen_time_data[self.current_date]
+
+	def get_processes_data(self):
+		"""
+		Gets the screen time data for the target processes from self.store. Changes that were journaled
+		but not yet compacted when the program last stopped are recovered here.
+		"""
+		self.screen_time_data = self.store.load(self.current_date)
+
+		if self.screen_time_data.get(self.current_date):
+			self.update_processes_data()
+			return
+
+		self.create_entries_for_target_processes()
+
+	def end_open_sessions(self, timestamp):
+		"""
+		Ends the sessions left open and clears the running flags on every date held in memory, and on timestamp's date
+		if the store only loaded the current date. It's called with the time of the last scan when the program starts,
+		for what was left open when it last stopped, and when it stops. Sessions end at timestamp, or at the end of
+		their date if that's earlier, so the time the program wasn't running is never counted. Sessions end where they
+		started if timestamp isn't known.
+		"""
+		screen_time_data = self.screen_time_data
+		if timestamp is not None and not self.store.has_full_history:
+			last_date = str(datetime.fromtimestamp(timestamp).date())
+			if last_date not in screen_time_data:
+				screen_time_data = dict(screen_time_data, **{last_date: self.store.read_date(last_date) or {}})
+		for date, processes_data in screen_time_data.items():
+			date_end = int((datetime.fromisoformat(date) + timedelta(days=1)).timestamp())
+			for process, process_data in processes_data.items():
+				open_sessions = [session for session in process_data[2] if session[2] is None]
+				for session in open_sessions:
+					session[2] = session[1] if timestamp is None else max(session[1], min(timestamp, date_end))
+				if process_data[0] or open_sessions:
+					process_data[0] = False
+					self.store.set_entry(date, process, process_data)
+
+	def save_state(self):
+		"""Saves the time of the last scan if it changed since it was last saved"""
+		if self.last_scan != self.saved_last_scan:
+			write_json_atomically({"last_scan": self.last_scan}, self.settings["state_file"])
+			self.saved_last_scan = self.last_scan
+
+	def save_screen_time_data(self):
+		"""Saves the changes made to the screen time data since the last save"""
+		self.store.commit(self.screen_time_data)
+		self.save_state()
+		if self.totals.changed:
+			self.totals.save()
+		if self.resources and self.resources.changed:
+			self.resources.save()
+
+	def set_target_processes(self, target_list):
+		"""Sets the processes being monitored from a target list and compiles the matcher used to find them"""
+		self.target_list = target_list
+		self.targets = TargetList(target_list)
+		self.target_processes = self.targets.names
+		self.matcher = self.targets.matcher()
+		self.rematch_needed = True
+
+	def reload_target_processes(self):
+		"""
+		Applies the changes made to the target list since it was last read. Only the processes that were added
+		or removed are changed in the current date's data and nothing is done if the file hasn't changed.
+		"""
+		target_list = self.target_cache.get()
+		if target_list is self.target_list: # The cache returns the same list until the file changes
+			return
+
+		old_target_processes = set(self.target_processes)
+		self.set_target_processes(target_list)
+		target_processes = self.target_processes
+		for process in target_processes:
+			if process not in old_target_processes and process not in self.processes_data:
+				self.processes_data[process] = [False, 0, []]
+				self.record(process)
+		for process in old_target_processes.difference(target_processes):
+			process_data = self.processes_data.pop(process, None)
+			if process_data is not None:
+				self.remove_entry(process, process_data)
+
+	def remove_entry(self, process, process_data):
+		"""Removes the current date's data of a process that's no longer a target, along with its time in the totals"""
+		self.store.remove_entry(self.current_date, process)
+		self.totals.remove(self.current_date, process, process_data[1])
+
+	def reload_alert_rules(self):
+		"""Applies the changes made to the alert rules. Nothing is done if the file hasn't changed."""
+		alert_rules = self.alert_cache.get()
+		if alert_rules is not self.alert_rules:
+			self.alert_rules = alert_rules
+			self.alerts.set_rules(alert_rules)
+
+	def match_changes(self, snapshot, appeared, exited):
+		"""
+		Returns the set of target processes that are running, and of the groups with a running member, given a scan's
+		snapshot and the (pid, name) items that appeared and exited since the last scan. Only those pids are matched, so the work done depends on how many
+		processes started or stopped rather than on how many are running. The instances that started or exited are kept
+		in self.session_changes for apply_scan.
+		"""
+		started, stopped = self.session_changes
+		instance_targets = self.instance_targets
+
+		if self.rematch_needed: # Every process is new to the new matcher
+			self.rematch_needed = False
+			appeared, exited = snapshot.items(), ()
+			for pid in [pid for pid in instance_targets if pid not in snapshot]:
+				stopped.append((instance_targets.pop(pid), pid))
+
+		for pid, name in exited:
+			target = instance_targets.pop(pid, None)
+			if target is not None:
+				stopped.append((target, pid))
+		for pid, name in appeared:
+			target = self.matcher.match(name)
+			old_target = instance_targets.get(pid)
+			if target == old_target:
+				continue
+			if old_target is not None:
+				del instance_targets[pid]
+				stopped.append((old_target, pid))
+			if target is not None:
+				instance_targets[pid] = target
+				started.append((target, pid))
+
+		return self.targets.with_groups(set(instance_targets.values())) # Groups are counted once however many members run
+
+	def credit(self, process, process_data, seconds, end):
+		"""Adds seconds that ended end seconds after midnight to a process's time, hourly histogram and monthly total"""
+		process_data[1] += seconds
+		self.alerts.update(self.current_date, process, process_data[1])
+		if len(process_data) == 3:
+			process_data.append(new_histogram())
+		add_time(process_data[3], end, seconds)
+		self.totals.add(self.current_date, process, seconds)
+
+	def validate_and_update_process_data(self, running_processes, elapsed, end=None):
+		"""
+		Updates the data of every target process based on whether it's in running_processes, the set of target
+		processes found by the last scan. elapsed is the number of seconds that passed since the scan before it and
+		end is the number of seconds from midnight to the scan (the current time if it's None).
+		"""
+		if end is None:
+			now = datetime.now()
+			end = now.hour * 3600 + now.minute * 60 + now.second
+		for process, process_data in self.processes_data.items():
+			if process in running_processes:
+				if process_data[0]: # if the process was running before
+					self.credit(process, process_data, elapsed, end) # The process has been running since the last scan
+					self.record_time(process)
 				else:
-					Monitor.processes_data[process_name][0] = True # Set the process as running
+					process_data[0] = True # Set the process as running
+					self.record_running(process)
+			elif process_data[0]: # The process was running before but has now been closed
+				process_data[0] = False
+				self.record_running(process)
 
-				# Removes any process found in target processes incase of multiple instances of a process
-				# This action is also a means of prepping data for the update_closed_processes_data function
-				del Monitor.target_processes[i]
+	def credit_running_processes(self, running_processes, seconds):
+		"""
+		Adds seconds to the time of the processes that were running at the last scan and are still running. It's
+		called with the seconds before midnight when a new day starts so they end at the end of the day.
+		"""
+		for process, process_data in self.processes_data.items():
+			if process_data[0] and process in running_processes:
+				self.credit(process, process_data, seconds, 86400)
+				self.record_time(process)
+
+	def start_session(self, process, pid, timestamp):
+		"""Opens a session for an instance of process that started at timestamp"""
+		process_data = self.processes_data.get(process)
+		if process_data is not None:
+			process_data[2].append([pid, timestamp, None])
+			self.record_session(process, len(process_data[2]) - 1)
+
+	def end_session(self, process, pid, timestamp):
+		"""Ends the open session of an instance of process at timestamp"""
+		process_data = self.processes_data.get(process)
+		if process_data is None:
+			return
+		sessions = process_data[2]
+		for index in range(len(sessions) - 1, -1, -1):
+			session = sessions[index]
+			if session[0] == pid and session[2] is None:
+				session[2] = timestamp
+				self.record_session(process, index)
 				return
 
-	@staticmethod
-	def update_closed_processes_data():
+	def apply_session_changes(self, timestamp):
+		"""Ends the sessions of the instances that exited and opens the sessions of the ones that started"""
+		started, exited = self.session_changes
+		self.session_changes = ([], [])
+		for process, pid in exited:
+			self.end_session(process, pid, timestamp)
+		for process, pid in started:
+			self.start_session(process, pid, timestamp)
+
+	def apply_scan(self, running_processes, elapsed, now, usage=None):
 		"""
-		Sets a process's running flag to False if that process is currently not running but has a running flag set to True. 
-		By the time this method is called, every process left in Monitor.target_processes is not running.
+		Credits elapsed, the seconds that really passed since the last scan, to the processes in running_processes that
+		ran throughout it. If a new day started during that time, the seconds before midnight go to the previous date.
+		usage is the {pid: (memory, cpu seconds)} of the running instances if resources are sampled.
 		"""
-		for process in Monitor.target_processes:
-			if Monitor.processes_data[process][0]:
-				Monitor.processes_data[process][0] = False
+		date = str(now.date())
+		if date != self.current_date:
+			midnight = datetime.combine(now.date(), datetime.min.time())
+			seconds_before_midnight = int((midnight - (now - timedelta(seconds=elapsed))).total_seconds())
+			seconds_before_midnight = min(elapsed, max(0, seconds_before_midnight))
+			self.credit_running_processes(running_processes, seconds_before_midnight)
+			self.reset_data_for_new_day(date)
+			elapsed -= seconds_before_midnight
 
-	@staticmethod
-	def check_and_update_current_date():
-		"""Updates the screen_time_data if a new day starts while the program is running."""
-		if datetime.now().strftime("%H:%M") == "0:00":
-			Monitor.reset_data_for_new_day()
-			Monitor.save_screen_time_data()
+		self.validate_and_update_process_data(running_processes, elapsed, now.hour * 3600 + now.minute * 60 + now.second)
+		self.last_scan = int(now.timestamp())
+		self.apply_session_changes(self.last_scan)
+		if self.resources and usage is not None:
+			self.resources.sample(self.current_date, self.instance_targets, usage, elapsed)
 
-	@staticmethod
-	def reset_data_for_new_day():
+	def reset_data_for_new_day(self, date):
 		"""
-		Resets the Monitor.screen_time_data dictionary by creating a new date entry in the dictionary 
-		and resetting all process's time
+		Creates the entry of a new date in self.screen_time_data and makes it the current date. Processes that
+		were running carry their running flag over to the new date so the time they run after midnight is counted.
+		Open sessions are split at midnight: they end on the previous date and start again on the new one.
 		"""
-		for process in Monitor.processes_data:
-			Monitor.processes_data[process][0] = False
-			Monitor.processes_data[process][1] = "0:00"
+		previous_date, previous_processes_data = self.current_date, self.processes_data
+		self.current_date = date
+		self.create_entries_for_target_processes()
+		midnight = int(datetime.fromisoformat(date).timestamp())
 
-		Monitor.current_date = str(datetime.now().date())
-		Monitor.screen_time_data[Monitor.current_date] = {}
+		for process, process_data in previous_processes_data.items():
+			running, open_sessions = process_data[0], [session for session in process_data[2] if session[2] is None]
+			if not running and not open_sessions:
+				continue
+			process_data[0] = False # The previous date is over
+			for session in open_sessions:
+				session[2] = midnight
+			self.store.set_entry(previous_date, process, process_data)
+			new_process_data = self.processes_data.get(process)
+			if new_process_data is not None:
+				new_process_data[0] = running
+				new_process_data[2].extend([session[0], midnight, None] for session in open_sessions)
+				self.record(process)
 
-if __name__ == "__main__":
-	# check_for_multiple_instances()
-	Monitor.get_processes_data()
-	Monitor.reset_running_flags()
+	def plan_retention(self, today, boundary, old_data=None):
+		"""
+		Returns the retention plan for the dates before boundary. If old_data isn't given, it's read with a store of its
+		own so the store used by the event loop is never used from this worker thread.
+		"""
+		if old_data is None:
+			store = get_store(self.settings)
+			try:
+				old_data = store.read_range("", str(Date.fromisoformat(boundary) - timedelta(days=1)))
+			finally:
+				store.close()
+		return self.retention.plan(old_data, today, self.rollups)
+
+	async def apply_retention(self):
+		"""
+		Rolls up and removes the days older than the retention policy keeps. The old days are read and summed in a worker
+		thread, and the rollups are saved before the days are removed so no total is ever lost.
+		"""
+		today = self.current_date
+		boundary = self.retention.boundary(today)
+		if not boundary:
+			return
+		old_data = None
+		if self.store.has_full_history: # Every date is already in memory
+			old_data = {date: data for date, data in self.screen_time_data.items() if date < boundary}
+		loop = asyncio.get_running_loop()
+		plan = await loop.run_in_executor(None, self.plan_retention, today, boundary, old_data)
+		if not plan.dates and not plan.expired_periods:
+			return
+		self.rollups.apply(plan)
+		await loop.run_in_executor(None, self.rollups.save, self.rollups.to_file_data())
+		for date in plan.dates:
+			self.store.remove_date(date)
+			self.screen_time_data.pop(date, None)
+
+	def build_totals(self, screen_time_data=None):
+		"""
+		Builds the monthly totals from the whole history. If screen_time_data isn't given, the history is read with a
+		store of its own so this can run in a worker thread.
+		"""
+		if screen_time_data is None:
+			store = get_store(self.settings)
+			try:
+				screen_time_data = store.read_range("", self.current_date)
+			finally:
+				store.close()
+		month_rollups = {period: totals for period, totals in self.rollups.periods.items() if "-W" not in period}
+		self.totals.build(screen_time_data, month_rollups)
+		self.totals.save()
+
+	async def start(self):
+		"""Loads the profile's data and builds its totals if they don't exist yet"""
+		self.get_processes_data()
+		self.last_scan = self.saved_last_scan = read_last_scan(self.settings["state_file"])
+		self.end_open_sessions(self.last_scan)
+		self.alerts.prime(self.current_date, self.processes_data)
+		if not self.totals.exists: # Totals are only built once. After that every tick keeps them up to date.
+			history = self.screen_time_data if self.store.has_full_history else None
+			await asyncio.get_running_loop().run_in_executor(None, self.build_totals, history)
+
+	async def save(self):
+		"""Saves the changes made since the last save. The batch is made on the event loop and written in a worker thread."""
+		loop = asyncio.get_running_loop()
+		batch = self.store.prepare_commit(self.screen_time_data)
+		bytes_written = await loop.run_in_executor(None, self.store.write_batch, batch)
+		if self.last_scan != self.saved_last_scan:
+			last_scan = self.last_scan
+			await loop.run_in_executor(None, write_json_atomically, {"last_scan": last_scan}, self.settings["state_file"])
+			self.saved_last_scan = last_scan
+		if self.totals.changed:
+			await loop.run_in_executor(None, self.totals.save, self.totals.to_file_data())
+		if self.resources and self.resources.changed:
+			await loop.run_in_executor(None, self.resources.save, self.resources.to_file_data())
+		return bytes_written
+
+class Daemon:
+	"""
+	Runs the monitors of every profile. The processes are scanned once per tick and the scan is handed to each profile,
+	so another profile costs a match of the processes that started or exited rather than another scan.
+	"""
+
+	def __init__(self, settings, monitors, process_source=None):
+		self.settings = settings
+		self.monitors = monitors # One per profile. The first one answers queries that don't name a profile
+		self.scanner = Scanner(process_source or get_process_source(settings["process_source"]))
+		self.scheduler = Scheduler(settings["sampling_interval"], settings["max_gap"]) # Decides when to scan and how much time passed
+		self.metrics = Metrics(settings["metrics_size"]) # Measurements of the last ticks and saves
+		self.profiler = TickProfiler(settings["profile_ticks"]) # Profiles the first profile_ticks ticks if it's set
+
+	def monitor(self, name=None):
+		"""Returns the monitor of the profile called name, the first profile if name is None, or None if there's no such profile"""
+		if name is None:
+			return self.monitors[0]
+		return next((monitor for monitor in self.monitors if monitor.name == name), None)
+
+	def answer_query(self, request):
+		"""Answers a request sent to the query server. A request may name the profile it's about with "profile"."""
+		if request.get("command") == "metrics":
+			return {"ok": True, "data": self.metrics.to_prometheus()}
+		monitor = self.monitor(request.get("profile"))
+		if monitor is None:
+			return {"ok": False, "error": f"Unknown profile: {request.get('profile')}"}
+		return monitor.answer_query(request)
+
+	def scan(self):
+		"""
+		Scans the processes once and returns (snapshot, appeared, exited). It only reads the process source, so it can
+		run in a worker thread while the event loop reloads the target lists.
+		"""
+		return self.scanner.scan()
 
+	def match(self, scan):
+		"""
+		Matches the processes that started or exited in a scan against each profile's targets and returns the set of
+		running target processes of each profile. It changes the monitors so it's run on the event loop.
+		"""
+		return [monitor.match_changes(*scan) for monitor in self.monitors]
+
+	def sampled_pids(self):
+		"""Returns the pids of the target instances whose resources are sampled, or None if no profile samples them"""
+		sampling_monitors = [monitor for monitor in self.monitors if monitor.resources]
+		if not sampling_monitors:
+			return None
+		return set().union(*(monitor.instance_targets for monitor in sampling_monitors))
+
+	def read_usage(self, pids):
+		"""Returns {pid: (memory, cpu seconds)} of pids, or None if pids is None"""
+		if pids is None:
+			return None
+		return self.scanner.process_source.resource_usage(pids)
+
+	def tick(self, now=None):
+		"""Scans the processes and updates the data of every profile with the result"""
+		running_processes = self.match(self.scan())
+		self.apply_scan(running_processes, now, self.read_usage(self.sampled_pids()))
+		for monitor in self.monitors:
+			monitor.alerts.run_actions(monitor.alerts.take_pending())
+
+	def apply_scan(self, running_processes, now=None, usage=None):
+		"""
+		Credits the time that really passed since the last scan to each profile's running target processes. usage is
+		the resource usage of the sampled target instances if resources are sampled.
+		"""
+		now = now or datetime.now()
+		elapsed = self.scheduler.elapsed()
+		for monitor, profile_running_processes in zip(self.monitors, running_processes):
+			monitor.apply_scan(profile_running_processes, elapsed, now, usage)
+
+	def save_screen_time_data(self):
+		for monitor in self.monitors:
+			monitor.save_screen_time_data()
+
+	def end_sessions(self):
+		"""Ends every profile's open sessions at the last scan. It's called when the program stops, before the last save."""
+		for monitor in self.monitors:
+			monitor.end_open_sessions(monitor.last_scan)
+
+	async def sample(self):
+		"""
+		Scans the processes and reads their resource usage in a worker thread. The scan is matched against the targets
+		and applied on the event loop, where the target lists are reloaded, so the monitors are only changed there.
+		"""
+		drift = self.scheduler.lateness()
+		loop = asyncio.get_running_loop()
+		start = time.perf_counter()
+		scan = await loop.run_in_executor(None, self.profiler.call, self.scan)
+		scan_seconds = time.perf_counter() - start
+		running_processes = self.profiler.call(self.match, scan)
+		pids = self.sampled_pids()
+		usage = None if pids is None else await loop.run_in_executor(None, self.profiler.call, self.read_usage, pids)
+		self.profiler.call(self.apply_scan, running_processes, None, usage)
+		self.profiler.tick_done()
+		for monitor in self.monitors:
+			alerts = monitor.alerts.take_pending()
+			if alerts: # Actions write files and start commands so they're run in a worker thread
+				await asyncio.get_running_loop().run_in_executor(None, monitor.alerts.run_actions, alerts)
+		self.metrics.record(
+			"tick", scan_seconds=scan_seconds, processes=self.scanner.processes_scanned,
+			matches=sum(len(profile_running_processes) for profile_running_processes in running_processes), drift_seconds=drift,
+			config_reloads=sum(monitor.target_cache.reloads for monitor in self.monitors), rss_bytes=current_rss()
+		)
+
+	async def save(self):
+		"""Saves the changes every profile made since the last save"""
+		start = time.perf_counter()
+		bytes_written = 0
+		for monitor in self.monitors:
+			bytes_written += await monitor.save()
+		self.metrics.record("save", seconds=time.perf_counter() - start, bytes_written=bytes_written)
+
+	async def write_metrics(self):
+		"""Writes the metrics to the metrics file in prometheus' text format"""
+		await asyncio.get_running_loop().run_in_executor(None, self.metrics.write_snapshot, self.settings["metrics_file"])
+
+	async def apply_retention(self):
+		for monitor in self.monitors:
+			if monitor.retention.detail_days is not None:
+				await monitor.apply_retention()
+
+	async def reload_config(self):
+		"""Applies the changes made to the target lists and alert rules, which can be modified outside of this program"""
+		for monitor in self.monitors:
+			monitor.reload_target_processes()
+			monitor.reload_alert_rules()
+
+	async def run(self):
+		recorder = None
+		if self.settings["record_file"]:
+			recorder = self.scanner.process_source = RecordingSource(self.scanner.process_source, self.settings["record_file"])
+		try:
+			for monitor in self.monitors:
+				await monitor.start()
+			await start_query_server(self.answer_query, self.settings["query_socket"])
+
+			jobs = [
+				(self.scheduler, self.sample),
+				(Scheduler(self.settings["save_interval"]), self.save),
+				(Scheduler(self.settings["config_interval"]), self.reload_config),
+			]
+			if self.settings["metrics_file"]:
+				jobs.append((Scheduler(self.settings["metrics_interval"]), self.write_metrics))
+			if any(monitor.retention.detail_days is not None for monitor in self.monitors):
+				jobs.append((Scheduler(self.settings["retention_interval"]), self.apply_retention))
+			await asyncio.gather(*(run_periodically(scheduler, job) for scheduler, job in jobs))
+		finally:
+			if recorder is not None:
+				recorder.close() # Finishes a .gz recording so it can be read
+
+def create_daemon(settings, process_source=None):
+	"""Returns a Daemon with a monitor for each profile in settings"""
+	monitors = []
+	for name, profile_settings in get_profiles(settings):
+		directory = os.path.dirname(profile_settings["target_file"])
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		monitors.append(Monitor(profile_settings, name))
+	return Daemon(settings, monitors, process_source)
+
+async def run_periodically(scheduler, job):
+	"""
+	Awaits job() on every tick of scheduler. Jobs hand their blocking work (scanning, writing files) to an executor so
+	a slow job never holds up the others. A new periodic job only needs a coroutine function and a line in Daemon.run().
+	"""
 	while True:
-		# Monitor.target_processes needs to be updated regularly as it gets it's content
-		# from an external file that can be modified outside of this program
-		Monitor.target_processes = get_target_processes() 
-		
-		Monitor.update_processes_data()
-		Monitor.scan_processes()
-		Monitor.update_closed_processes_data()
-		Monitor.save_screen_time_data()
-		Monitor.check_and_update_current_date()
-		time.sleep(50)
+		await asyncio.sleep(scheduler.delay())
+		await job()
+
+if __name__ == "__main__":
+	settings = get_settings()
+	instance_lock = InstanceLock(settings["lock_file"]) # Held while the program runs so only one instance can run
+	check_for_multiple_instances(instance_lock) # Before a store or monitor is created, so no data is loaded or saved
+	try:
+		daemon = create_daemon(settings)
+		try:
+			asyncio.run(daemon.run())
+		finally:
+			daemon.end_sessions()
+			daemon.save_screen_time_data() # Saves whatever changed since the last save when the program is stopped
+	finally:
+		instance_lock.release()
@@ -0,0 +1,82 @@
+import json, os
+
+SETTINGS_FILE = "settings.json"
+
+# Values used for any setting that isn't present in settings.json
+DEFAULT_SETTINGS = {
+	"process_source": None, # "tasklist", "proc" or "fake". None picks the best source for the platform
+	"target_file": "target_processes.json", # List of the processes being monitored
+	"data_file": "screen_time_data.json", # Snapshot of the screen time data used when storage is "json"
+	"journal_file": "screen_time_data.journal", # Changes made since the snapshot was written when storage is "json"
+	"storage": "json", # "json" (screen_time_data.json and its journal), "sqlite" or "sharded" (one file per month)
+	"database_file": "screen_time_data.db", # Database used when storage is "sqlite"
+	"history_dir": "screen_time_history", # Directory of the monthly shards used when storage is "sharded"
+	"compress_shards": True, # Compress the shards of months that are over with gzip
+	"sampling_interval": 60, # Seconds between two scans of the running processes
+	"max_gap": None, # Most seconds credited between two scans (after sleep or hibernation). None means 2 * sampling_interval
+	"save_interval": 60, # Seconds between two saves of the screen time data
+	"config_interval": 10, # Seconds between two checks for changes to target_processes.json
+	"watch_config": True, # Use inotify (on linux) to know when target_processes.json changes instead of checking its mtime
+	"query_socket": "screen_time.sock", # Unix domain socket the background process answers the CLI's queries on
+	"metrics_size": 1440, # Number of ticks and saves whose measurements are kept in memory
+	"metrics_file": None, # File the metrics are written to in prometheus' text format. None means they aren't written
+	"metrics_interval": 60, # Seconds between two writes of the metrics file
+	"profile_ticks": 0, # Number of ticks profiled with cProfile. The stats are saved to screen_time.prof
+	"compact_every": 60, # Number of saves after which the journal is compacted into screen_time_data.json
+	"detail_days": None, # Days whose data is kept as it is. Older days are rolled up. None keeps every day
+	"rollup_period": "month", # "week" or "month": the period older days are summed into one total per process for
+	"horizon_days": None, # Days after which rolled up totals are removed too. None keeps them forever
+	"rollups_file": "screen_time_rollups.json", # File the rolled up totals are kept in
+	"retention_interval": 3600, # Seconds between two runs of the retention policy
+	"totals_file": "screen_time_totals.json", # File the monthly totals used by range queries are kept in
+	"archive_file": "screen_time_archive.bin", # Binary archive of past days made by the archive command. It's read if it exists
+	"sample_resources": False, # Sample the memory and cpu used by the running target processes on every tick
+	"resources_file": "screen_time_resources.json", # Daily min, average, max and 95th percentile of the sampled memory and cpu
+	"alerts_file": "alert_rules.json", # Daily limits of processes and the action run when a process goes over one
+	"alerts_log_file": "screen_time_alerts.log", # File the "log" action of the alert rules writes to by default
+	"state_file": "screen_time_state.json", # Time of the last scan, used to end the sessions left open when the program stopped
+	"lock_file": "screen_time.pid", # Locked by the background process while it runs. It holds the process's pid
+	# Profiles monitored by the background process, each with its own target list and data, as a list of
+	# {"name": ..., "directory": ...} dictionaries. A profile's files are in its directory (profiles/<name> by default)
+	# and any other key overrides a setting for that profile, e.g "storage" or "detail_days". None monitors one profile
+	# with the files in the working directory.
+	"profiles": None,
+	"record_file": None, # File every scan is recorded to so it can be replayed with replay.py. None means scans aren't recorded
+}
+
+def get_settings(file_name=SETTINGS_FILE):
+	"""
+	Returns the program's settings. Settings are read from an optional json file and any setting
+	missing from the file (or the whole file if it doesn't exist or is invalid) uses its default value.
+	"""
+	settings = dict(DEFAULT_SETTINGS)
+	try:
+		with open(file_name) as file:
+			user_settings = json.load(file)
+	except (FileNotFoundError, json.decoder.JSONDecodeError):
+		return settings
+
+	if type(user_settings) == dict:
+		settings.update(user_settings)
+	return settings
+
+# Settings holding the name of a file or directory that belongs to a profile
+PROFILE_FILES = (
+	"target_file", "data_file", "journal_file", "database_file", "history_dir", "rollups_file", "totals_file", "archive_file",
+	"resources_file", "alerts_file", "alerts_log_file", "state_file"
+)
+
+def profile_settings(settings, profile):
+	"""Returns the settings of a profile: settings with the profile's own values and its files in the profile's directory"""
+	result = dict(settings)
+	result.update((key, value) for key, value in profile.items() if key not in ("name", "directory"))
+	directory = profile.get("directory", os.path.join("profiles", profile["name"]))
+	for key in PROFILE_FILES:
+		result[key] = os.path.join(directory, result[key])
+	return result
+
+def get_profiles(settings):
+	"""Returns a (name, settings) pair for every profile. Without profiles there's one called "default"."""
+	if not settings["profiles"]:
+		return [("default", settings)]
+	return [(profile["name"], profile_settings(settings, profile)) for profile in settings["profiles"]]
@@ -0,0 +1,724 @@
+import json, os, sqlite3, gzip
+from array import array
+from functools import lru_cache
+from histogram import json_default, to_bytes, decode as decode_histogram
+
+DATA_FILE = "screen_time_data.json"
+JOURNAL_FILE = "screen_time_data.journal"
+DATABASE_FILE = "screen_time_data.db"
+HISTORY_DIR = "screen_time_history"
+MANIFEST_FILE = "manifest.json"
+
+# Version 1 files are a plain {date: {process: [running, "H:MM"]}} dictionary. From version 2, durations are
+# integer seconds and the dates are saved under a "dates" key next to the schema version. Version 3 adds the
+# sessions of each process: {process: [running, seconds, [[pid, start, end], ...]]} with unix timestamps. Version 4
+# adds an hourly histogram of the seconds as a fourth item once time is credited: base64 of 24 little-endian uint32s.
+SCHEMA_VERSION = 4
+
+def parse_duration(duration):
+	"""Converts a version 1 "H:MM" duration to seconds. Durations that are already seconds are returned unchanged."""
+	if type(duration) != str:
+		return duration
+	hours, minutes = duration.split(":")
+	return int(hours) * 3600 + int(minutes) * 60
+
+def upgrade_process_data(process_data):
+	"""Changes a process's data as it was saved by any schema version to the form it's used in"""
+	process_data[1] = parse_duration(process_data[1])
+	if len(process_data) == 2:
+		process_data.append([]) # No sessions were recorded before version 3
+	elif len(process_data) == 4 and type(process_data[3]) != array:
+		process_data[3] = decode_histogram(process_data[3])
+
+def upgrade_screen_time_data(file_data):
+	"""
+	Returns the {date: {process: [running, seconds, sessions]}} dictionary stored in file_data, the content of a
+	screen time data file of any schema version. None is returned if file_data isn't valid screen time data.
+	"""
+	if type(file_data) != dict:
+		return None
+	version = file_data.get("schema_version", 1)
+	screen_time_data = file_data.get("dates") if version > 1 else file_data
+	if type(screen_time_data) != dict:
+		return None
+	for processes_data in screen_time_data.values():
+		for process_data in processes_data.values():
+			upgrade_process_data(process_data)
+	return screen_time_data
+
+def create_file_data(screen_time_data):
+	"""Returns the content of a screen time data file holding screen_time_data"""
+	return {"schema_version": SCHEMA_VERSION, "dates": screen_time_data}
+
+def write_text_atomically(text, file_name):
+	"""
+	Writes text (or bytes) to a temporary file and renames it to file_name. The rename replaces the old file in one
+	step so a crash in the middle of the write leaves the old file intact instead of a half written one.
+	"""
+	temp_file_name = file_name + ".tmp"
+	with open(temp_file_name, "wb" if type(text) == bytes else "w") as file:
+		file.write(text)
+		file.flush()
+		os.fsync(file.fileno())
+	os.replace(temp_file_name, file_name)
+
+def write_json_atomically(data, file_name):
+	write_text_atomically(json.dumps(data, default=json_default), file_name)
+
+def apply_journal_record(screen_time_data, record):
+	"""
+	Applies one journal record to screen_time_data. A record is a json list in one of these forms:
+	[date] adds an empty entry for date, [date, null] removes date and its data, [date, process] removes
+	process's data for date, [date, process, process_data] sets process's data for date and
+	[date, process, {"running", "seconds", "histogram", "sessions": {index: session}}] sets only the fields it holds, e.g
+	the time of a credit or the session that just started or ended. Sessions are set by their index so a record
+	that's replayed twice doesn't add a session twice.
+	"""
+	if len(record) == 2 and record[1] is None:
+		screen_time_data.pop(record[0], None)
+		return
+	date_data = screen_time_data.setdefault(record[0], {})
+	if len(record) == 2:
+		date_data.pop(record[1], None)
+	elif len(record) == 3 and type(record[2]) == dict:
+		fields = record[2]
+		process_data = date_data.setdefault(record[1], [False, 0, []])
+		if "running" in fields:
+			process_data[0] = fields["running"]
+		if "seconds" in fields:
+			process_data[1] = fields["seconds"]
+		sessions = process_data[2]
+		for index, session in sorted((int(index), session) for index, session in fields.get("sessions", {}).items()):
+			if index < len(sessions):
+				sessions[index] = session
+			else:
+				sessions.append(session)
+		if "histogram" in fields:
+			del process_data[3:]
+			process_data.append(decode_histogram(fields["histogram"]))
+	elif len(record) == 3:
+		upgrade_process_data(record[2]) # The journal may have been written by an older version of the monitor
+		date_data[record[1]] = record[2]
+
+def replay_journal(screen_time_data, journal_file=JOURNAL_FILE):
+	"""
+	Applies every complete record in the journal file to screen_time_data and returns the number of records applied.
+	Records only ever set or remove values so replaying a record that's already in screen_time_data changes nothing.
+	A line that was only partly written before a crash is skipped. Appends after it start on a new line so the records
+	that follow it are still read.
+	"""
+	records = 0
+	try:
+		with open(journal_file) as file:
+			for line in file:
+				try:
+					record = json.loads(line)
+				except json.decoder.JSONDecodeError:
+					continue # The record was only partly written before a crash
+				apply_journal_record(screen_time_data, record)
+				records += 1
+	except FileNotFoundError:
+		pass
+	return records
+
+def append_journal_lines(journal_lines, journal_file=JOURNAL_FILE):
+	"""
+	Appends journal lines to the journal file and waits for them to reach the disk. If the file doesn't end with a
+	newline, a crash cut its last line short and a newline is written first so the new records get lines of their own.
+	"""
+	data = journal_lines.encode()
+	with open(journal_file, "a+b") as file:
+		if file.seek(0, os.SEEK_END):
+			file.seek(-1, os.SEEK_END)
+			if file.read(1) != b"\n":
+				data = b"\n" + data
+		file.write(data)
+		file.flush()
+		os.fsync(file.fileno())
+
+class JournalStore:
+	"""
+	Stores screen time data as a snapshot json file and an append-only journal of the changes made since the
+	snapshot was written. Every change is appended to the journal as a short json line so the cost of saving
+	doesn't grow with the history. The journal is compacted into the snapshot every compact_every commits.
+	"""
+	has_full_history = True # load() returns every date
+
+	def __init__(self, data_file=DATA_FILE, journal_file=JOURNAL_FILE, compact_every=60):
+		self.data_file = data_file
+		self.journal_file = journal_file
+		self.compact_every = compact_every
+		self.pending_records = [] # Records that haven't been written to the journal yet
+		self.pending_entries = {} # {(date, process): index in pending_records} of the entries set since the last removal
+		self.commits = 0 # Commits since the last compaction
+
+	def load(self, date=None):
+		"""
+		Returns the screen time data in the snapshot file with the changes in the journal applied to it.
+		All dates are returned because a compaction rewrites the whole history. Files of an older schema
+		version are upgraded as they're loaded and saved in the current version by the next compaction.
+		"""
+		try:
+			with open(self.data_file) as file:
+				screen_time_data = upgrade_screen_time_data(json.load(file))
+		except (FileNotFoundError, json.decoder.JSONDecodeError):
+			screen_time_data = None
+		if screen_time_data is None:
+			screen_time_data = {}
+
+		replay_journal(screen_time_data, self.journal_file)
+		return screen_time_data
+
+	def add_date(self, date):
+		self.pending_records.append([date])
+
+	def add_record(self, date, process, value):
+		"""
+		Adds a record that sets process's entry for date, as a whole (a process_data list) or some of its fields (a
+		dictionary, see apply_journal_record). An entry is written at most once per commit: the fields are merged into a
+		pending record of the same entry, a whole entry replaces it, and fields are left out if the whole entry is
+		already pending since it's serialized as it is at the commit.
+		"""
+		index = self.pending_entries.get((date, process))
+		if index is None:
+			self.pending_entries[(date, process)] = len(self.pending_records)
+			self.pending_records.append([date, process, value])
+			return
+		pending = self.pending_records[index][2]
+		if type(value) != dict:
+			self.pending_records[index][2] = value
+		elif type(pending) == dict:
+			sessions = {**pending.get("sessions", {}), **value.get("sessions", {})}
+			pending.update(value)
+			if sessions:
+				pending["sessions"] = sessions
+
+	def set_entry(self, date, process, process_data):
+		self.add_record(date, process, process_data)
+
+	def set_time(self, date, process, process_data):
+		"""
+		Sets only the time and histogram of process's entry for date. The sessions aren't written again so the record
+		of a credit stays the same size however many sessions there are.
+		"""
+		fields = {"seconds": process_data[1]}
+		if len(process_data) == 4:
+			fields["histogram"] = process_data[3]
+		self.add_record(date, process, fields)
+
+	def set_running(self, date, process, process_data):
+		"""Sets only the running flag of process's entry for date"""
+		self.add_record(date, process, {"running": process_data[0]})
+
+	def set_session(self, date, process, process_data, index):
+		"""Sets only the session at index in process's sessions for date, which was just started or ended"""
+		self.add_record(date, process, {"sessions": {index: process_data[2][index]}})
+
+	def remove_entry(self, date, process):
+		self.pending_entries.pop((date, process), None)
+		self.pending_records.append([date, process])
+
+	def remove_date(self, date):
+		self.pending_entries = {}
+		self.pending_records.append([date, None])
+
+	def take_journal_lines(self):
+		"""Returns the pending records serialized as journal lines and forgets them"""
+		journal_lines = "".join(json.dumps(record, default=json_default) + "\n" for record in self.pending_records)
+		self.pending_records = []
+		self.pending_entries = {}
+		return journal_lines
+
+	def prepare_commit(self, screen_time_data, compact=False):
+		"""
+		Returns the pending records (and all of screen_time_data if the journal is due to be compacted) serialized into
+		a batch for write_batch. Nothing in the batch refers to screen_time_data so the batch can be written by another
+		thread while screen_time_data keeps changing.
+		"""
+		journal_lines = self.take_journal_lines()
+		self.commits += 1
+		snapshot = None
+		# A new store writes its snapshot on the first commit so the data file exists from the start
+		if compact or self.commits >= self.compact_every or not os.path.exists(self.data_file):
+			snapshot = json.dumps(create_file_data(screen_time_data), default=json_default)
+			self.commits = 0
+		return journal_lines, snapshot
+
+	def write_batch(self, batch):
+		"""
+		Appends a batch's records to the journal and, if the batch has a snapshot, compacts the journal into it.
+		Returns the number of characters written.
+		"""
+		journal_lines, snapshot = batch
+		if journal_lines:
+			append_journal_lines(journal_lines, self.journal_file)
+		if snapshot is None:
+			return len(journal_lines)
+
+		write_text_atomically(snapshot, self.data_file)
+		# The snapshot is complete before the journal is emptied so there's no point where data is only in memory
+		with open(self.journal_file, "w"):
+			pass
+		return len(journal_lines) + len(snapshot)
+
+	def commit(self, screen_time_data):
+		"""Appends the pending records to the journal and compacts the journal if it's due"""
+		self.write_batch(self.prepare_commit(screen_time_data))
+
+	def close(self):
+		pass # Files are only open while they're being read or written
+
+	def compact(self, screen_time_data):
+		"""Writes all of screen_time_data to the snapshot file and empties the journal"""
+		self.write_batch(self.prepare_commit(screen_time_data, compact=True))
+
+	def read_date(self, date):
+		"""Returns the data of every process for date or None if there's no record for date"""
+		return self.load().get(date)
+
+	def read_range(self, start_date, end_date):
+		"""Returns a dictionary of the data for each date from start_date to end_date (both inclusive)"""
+		return {date: data for date, data in self.load().items() if start_date <= date <= end_date}
+
+	def read_process(self, process, start_date, end_date):
+		"""Returns a dictionary of process's data for each date from start_date to end_date that it has a record for"""
+		return {
+			date: {process: data[process]} for date, data in self.read_range(start_date, end_date).items() if process in data
+		}
+
+class SqliteStore:
+	"""
+	Stores screen time data in an sqlite database with one row per (date, process). Saving only upserts the
+	rows that changed and reading a date or a range of dates is an indexed query, so neither the monitor
+	nor the CLI has to deserialize the whole history.
+	"""
+	has_full_history = False # load() only returns the current date
+
+	def __init__(self, database_file=DATABASE_FILE):
+		self.database_file = database_file
+		self.pending_records = [] # Same record format as JournalStore's journal
+		# The monitor may commit from a worker thread so the connection isn't tied to the thread that made it
+		self.connection = sqlite3.connect(database_file, check_same_thread=False)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		with self.connection:
+			version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+			if version < SCHEMA_VERSION:
+				self.upgrade_schema(version)
+
+	def upgrade_schema(self, version):
+		"""
+		Brings the database from an older schema version to the current one. Version 1 rows have their "H:MM" durations
+		converted to seconds, version 2 rows get an empty list of sessions and version 3 rows get no histogram.
+		"""
+		old_table = self.connection.execute(
+			"SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'screen_time'"
+		).fetchone()
+		if old_table and version >= 2:
+			if version < 3:
+				self.connection.execute("ALTER TABLE screen_time ADD COLUMN sessions TEXT NOT NULL DEFAULT '[]'")
+			self.connection.execute("ALTER TABLE screen_time ADD COLUMN histogram BLOB")
+		else:
+			if old_table:
+				self.connection.execute("ALTER TABLE screen_time RENAME TO screen_time_v1")
+				self.connection.execute("DROP INDEX IF EXISTS screen_time_process")
+			self.connection.execute(
+				"CREATE TABLE screen_time ("
+				"date TEXT NOT NULL, process TEXT NOT NULL, running INTEGER NOT NULL, seconds INTEGER NOT NULL, "
+				"sessions TEXT NOT NULL DEFAULT '[]', histogram BLOB, PRIMARY KEY (date, process)) WITHOUT ROWID"
+			)
+			self.connection.execute("CREATE INDEX screen_time_process ON screen_time (process, date)")
+			if old_table:
+				rows = self.connection.execute("SELECT date, process, running, duration FROM screen_time_v1").fetchall()
+				self.connection.executemany(
+					"INSERT INTO screen_time (date, process, running, seconds) VALUES (?, ?, ?, ?)",
+					((date, process, running, parse_duration(duration)) for date, process, running, duration in rows)
+				)
+				self.connection.execute("DROP TABLE screen_time_v1")
+		self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+	def close(self):
+		self.connection.close()
+
+	def query(self, sql, parameters=()):
+		"""
+		Returns the rows selected by sql grouped into a {date: {process: [running, seconds, sessions, histogram]}}
+		dictionary. Rows without a histogram give lists of three items.
+		"""
+		screen_time_data = {}
+		for date, process, running, seconds, sessions, histogram in self.connection.execute(sql, parameters):
+			process_data = [bool(running), seconds, json.loads(sessions)]
+			if histogram is not None:
+				process_data.append(decode_histogram(histogram))
+			screen_time_data.setdefault(date, {})[process] = process_data
+		return screen_time_data
+
+	def load(self, date):
+		"""Returns the screen time data for date only. It's the only date the monitor writes to."""
+		return self.read_range(date, date)
+
+	def read_date(self, date):
+		return self.query("SELECT date, process, running, seconds, sessions, histogram FROM screen_time WHERE date = ?", (date,)).get(date)
+
+	def read_range(self, start_date, end_date):
+		return self.query(
+			"SELECT date, process, running, seconds, sessions, histogram FROM screen_time WHERE date BETWEEN ? AND ? ORDER BY date",
+			(start_date, end_date)
+		)
+
+	def first_date(self):
+		"""Returns the first date with any data or None if there's none"""
+		return self.connection.execute("SELECT MIN(date) FROM screen_time").fetchone()[0]
+
+	def read_process(self, process, start_date, end_date):
+		"""Returns a dictionary of process's data for each date from start_date to end_date that it has a record for"""
+		return self.query(
+			"SELECT date, process, running, seconds, sessions, histogram FROM screen_time WHERE process = ? AND date BETWEEN ? AND ? ORDER BY date",
+			(process, start_date, end_date)
+		)
+
+	def add_date(self, date):
+		pass # A date exists as soon as one of its processes has a row
+
+	def set_entry(self, date, process, process_data):
+		self.pending_records.append([date, process, process_data])
+
+	def set_time(self, date, process, process_data):
+		"""Updates only the seconds and histogram of the row so a credit never writes the sessions again"""
+		self.pending_records.append([date, process, {"seconds": process_data[1], "histogram": process_data[3] if len(process_data) == 4 else None}])
+
+	def set_running(self, date, process, process_data):
+		self.set_entry(date, process, process_data)
+
+	def set_session(self, date, process, process_data, index):
+		self.set_entry(date, process, process_data) # The sessions are one column
+
+	def remove_entry(self, date, process):
+		self.pending_records.append([date, process])
+
+	def remove_date(self, date):
+		self.pending_records.append([date, None])
+
+	def prepare_commit(self, screen_time_data=None):
+		"""
+		Returns the pending records, in order, as (date, process, running, seconds, sessions, histogram) rows to upsert,
+		(seconds, histogram, date, process) rows to update, (date, process) rows to delete and (date,) rows whose whole
+		date is deleted. The rows are copies so the batch can be written by another thread.
+		"""
+		batch = []
+		for record in self.pending_records:
+			if len(record) == 3 and type(record[2]) == dict:
+				histogram = record[2]["histogram"]
+				batch.append((record[2]["seconds"], None if histogram is None else to_bytes(histogram), record[0], record[1]))
+			elif len(record) == 3:
+				process_data = record[2]
+				histogram = to_bytes(process_data[3]) if len(process_data) == 4 else None
+				batch.append((record[0], record[1], process_data[0], process_data[1], json.dumps(process_data[2]), histogram))
+			elif len(record) == 2:
+				batch.append((record[0],) if record[1] is None else (record[0], record[1]))
+		self.pending_records = []
+		return batch
+
+	def write_batch(self, batch):
+		"""
+		Writes a batch made by prepare_commit to the database in one transaction. Returns the size of the values
+		written, which is roughly what the database writes before its own overhead.
+		"""
+		written = 0
+		with self.connection:
+			for row in batch:
+				written += sum(len(str(value)) for value in row)
+				if len(row) == 6:
+					self.connection.execute(
+						"INSERT INTO screen_time (date, process, running, seconds, sessions, histogram) VALUES (?, ?, ?, ?, ?, ?) "
+						"ON CONFLICT (date, process) DO UPDATE SET running = excluded.running, seconds = excluded.seconds, "
+						"sessions = excluded.sessions, histogram = excluded.histogram",
+						row
+					)
+				elif len(row) == 4:
+					self.connection.execute("UPDATE screen_time SET seconds = ?, histogram = ? WHERE date = ? AND process = ?", row)
+				elif len(row) == 2:
+					self.connection.execute("DELETE FROM screen_time WHERE date = ? AND process = ?", row)
+				else:
+					self.connection.execute("DELETE FROM screen_time WHERE date = ?", row)
+		return written
+
+	def commit(self, screen_time_data=None):
+		"""Writes the pending records to the database in one transaction"""
+		self.write_batch(self.prepare_commit())
+
+	def compact(self, screen_time_data=None):
+		self.commit()
+		self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+	def import_data(self, screen_time_data):
+		"""Adds every process's data in screen_time_data to the database and returns the number of rows written"""
+		for date, processes_data in screen_time_data.items():
+			for process, process_data in processes_data.items():
+				self.set_entry(date, process, process_data)
+		rows = len(self.pending_records)
+		self.commit()
+		return rows
+
+@lru_cache(maxsize=24)
+def read_closed_shard(file_name):
+	"""
+	Returns the screen time data in a closed shard file. Closed shards never change so they're cached by file name.
+	The cached dictionary is shared so callers must not modify it.
+	"""
+	opener = gzip.open if file_name.endswith(".gz") else open
+	try:
+		with opener(file_name, "rt") as file:
+			return upgrade_screen_time_data(json.load(file)) or {}
+	except FileNotFoundError:
+		return {} # Every date of the shard was removed
+
+def write_shard_text(text, file_name):
+	"""Writes a shard file atomically, compressing it with gzip if file_name ends with .gz"""
+	if not file_name.endswith(".gz"):
+		write_text_atomically(text, file_name)
+		return
+	with gzip.open(file_name + ".tmp", "wt") as file:
+		file.write(text)
+	os.replace(file_name + ".tmp", file_name)
+
+class ShardedStore:
+	"""
+	Stores screen time data in one shard per month inside history_dir, with a manifest listing the shards. The shard
+	of the month being written is open: it's a JournalStore of its own. Once a newer month is written to, the older
+	shard is closed: it's written one last time (compressed with gzip if compress is True) and only changes again if
+	the retention policy removes its dates.
+	The monitor only holds the open month in memory and the CLI only reads the shards a query touches.
+	"""
+	has_full_history = False # load() only returns the month being written
+
+	def __init__(self, history_dir=HISTORY_DIR, compact_every=60, compress=True):
+		self.history_dir = history_dir
+		self.compact_every = compact_every
+		self.compress = compress
+		os.makedirs(history_dir, exist_ok=True)
+		self.manifest = self.read_manifest()
+		self.shards = {} # month: JournalStore of the open shards this store has written to
+		self.loaded_month = None # Month the monitor loaded. Shards of earlier months are closed by the next commit.
+		self.closed_removals = {} # month: dates to remove from the month's closed shard
+
+	def read_manifest(self):
+		"""Returns the manifest of the shards, {"schema_version": ..., "shards": {month: {"file": ..., "closed": ...}}}"""
+		try:
+			with open(os.path.join(self.history_dir, MANIFEST_FILE)) as file:
+				manifest = json.load(file)
+		except (FileNotFoundError, json.decoder.JSONDecodeError):
+			manifest = None
+		if type(manifest) != dict or type(manifest.get("shards")) != dict:
+			manifest = {"schema_version": SCHEMA_VERSION, "shards": {}}
+		# Closed shards whose every date was removed have no file
+		manifest["shards"] = {
+			month: entry for month, entry in manifest["shards"].items()
+			if not entry["closed"] or os.path.exists(os.path.join(self.history_dir, entry["file"]))
+		}
+		return manifest
+
+	def shard_file(self, month, extension):
+		return os.path.join(self.history_dir, month + extension)
+
+	def open_shard(self, month):
+		"""Returns the JournalStore of month's shard, creating the shard or reopening it if it was closed"""
+		shard = self.shards.get(month)
+		if shard is not None:
+			return shard
+		shard = JournalStore(self.shard_file(month, ".json"), self.shard_file(month, ".journal"), self.compact_every)
+		entry = self.manifest["shards"].get(month)
+		self.manifest["shards"][month] = {"file": month + ".json", "closed": False}
+		if entry and entry["closed"]:
+			# Something was recorded for a month that's already over (e.g the computer's clock was changed)
+			closed_file = os.path.join(self.history_dir, entry["file"])
+			write_json_atomically(create_file_data(read_closed_shard(closed_file)), shard.data_file)
+			write_json_atomically(self.manifest, os.path.join(self.history_dir, MANIFEST_FILE))
+			if closed_file != shard.data_file:
+				os.remove(closed_file)
+		self.shards[month] = shard
+		return shard
+
+	def read_shard(self, month):
+		"""Returns the screen time data of month's shard. It's empty if there's no shard for month."""
+		entry = self.manifest["shards"].get(month)
+		if entry is None:
+			return {}
+		if entry["closed"]:
+			return read_closed_shard(os.path.join(self.history_dir, entry["file"]))
+		return JournalStore(self.shard_file(month, ".json"), self.shard_file(month, ".journal")).load()
+
+	def load(self, date):
+		"""
+		Returns the screen time data of date's month. Shards of earlier months that were left open when the monitor last
+		stopped are closed by the next commit.
+		"""
+		month = self.loaded_month = date[:7]
+		for other_month, entry in list(self.manifest["shards"].items()):
+			if other_month < month and not entry["closed"]:
+				self.open_shard(other_month)
+		if self.manifest["shards"].get(month, {}).get("closed"):
+			self.open_shard(month) # The monitor writes to the month it loads so it can't stay closed
+		return self.read_shard(month)
+
+	def add_date(self, date):
+		self.open_shard(date[:7]).add_date(date)
+
+	def set_entry(self, date, process, process_data):
+		self.open_shard(date[:7]).set_entry(date, process, process_data)
+
+	def set_time(self, date, process, process_data):
+		self.open_shard(date[:7]).set_time(date, process, process_data)
+
+	def set_running(self, date, process, process_data):
+		self.open_shard(date[:7]).set_running(date, process, process_data)
+
+	def set_session(self, date, process, process_data, index):
+		self.open_shard(date[:7]).set_session(date, process, process_data, index)
+
+	def remove_entry(self, date, process):
+		self.open_shard(date[:7]).remove_entry(date, process)
+
+	def remove_date(self, date):
+		"""Removes date from its shard. A closed shard is rewritten without date by the next commit."""
+		month = date[:7]
+		entry = self.manifest["shards"].get(month)
+		if entry and entry["closed"]:
+			self.closed_removals.setdefault(month, set()).add(date)
+		else:
+			self.open_shard(month).remove_date(date)
+
+	def prepare_commit(self, screen_time_data, compact=False):
+		"""
+		Returns a batch for write_batch made of each open shard's batch. Every shard but the latest one is closed by the
+		batch, and the dates of closed shards are dropped from screen_time_data so only the open month stays in memory.
+		"""
+		shards = []
+		latest_month = max([*self.shards, self.loaded_month or ""])
+		for month, shard in list(self.shards.items()):
+			if month == latest_month:
+				month_data = {date: data for date, data in screen_time_data.items() if date[:7] == month}
+				shards.append((shard, shard.prepare_commit(month_data, compact), None))
+				continue
+			closed_file = month + (".json.gz" if self.compress else ".json")
+			shards.append((shard, (shard.take_journal_lines(), None), os.path.join(self.history_dir, closed_file)))
+			self.manifest["shards"][month] = {"file": closed_file, "closed": True}
+			del self.shards[month]
+			for date in [date for date in screen_time_data if date[:7] == month]:
+				del screen_time_data[date]
+		removals = [
+			(os.path.join(self.history_dir, self.manifest["shards"][month]["file"]), dates)
+			for month, dates in self.closed_removals.items()
+		]
+		self.closed_removals = {}
+		return shards, removals, json.dumps(self.manifest)
+
+	def write_batch(self, batch):
+		"""
+		Writes each shard's batch, then the closed shards, then the manifest. The files a closed shard was kept in while
+		it was open are only removed once the manifest points to its closed file. Returns the number of characters written.
+		"""
+		shards, removals, manifest = batch
+		written = 0
+		for shard, shard_batch, closed_file in shards:
+			written += shard.write_batch(shard_batch)
+			if closed_file is not None:
+				read_closed_shard.cache_clear() # The shard may have been closed before and reopened
+				text = json.dumps(create_file_data(shard.load()), default=json_default)
+				write_shard_text(text, closed_file)
+				written += len(text)
+		for closed_file, dates in removals:
+			written += self.rewrite_closed_shard(closed_file, dates)
+		write_text_atomically(manifest, os.path.join(self.history_dir, MANIFEST_FILE))
+
+		for shard, shard_batch, closed_file in shards:
+			if closed_file is not None:
+				for file_name in (shard.data_file, shard.journal_file):
+					if file_name != closed_file and os.path.exists(file_name):
+						os.remove(file_name)
+		return written + len(manifest)
+
+	def rewrite_closed_shard(self, closed_file, dates):
+		"""
+		Writes a closed shard again without dates, or removes it if no date is left. Returns the number of characters
+		written.
+		"""
+		screen_time_data = {date: data for date, data in read_closed_shard(closed_file).items() if date not in dates}
+		read_closed_shard.cache_clear()
+		if not screen_time_data:
+			if os.path.exists(closed_file):
+				os.remove(closed_file)
+			return 0
+		text = json.dumps(create_file_data(screen_time_data), default=json_default)
+		write_shard_text(text, closed_file)
+		return len(text)
+
+	def commit(self, screen_time_data):
+		self.write_batch(self.prepare_commit(screen_time_data))
+
+	def compact(self, screen_time_data):
+		self.write_batch(self.prepare_commit(screen_time_data, compact=True))
+
+	def close(self):
+		pass # Files are only open while they're being read or written
+
+	def months(self, start_date, end_date):
+		"""Returns the months that have a shard from start_date's month to end_date's month"""
+		return sorted(month for month in self.manifest["shards"] if start_date[:7] <= month <= end_date[:7])
+
+	def first_date(self):
+		"""Returns the first date with any data or None if there's none. Only the shards before it are read."""
+		for month in sorted(self.manifest["shards"]):
+			shard_data = self.read_shard(month)
+			if shard_data:
+				return min(shard_data)
+		return None
+
+	def read_date(self, date):
+		return self.read_shard(date[:7]).get(date)
+
+	def read_range(self, start_date, end_date):
+		"""Returns a dictionary of the data for each date from start_date to end_date, reading only the shards needed"""
+		screen_time_data = {}
+		for month in self.months(start_date, end_date):
+			shard_data = self.read_shard(month)
+			screen_time_data.update((date, shard_data[date]) for date in sorted(shard_data) if start_date <= date <= end_date)
+		return screen_time_data
+
+	def read_process(self, process, start_date, end_date):
+		return {
+			date: {process: data[process]} for date, data in self.read_range(start_date, end_date).items() if process in data
+		}
+
+	def import_data(self, screen_time_data):
+		"""Adds every process's data in screen_time_data to the shards and returns the number of records written"""
+		records = 0
+		for date, processes_data in sorted(screen_time_data.items()):
+			self.add_date(date)
+			for process, process_data in processes_data.items():
+				self.set_entry(date, process, process_data)
+				records += 1
+		self.compact(dict(screen_time_data))
+		return records
+
+def migrate_json_to_sqlite(data_file=DATA_FILE, journal_file=JOURNAL_FILE, database_file=DATABASE_FILE):
+	"""Copies the screen time data saved by a JournalStore into an sqlite database and returns the number of rows copied"""
+	store = SqliteStore(database_file)
+	try:
+		return store.import_data(JournalStore(data_file, journal_file).load())
+	finally:
+		store.close()
+
+def migrate_json_to_shards(data_file=DATA_FILE, journal_file=JOURNAL_FILE, history_dir=HISTORY_DIR):
+	"""Splits the screen time data saved by a JournalStore into monthly shards and returns the number of records copied"""
+	return ShardedStore(history_dir).import_data(JournalStore(data_file, journal_file).load())
+
+def get_store(settings):
+	"""Returns the store selected by the "storage" setting"""
+	if settings["storage"] == "sqlite":
+		return SqliteStore(settings["database_file"])
+	if settings["storage"] == "json":
+		return JournalStore(settings["data_file"], settings["journal_file"], settings["compact_every"])
+	if settings["storage"] == "sharded":
+		return ShardedStore(settings["history_dir"], settings["compact_every"], settings["compress_shards"])
+	raise ValueError(f"Unknown storage: {settings['storage']}")
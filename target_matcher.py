@@ -0,0 +1,104 @@
+import re
+from fnmatch import translate
+
+GLOB_CHARACTERS = set("*?[")
+
+def is_pattern(target):
+	"""Returns True if target is a glob pattern (e.g plugin_host-*.exe) instead of an exact process name"""
+	return not GLOB_CHARACTERS.isdisjoint(target)
+
+class TargetMatcher:
+	"""
+	Matches process names against the target processes. Exact names are looked up in a set and
+	all glob patterns are compiled into one combined regular expression, so matching a process
+	name doesn't depend on how many targets there are.
+	"""
+
+	def __init__(self, targets, aliases=None):
+		self.aliases = aliases or {} # {process name or pattern: alias} of the names that are counted as another target
+		self.exact_names = set()
+		self.patterns = [] # Glob patterns in the order they were given. A name matching many patterns goes to the first
+		for target in [*targets, *self.aliases]:
+			if is_pattern(target):
+				self.patterns.append(target)
+			else:
+				self.exact_names.add(target)
+
+		self.regex = None
+		if self.patterns:
+			# Each pattern gets its own named group so the pattern that matched can be known from match.lastgroup
+			groups = (f"(?P<p{i}>{translate(pattern)})" for i, pattern in enumerate(self.patterns))
+			self.regex = re.compile("|".join(groups))
+
+	def match(self, process_name):
+		"""Returns the target that process_name matches or None if it doesn't match any target"""
+		if process_name in self.exact_names:
+			return self.aliases.get(process_name, process_name)
+		if self.regex:
+			match = self.regex.match(process_name)
+			if match:
+				pattern = self.patterns[int(match.lastgroup[1:])]
+				return self.aliases.get(pattern, pattern)
+		return None
+
+	def matched_targets(self, process_names):
+		"""Returns the set of targets that are matched by at least one of the process names"""
+		matched = set()
+		for process_name in process_names:
+			target = self.match(process_name)
+			if target is not None:
+				matched.add(target)
+		return matched
+
+class TargetList:
+	"""
+	The targets of a target list resolved into the names their data is kept under and the indexes used to count them.
+	An item of the list is one of
+		"chrome.exe"                                             a process name or glob pattern
+		{"alias": "sublime", "names": ["sublime_text.exe", ...]}  an app that runs under several process names
+		{"group": "browsers", "members": ["chrome.exe", ...]}     targets whose time is also counted together
+	An alias's names are counted as the alias and aren't kept on their own. A group's members are targets or aliases
+	and the ones that aren't in the list are added to it. Items that are none of these are left out.
+	"""
+
+	def __init__(self, items):
+		self.names = [] # Names of the targets, aliases and groups, which the data is kept under, in the order they came
+		self.processes = [] # Process names and patterns matched as they are
+		self.aliases = {} # {process name or pattern: alias}
+		self.groups = {} # {group: [members]}
+		self.group_index = {} # {target or alias: [groups it's a member of]}
+		groups = []
+		for item in items:
+			if type(item) == str:
+				self.add(item)
+				self.processes.append(item)
+			elif type(item) == dict and type(item.get("alias")) == str and type(item.get("names")) == list:
+				self.add(item["alias"])
+				for name in item["names"]:
+					if type(name) == str:
+						self.aliases.setdefault(name, item["alias"])
+			elif type(item) == dict and type(item.get("group")) == str and type(item.get("members")) == list:
+				groups.append(item)
+		group_names = {item["group"] for item in groups}
+		for item in groups: # Once every target and alias is known
+			members = [member for member in dict.fromkeys(item["members"]) if type(member) == str and member not in group_names]
+			for member in members:
+				if member not in self.names:
+					self.add(member)
+					self.processes.append(member)
+				self.group_index.setdefault(member, []).append(item["group"])
+			self.groups.setdefault(item["group"], []).extend(members)
+			self.add(item["group"])
+
+	def add(self, name):
+		if name not in self.names:
+			self.names.append(name)
+
+	def matcher(self):
+		return TargetMatcher(self.processes, self.aliases)
+
+	def with_groups(self, running_targets):
+		"""Returns running_targets with the groups that have a running member. A group is in it once however many are."""
+		if not self.group_index:
+			return running_targets
+		return running_targets.union(*(self.group_index[target] for target in running_targets if target in self.group_index))
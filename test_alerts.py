@@ -0,0 +1,96 @@
+from unittest import TestCase
+import tempfile, os, json, sys, time
+from alerts import Rule, parse_rule, load_rules, AlertEngine
+from replay import VirtualClock
+
+class TestAlerts(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.log_file = os.path.join(self.temp_dir.name, "screen_time_alerts.log")
+		self.clock = VirtualClock(1666353600)
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def test_load_rules(self):
+		rules_file = os.path.join(self.temp_dir.name, "alert_rules.json")
+		self.assertEqual(load_rules(rules_file), [])
+		with open(rules_file, "w") as file:
+			json.dump([
+				{"name": "browsing", "process": "chrome.exe", "limit": "2:00"},
+				{"process": "cmd.exe", "limit": 600, "action": "command", "command": ["echo", "hi"], "cooldown": "0:30"},
+				{"process": "cmd.exe", "limit": "2h"}, {"process": "cmd.exe", "limit": 60, "action": "beep"},
+				{"process": "cmd.exe", "limit": 60, "action": "notify"}, {"limit": 60}, "chrome.exe",
+			], file)
+		rules = load_rules(rules_file)
+		self.assertEqual([(rule.name, rule.limit, rule.cooldown) for rule in rules], [("browsing", 7200, 3600), ("cmd.exe 600", 600, 1800)])
+		self.assertIsNone(parse_rule({"process": "cmd.exe", "limit": 0}))
+
+	def test_fires_once_per_crossing(self):
+		engine = AlertEngine([Rule("budget", "chrome.exe", 120, cooldown=0)], self.log_file, self.clock)
+		engine.update("2022-10-21", "cmd.exe", 600) # Processes without rules are ignored
+		engine.update("2022-10-21", "chrome.exe", 60)
+		self.assertEqual(engine.pending, [])
+		engine.update("2022-10-21", "chrome.exe", 120)
+		engine.update("2022-10-21", "chrome.exe", 180)
+		self.assertEqual([(rule.name, seconds) for rule, seconds, _ in engine.pending], [("budget", 120)])
+		engine.run_actions(engine.take_pending())
+		with open(self.log_file) as file:
+			self.assertEqual(file.read().split(" ", 2)[2], "budget: chrome.exe ran 0:02, over its limit of 0:02\n")
+		engine.update("2022-10-22", "chrome.exe", 120) # A new day
+		self.assertEqual(len(engine.take_pending()), 1)
+
+	def test_rate_limit(self):
+		engine = AlertEngine([Rule("budget", "chrome.exe", 120, cooldown=3600)], self.log_file, self.clock)
+		self.clock.now = time.mktime((2022, 10, 21, 23, 59, 0, 0, 0, -1))
+		engine.update("2022-10-21", "chrome.exe", 120)
+		self.clock.sleep(1800)
+		engine.update("2022-10-22", "chrome.exe", 120) # Within the cooldown of the last action
+		self.clock.sleep(3600)
+		engine.update("2022-10-22", "chrome.exe", 180) # The crossing was already counted
+		self.assertEqual(len(engine.take_pending()), 1)
+
+	def test_prime_and_set_rules(self):
+		rule = Rule("budget", "chrome.exe", 120, cooldown=0)
+		engine = AlertEngine([rule], self.log_file, self.clock)
+		engine.prime("2022-10-21", {"chrome.exe": [True, 300, []]}) # Crossed before a restart
+		engine.update("2022-10-21", "chrome.exe", 360)
+		self.assertEqual(engine.pending, [])
+		engine.set_rules([rule, Rule("cmd", "cmd.exe", 60)])
+		engine.update("2022-10-21", "chrome.exe", 420) # The rule didn't change so it stays fired
+		self.assertEqual(engine.pending, [])
+		engine.set_rules([Rule("budget", "chrome.exe", 400, cooldown=0)]) # A new limit can be crossed again
+		engine.update("2022-10-21", "chrome.exe", 480)
+		self.assertEqual(len(engine.take_pending()), 1)
+
+	def test_actions(self):
+		notification_file = os.path.join(self.temp_dir.name, "notification.json")
+		output_file = os.path.join(self.temp_dir.name, "command_output")
+		code = f"import os; open({output_file!r}, 'w').write(os.environ['SCREEN_TIME_PROCESS'] + ' ' + os.environ['SCREEN_TIME_SECONDS'])"
+		engine = AlertEngine([
+			Rule("notify", "chrome.exe", 60, "notify", file=notification_file),
+			Rule("command", "chrome.exe", 60, "command", command=[sys.executable, "-c", code]),
+			Rule("broken", "chrome.exe", 60, "command", command=[os.path.join(self.temp_dir.name, "missing")]),
+		], self.log_file, self.clock)
+		engine.update("2022-10-21", "chrome.exe", 60)
+		engine.run_actions(engine.take_pending())
+		with open(notification_file) as file:
+			self.assertEqual(json.load(file)["seconds"], 60)
+		for _ in range(100): # The command isn't waited for
+			if os.path.exists(output_file) and os.path.getsize(output_file):
+				break
+			time.sleep(0.05)
+		with open(output_file) as file:
+			self.assertEqual(file.read(), "chrome.exe 60")
+		with open(self.log_file) as file:
+			self.assertIn("broken: the command action failed", file.read())
+
+	def test_log_only(self):
+		notification_file = os.path.join(self.temp_dir.name, "notification.json")
+		engine = AlertEngine([Rule("notify", "chrome.exe", 60, "notify", file=notification_file)], self.log_file, self.clock)
+		engine.log_only = True
+		engine.update("2022-10-21", "chrome.exe", 60)
+		engine.run_actions(engine.take_pending())
+		self.assertFalse(os.path.exists(notification_file))
+		with open(self.log_file) as file:
+			self.assertTrue(file.read().endswith("over its limit of 0:01 (the notify action wasn't run)\n"))
@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import tempfile, os, json
+from archive import Archive, write_archive, with_archive, convert_json_to_archive
+from storage import create_file_data
+from histogram import new_histogram, json_default
+
+class TestArchive(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.archive_file = os.path.join(self.temp_dir.name, "screen_time_archive.bin")
+		self.histogram = new_histogram()
+		self.histogram[14] = 600
+		self.screen_time_data = {
+			"2022-10-21": {"chrome.exe": [False, 600, [[1, 1666357200, 1666357800]], self.histogram], "cmd.exe": [False, 60, []]},
+			"2022-10-23": {"cmd.exe": [True, 120, []], "süblime_text.exe": [False, 7200, []]},
+		}
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def test_write_and_read(self):
+		self.assertEqual(write_archive(self.screen_time_data, self.archive_file), 4)
+		with Archive(self.archive_file) as archive:
+			self.assertEqual(archive.names, ["chrome.exe", "cmd.exe", "süblime_text.exe"]) # cmd.exe is only stored once
+			self.assertEqual((archive.first_date, archive.last_date), ("2022-10-21", "2022-10-23"))
+			# Sessions aren't archived and the days are over so nothing is running
+			self.assertEqual(archive.read_date("2022-10-21"), {"chrome.exe": [False, 600, [], self.histogram], "cmd.exe": [False, 60, []]})
+			self.assertIsNone(archive.read_date("2022-10-22"))
+			self.assertEqual(list(archive.read_range("2022-10-22", "2022-12-31")), ["2022-10-23"])
+			self.assertEqual(archive.read_process("cmd.exe", "2022-10-01", "2022-10-31"), {
+				"2022-10-21": {"cmd.exe": [False, 60, []]}, "2022-10-23": {"cmd.exe": [False, 120, []]}
+			})
+			self.assertEqual(archive.read_process("firefox.exe", "2022-10-01", "2022-10-31"), {})
+
+	def test_empty_and_invalid_archives(self):
+		write_archive({}, self.archive_file)
+		with Archive(self.archive_file) as archive:
+			self.assertEqual(archive.load(), {})
+			self.assertIsNone(archive.last_date)
+		with open(self.archive_file, "wb") as file:
+			file.write(b"not an archive at all.....")
+		self.assertRaises(ValueError, Archive, self.archive_file)
+
+	def test_with_archive(self):
+		write_archive(self.screen_time_data, self.archive_file)
+		read_range = Mock(return_value={"2022-10-24": {"cmd.exe": [True, 60, []]}})
+		with Archive(self.archive_file) as archive:
+			read_archived_range = with_archive(read_range, archive)
+			self.assertEqual(list(read_archived_range("2022-10-01", "2022-10-22")), ["2022-10-21"])
+			read_range.assert_not_called()
+			self.assertEqual(list(read_archived_range("2022-10-22", "2022-10-31")), ["2022-10-23", "2022-10-24"])
+			read_range.assert_called_once_with("2022-10-24", "2022-10-31")
+
+	def test_convert_json_to_archive(self):
+		data_file = os.path.join(self.temp_dir.name, "screen_time_data.json")
+		journal_file = os.path.join(self.temp_dir.name, "screen_time_data.journal")
+		write_archive({"2022-10-01": {"cmd.exe": [False, 30, []]}}, self.archive_file)
+		with open(data_file, "w") as file:
+			json.dump(create_file_data(self.screen_time_data), file, default=json_default)
+		with open(journal_file, "w") as journal:
+			journal.write('["2022-10-22", "cmd.exe", [false, 90, []]]\n')
+
+		self.assertEqual(convert_json_to_archive(data_file, journal_file, self.archive_file, before="2022-10-23"), 4)
+		with Archive(self.archive_file) as archive:
+			self.assertEqual(list(archive.load()), ["2022-10-01", "2022-10-21", "2022-10-22"])
+		self.assertLess(os.path.getsize(self.archive_file), os.path.getsize(data_file))
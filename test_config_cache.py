@@ -0,0 +1,57 @@
+from unittest import TestCase, skipIf
+from unittest.mock import Mock
+import tempfile, os, json
+from config_cache import ConfigCache, get_watcher
+
+class TestConfigCache(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.file_name = os.path.join(self.temp_dir.name, "target_processes.json")
+		self.write(["chrome.exe"])
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def write(self, data, mtime=None):
+		with open(self.file_name, "w") as file:
+			json.dump(data, file)
+		if mtime:
+			os.utime(self.file_name, ns=(mtime, mtime))
+
+	def load(self):
+		with open(self.file_name) as file:
+			return json.load(file)
+
+	def test_reloads_only_on_change(self):
+		loader = Mock(side_effect=self.load)
+		cache = ConfigCache(self.file_name, loader)
+		value = cache.get()
+		self.assertEqual(value, ["chrome.exe"])
+		self.assertIs(cache.get(), value)
+		self.assertEqual(loader.call_count, 1)
+
+		self.write(["chrome.exe", "firefox.exe"], mtime=10**18)
+		self.assertEqual(cache.get(), ["chrome.exe", "firefox.exe"])
+		self.assertEqual(cache.reloads, 2)
+
+	def test_watcher(self):
+		watcher = Mock()
+		watcher.changed.return_value = False
+		cache = ConfigCache(self.file_name, self.load, watcher)
+		cache.get()
+		self.write(["firefox.exe"], mtime=10**18)
+		self.assertEqual(cache.get(), ["chrome.exe"]) # Nothing was reported by the watcher
+		watcher.changed.return_value = True
+		self.assertEqual(cache.get(), ["firefox.exe"])
+
+	@skipIf(get_watcher(__file__) is None, "inotify is not available")
+	def test_inotify_watcher(self):
+		watcher = get_watcher(self.file_name)
+		self.assertFalse(watcher.changed())
+		with open(os.path.join(self.temp_dir.name, "other.json"), "w") as file:
+			file.write("[]")
+		self.assertFalse(watcher.changed())
+		self.write(["firefox.exe"])
+		self.assertTrue(watcher.changed())
+		self.assertFalse(watcher.changed())
+		watcher.close()
@@ -0,0 +1,53 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from io import StringIO
+import tempfile, os
+from export import month_spans, iter_records, write_csv, write_ndjson, read_cursor, write_cursor
+
+HISTORY = {
+	"2022-09-30": {"cmd.exe": [False, 60, []], "chrome.exe": [False, 600, [[1, 1664521200, 1664521800]]]},
+	"2022-10-01": {"chrome.exe": [False, 120, []]},
+}
+
+def read_history(first_date, last_date):
+	return {date: data for date, data in HISTORY.items() if first_date <= date <= last_date}
+
+class TestExport(TestCase):
+	def test_month_spans(self):
+		self.assertEqual(list(month_spans("2022-09-15", "2022-11-02")), [
+			("2022-09-15", "2022-09-30"), ("2022-10-01", "2022-10-31"), ("2022-11-01", "2022-11-02")
+		])
+		self.assertEqual(list(month_spans("", "2022-11-02")), [("", "2022-11-02")])
+		self.assertEqual(list(month_spans("2022-11-03", "2022-11-02")), [])
+
+	def test_iter_records(self):
+		read_range = Mock(side_effect=read_history)
+		records = iter_records(read_range, "2022-09-01", "2022-10-31")
+		read_range.assert_not_called() # Nothing is read until the records are asked for
+		self.assertEqual(list(records), [
+			{"date": "2022-09-30", "process": "chrome.exe", "seconds": 600},
+			{"date": "2022-09-30", "process": "cmd.exe", "seconds": 60},
+			{"date": "2022-10-01", "process": "chrome.exe", "seconds": 120},
+		])
+		self.assertEqual(read_range.call_count, 2) # One read per month
+		records = list(iter_records(read_history, "2022-09-01", "2022-09-30", {"chrome.exe"}, sessions=True))
+		self.assertEqual(records, [{"date": "2022-09-30", "process": "chrome.exe", "seconds": 600, "sessions": [[1, 1664521200, 1664521800]]}])
+
+	def test_writers(self):
+		file = StringIO()
+		self.assertEqual(write_csv(iter_records(read_history, "2022-09-30", "2022-09-30", sessions=True), file, sessions=True), 2)
+		self.assertEqual(file.getvalue(), (
+			"date,process,seconds,sessions\n"
+			'2022-09-30,chrome.exe,600,"[[1,1664521200,1664521800]]"\n'
+			"2022-09-30,cmd.exe,60,[]\n"
+		))
+		file = StringIO()
+		self.assertEqual(write_ndjson(iter_records(read_history, "2022-10-01", "2022-10-31"), file), 1)
+		self.assertEqual(file.getvalue(), '{"date":"2022-10-01","process":"chrome.exe","seconds":120}\n')
+
+	def test_cursor(self):
+		with tempfile.TemporaryDirectory() as temp_dir:
+			cursor_file = os.path.join(temp_dir, "export.cursor")
+			self.assertEqual(read_cursor(cursor_file), "")
+			write_cursor(cursor_file, "2022-10-01")
+			self.assertEqual(read_cursor(cursor_file), "2022-10-01")
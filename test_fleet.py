@@ -0,0 +1,91 @@
+from unittest import TestCase
+from io import StringIO
+import tempfile, os, json
+from fleet import find_hosts, aggregate_host, merge_aggregates, merge_fleet, write_report
+from storage import create_file_data
+from archive import write_archive
+
+class TestFleet(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.directory = self.temp_dir.name
+		self.write_json("alpha", {
+			"2022-10-20": {"chrome.exe": [False, 600, []], "cmd.exe": [False, 0, []]}, "2022-10-21": {"chrome.exe": [True, 60, []]}
+		})
+		with open(os.path.join(self.directory, "alpha.journal"), "w") as file:
+			file.write('["2022-10-21", "chrome.exe", [false, 120, []]]\n') # Saved after the snapshot
+		write_archive({"2022-10-19": {"firefox.exe": [False, 300, []]}}, os.path.join(self.directory, "beta.bin"))
+		self.write_json("beta", {"2022-10-19": {"firefox.exe": [False, 1, []]}, "2022-10-20": {"chrome.exe": [False, 30, []]}})
+		with open(os.path.join(self.directory, "broken.bin"), "wb") as file:
+			file.write(b"not an archive")
+		with open(os.path.join(self.directory, "notes.txt"), "w") as file:
+			file.write("not a host")
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def write_json(self, host, screen_time_data):
+		with open(os.path.join(self.directory, host + ".json"), "w") as file:
+			json.dump(create_file_data(screen_time_data), file)
+
+	def test_find_hosts(self):
+		self.assertEqual([host for host, _, _ in find_hosts(self.directory)], ["alpha", "beta", "broken"])
+		self.assertEqual(find_hosts(self.directory)[1][1:], (os.path.join(self.directory, "beta.json"), os.path.join(self.directory, "beta.bin")))
+
+	def test_aggregate_host(self):
+		host, json_file, archive_file = find_hosts(self.directory)[1]
+		# The archive holds the dates up to its last date and the json file the ones after it
+		self.assertEqual(
+			aggregate_host((host, json_file, archive_file, "0001-01-01", "9999-12-31")),
+			("beta", {"2022-10-19": {"firefox.exe": 300}, "2022-10-20": {"chrome.exe": 30}}, None)
+		)
+		host, dates, error = aggregate_host(("broken", None, os.path.join(self.directory, "broken.bin"), "0001-01-01", "9999-12-31"))
+		self.assertEqual(dates, {})
+		self.assertIsNotNone(error)
+
+	def test_invalid_json_files(self):
+		for host, text in (
+			("truncated", json.dumps(create_file_data({"2022-10-20": {"chrome.exe": [False, 600, []]}}))[:-10]),
+			("malformed", '{"schema_version": 3, "dates": {"2022-10-20": [1, 2]}}'),
+			("bad_seconds", '{"schema_version": 3, "dates": {"2022-10-20": {"chrome.exe": [false, "600", []]}}}'),
+			("not_data", '[1, 2]'),
+		):
+			json_file = os.path.join(self.directory, host + ".json")
+			with open(json_file, "w") as file:
+				file.write(text)
+			host_name, dates, error = aggregate_host((host, json_file, None, "0001-01-01", "9999-12-31"))
+			self.assertEqual(dates, {}, host)
+			self.assertIsNotNone(error, host)
+		merged = merge_fleet(self.directory, workers=1)
+		self.assertEqual(list(merged["errors"]), ["bad_seconds", "broken", "malformed", "not_data", "truncated"])
+		self.assertEqual(merged["fleet"]["hosts"], 2)
+
+	def test_merge_aggregates(self):
+		merged = merge_aggregates([
+			("b", {"2022-10-20": {"chrome.exe": 30}}, None), ("a", {"2022-10-20": {"cmd.exe": 5, "chrome.exe": 10}}, None),
+			("c", {}, "bad file")
+		])
+		self.assertEqual(merged, {
+			"fleet": {"hosts": 2, "dates": {"2022-10-20": {"chrome.exe": 40, "cmd.exe": 5}}, "totals": {"chrome.exe": 40, "cmd.exe": 5}},
+			"hosts": {
+				"a": {"dates": {"2022-10-20": {"chrome.exe": 10, "cmd.exe": 5}}, "totals": {"chrome.exe": 10, "cmd.exe": 5}},
+				"b": {"dates": {"2022-10-20": {"chrome.exe": 30}}, "totals": {"chrome.exe": 30}},
+			},
+			"errors": {"c": "bad file"},
+		})
+
+	def test_merge_fleet(self):
+		merged = merge_fleet(self.directory, "2022-10-20", "2022-10-21", workers=1)
+		self.assertEqual(merged["fleet"]["dates"], {"2022-10-20": {"chrome.exe": 630}, "2022-10-21": {"chrome.exe": 120}})
+		self.assertEqual(merged["hosts"]["alpha"]["totals"], {"chrome.exe": 720})
+		self.assertEqual(list(merged["errors"]), ["broken"])
+		# The same merge in a process pool gives the same result
+		self.assertEqual(json.dumps(merge_fleet(self.directory, "2022-10-20", "2022-10-21", workers=2)), json.dumps(merged))
+
+	def test_write_report(self):
+		file = StringIO()
+		write_report(merge_fleet(self.directory, workers=1), file, top=1)
+		report = file.getvalue()
+		self.assertTrue(report.startswith("Fleet of 2 hosts (2022-10-19 to 2022-10-21)\n  chrome.exe"))
+		self.assertIn("\nbeta\n  firefox.exe", report)
+		self.assertIn("broken couldn't be read", report)
@@ -0,0 +1,32 @@
+from unittest import TestCase
+import json
+from histogram import BUCKETS, new_histogram, add_time, to_bytes, encode, decode, json_default, sum_histograms
+
+class TestHistogram(TestCase):
+	def test_add_time(self):
+		histogram = new_histogram()
+		self.assertEqual(len(histogram), BUCKETS)
+		add_time(histogram, 3630, 90) # 60 seconds before 1:00 and 30 after it
+		self.assertEqual((histogram[0], histogram[1]), (60, 30))
+		add_time(histogram, 86400, 40)
+		self.assertEqual(histogram[23], 40)
+		add_time(histogram, 20, 60) # seconds before midnight belong to the day before
+		self.assertEqual(histogram[0], 80)
+		self.assertEqual(sum(histogram), 150)
+
+	def test_encode_and_decode(self):
+		histogram = new_histogram()
+		histogram[5], histogram[17] = 3600, 70000
+		self.assertEqual(len(to_bytes(histogram)), 4 * BUCKETS)
+		self.assertEqual(to_bytes(histogram)[20:24], (3600).to_bytes(4, "little"))
+		self.assertEqual(decode(encode(histogram)), histogram)
+		self.assertEqual(decode(to_bytes(histogram)), histogram)
+		self.assertEqual(json.loads(json.dumps([histogram], default=json_default)), [encode(histogram)])
+		self.assertRaises(TypeError, json.dumps, {1, 2}, default=json_default)
+
+	def test_sum_histograms(self):
+		first, second = new_histogram(), new_histogram()
+		first[3], second[3], second[4] = 60, 30, 10
+		total = sum_histograms([first, second])
+		self.assertEqual((total[3], total[4], sum(total)), (90, 10, 100))
+		self.assertEqual(sum_histograms([]), new_histogram())
@@ -0,0 +1,41 @@
+from unittest import TestCase
+import tempfile, os, subprocess, sys
+from instance_lock import InstanceLock, read_daemon_pid
+
+class TestInstanceLock(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.lock_file = os.path.join(self.temp_dir.name, "screen_time.pid")
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def test_acquire_and_release(self):
+		self.assertIsNone(read_daemon_pid(self.lock_file))
+		lock = InstanceLock(self.lock_file)
+		self.assertTrue(lock.acquire())
+		self.assertEqual(read_daemon_pid(self.lock_file), os.getpid())
+		self.assertFalse(InstanceLock(self.lock_file).acquire()) # A second instance can't take the lock
+		lock.release()
+		self.assertIsNone(read_daemon_pid(self.lock_file))
+		self.assertTrue(lock.acquire())
+		lock.release()
+
+	def test_stale_pid_file(self):
+		with open(self.lock_file, "w") as file:
+			file.write("999999") # Left behind by a process that crashed, so nothing holds the lock
+		self.assertIsNone(read_daemon_pid(self.lock_file))
+		lock = InstanceLock(self.lock_file)
+		self.assertTrue(lock.acquire())
+		self.assertEqual(read_daemon_pid(self.lock_file), os.getpid())
+		lock.release()
+
+	def test_lock_held_by_another_process(self):
+		code = f"from instance_lock import InstanceLock; import sys; print(InstanceLock({self.lock_file!r}).acquire())"
+		lock = InstanceLock(self.lock_file)
+		lock.acquire()
+		try:
+			result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+			self.assertEqual(result.stdout.strip(), "False")
+		finally:
+			lock.release()
@@ -0,0 +1,45 @@
+from unittest import TestCase
+import tempfile, os, pstats
+from metrics import Metrics, TickProfiler, current_rss
+
+class TestMetrics(TestCase):
+	def test_ring_buffer(self):
+		metrics = Metrics(size=2)
+		for scan_seconds in (0.5, 0.25, 0.75):
+			metrics.record("tick", scan_seconds=scan_seconds, processes=100)
+		self.assertEqual(len(metrics.samples["tick"]), 2)
+		self.assertEqual(metrics.totals["tick"], 3)
+		self.assertEqual(metrics.latest("tick"), {"scan_seconds": 0.75, "processes": 100})
+		self.assertIsNone(metrics.latest("save"))
+
+	def test_to_prometheus(self):
+		metrics = Metrics()
+		metrics.record("save", seconds=0.5, bytes_written=100)
+		metrics.record("save", seconds=1.5, bytes_written=None)
+		text = metrics.to_prometheus()
+		self.assertIn("screen_time_save_total 2\n", text)
+		self.assertIn('screen_time_save_seconds{stat="last"} 1.5\n', text)
+		self.assertIn('screen_time_save_seconds{stat="avg"} 1.0\n', text)
+		self.assertIn('screen_time_save_bytes_written{stat="max"} 100\n', text)
+
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_name = os.path.join(temp_dir, "metrics.prom")
+			metrics.write_snapshot(file_name)
+			with open(file_name) as file:
+				self.assertEqual(file.read(), text)
+
+	def test_current_rss(self):
+		rss = current_rss()
+		self.assertTrue(rss is None or rss > 0)
+
+	def test_tick_profiler(self):
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_name = os.path.join(temp_dir, "screen_time.prof")
+			profiler = TickProfiler(2, file_name)
+			for _ in range(3):
+				self.assertEqual(profiler.call(sorted, [3, 1, 2]), [1, 2, 3])
+				profiler.tick_done()
+			self.assertEqual(profiler.ticks_left, 0)
+			self.assertIsInstance(pstats.Stats(file_name), pstats.Stats)
+
+		self.assertEqual(TickProfiler().call(len, "abc"), 3)
@@ -0,0 +1,83 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import subprocess, tempfile, os
+import process_sources
+from process_sources import TasklistSource, ProcSource, FakeSource, get_process_source
+
+class TestOutput:
+	stdout = ('"SynTPEnh.exe","6268","Console","54","15,832 K"\n' +
+			  '"chrome.exe","2116","Console","54","125,788 K"\n' +
+			  '"plugin_host-3.3.exe","3140","Console","54","37,212 K"\n')
+
+class TestProcessSources(TestCase):
+	def test_tasklist_source(self):
+		backup_run = subprocess.run
+		subprocess.run = Mock(return_value=TestOutput)
+		try:
+			self.assertEqual(TasklistSource().process_names(), ["SynTPEnh.exe", "chrome.exe", "plugin_host-3.3.exe"])
+			source = TasklistSource()
+			self.assertEqual(source.snapshot(), {6268: "SynTPEnh.exe", 2116: "chrome.exe", 3140: "plugin_host-3.3.exe"})
+			# The memory comes from the last snapshot's output
+			self.assertEqual(source.resource_usage([2116, 99]), {2116: (125788 * 1024, None)})
+		finally:
+			subprocess.run = backup_run
+
+	def write_process(self, proc_dir, pid, name, start_time=1000):
+		os.makedirs(os.path.join(proc_dir, pid), exist_ok=True)
+		with open(os.path.join(proc_dir, pid, "comm"), "w") as file:
+			file.write(name + "\n")
+		with open(os.path.join(proc_dir, pid, "stat"), "w") as file:
+			file.write(f"{pid} ({name}) S 1 {pid} {pid} 0 -1 4194560 100 0 0 0 250 50 0 0 20 0 30 0 {start_time} 500000000 2000\n")
+
+	def test_proc_source(self):
+		with tempfile.TemporaryDirectory() as proc_dir:
+			self.write_process(proc_dir, "1", "systemd")
+			self.write_process(proc_dir, "42", "Web Content")
+			os.mkdir(os.path.join(proc_dir, "sys")) # not a process directory
+			os.mkdir(os.path.join(proc_dir, "77")) # process that exited before it could be read
+			self.assertEqual(sorted(ProcSource(proc_dir).process_names()), ["Web Content", "systemd"])
+			usage = ProcSource(proc_dir).resource_usage([42, 77])
+			self.assertEqual(usage, {42: (2000 * process_sources.PAGE_SIZE, 300 / process_sources.CLOCK_TICKS)})
+
+	def test_proc_source_reused_pids(self):
+		with tempfile.TemporaryDirectory() as proc_dir:
+			self.write_process(proc_dir, "100", "chrome")
+			source = ProcSource(proc_dir)
+			self.assertEqual(source.snapshot(), {100: "chrome"})
+			with open(os.path.join(proc_dir, "100", "comm"), "w") as file:
+				file.write("renamed\n")
+			# The name of a process that's still running isn't read again
+			self.assertEqual(source.snapshot({100: "chrome"}), {100: "chrome"})
+			self.write_process(proc_dir, "100", "bash", start_time=2000) # chrome exited and its pid was reused
+			self.assertEqual(source.snapshot({100: "chrome"}), {100: "bash"})
+
+	def test_proc_source_long_names(self):
+		with tempfile.TemporaryDirectory() as proc_dir:
+			for pid, comm, cmdline, exe in (
+				("1", "gnome-terminal-", b"/usr/libexec/gnome-terminal-server\0--foo\0", None),
+				("2", "soffice.bin-lon", b"", "/opt/office/soffice.bin-long-name"), # The command line is empty
+				("3", "Web Content-wit", b"/usr/lib/firefox/firefox\0-contentproc\0", None), # Renamed its thread
+				("4", "short", b"/usr/bin/something-else\0", None),
+			):
+				self.write_process(proc_dir, pid, comm)
+				with open(os.path.join(proc_dir, pid, "cmdline"), "wb") as file:
+					file.write(cmdline)
+				if exe:
+					os.symlink(exe, os.path.join(proc_dir, pid, "exe"))
+			self.assertEqual(ProcSource(proc_dir).snapshot(), {
+				1: "gnome-terminal-server", 2: "soffice.bin-long-name", 3: "Web Content-wit", 4: "short"
+			})
+
+	def test_fake_source(self):
+		source = FakeSource(["chrome.exe", "cmd.exe"])
+		self.assertEqual(source.process_names(), ["chrome.exe", "cmd.exe"])
+		self.assertEqual(source.snapshot(), {1: "chrome.exe", 2: "cmd.exe"})
+		self.assertEqual(FakeSource({10: "chrome.exe"}).snapshot(), {10: "chrome.exe"})
+		self.assertEqual(FakeSource({10: "chrome.exe"}, {10: (100, 1.5)}).resource_usage([10, 11]), {10: (100, 1.5)})
+
+	def test_get_process_source(self):
+		self.assertIsInstance(get_process_source("tasklist"), TasklistSource)
+		self.assertIsInstance(get_process_source("fake"), FakeSource)
+		self.assertRaises(ValueError, get_process_source, "random")
+		with patch.object(process_sources.sys, "platform", "win32"):
+			self.assertIsInstance(get_process_source(), TasklistSource)
@@ -0,0 +1,43 @@
+from unittest import TestCase, skipIf
+import tempfile, os, socket, asyncio
+from query_server import answer_query, start_query_server, stop_query_server, query_daemon
+
+SCREEN_TIME_DATA = {
+	"2022-10-21": {"chrome.exe": [False, 600], "firefox.exe": [False, 60]},
+	"2022-10-22": {"chrome.exe": [True, 120]}
+}
+
+class TestQueryServer(TestCase):
+	def answer(self, request, has_full_history=True):
+		return answer_query(request, SCREEN_TIME_DATA, "2022-10-22", has_full_history)
+
+	def test_answer_query(self):
+		self.assertEqual(self.answer({"command": "today"}), {"ok": True, "date": "2022-10-22", "data": {"chrome.exe": [True, 120]}})
+		self.assertEqual(self.answer({"command": "date", "date": "2022-10-21"})["data"], SCREEN_TIME_DATA["2022-10-21"])
+		self.assertIsNone(self.answer({"command": "date", "date": "2022-10-20"})["data"])
+		self.assertEqual(self.answer({"command": "process", "process": "chrome.exe"})["data"], [True, 120])
+		self.assertEqual(self.answer({"command": "process", "process": "firefox.exe", "date": "2022-10-21"})["data"], [False, 60])
+		self.assertEqual(
+			self.answer({"command": "range", "from": "2022-10-01", "to": "2022-10-31"}),
+			{"ok": True, "data": {"chrome.exe": 720, "firefox.exe": 60}}
+		)
+		self.assertFalse(self.answer({"command": "range", "from": "2022-10-01", "to": "2022-10-31"}, False)["ok"])
+		self.assertFalse(self.answer({"command": "random"})["ok"])
+
+	@skipIf(not hasattr(socket, "AF_UNIX"), "unix domain sockets are not supported")
+	def test_query_daemon(self):
+		async def serve(socket_file):
+			server = await start_query_server(self.answer, socket_file)
+			try:
+				self.assertIsNone(await start_query_server(self.answer, socket_file)) # A server is already listening
+				# query_daemon blocks so it runs in a thread while the event loop serves it
+				answer = await asyncio.to_thread(query_daemon, {"command": "today"}, socket_file)
+				self.assertEqual(answer["data"], {"chrome.exe": [True, 120]})
+			finally:
+				await stop_query_server(server, socket_file)
+
+		with tempfile.TemporaryDirectory() as temp_dir:
+			socket_file = os.path.join(temp_dir, "screen_time.sock")
+			self.assertIsNone(query_daemon({"command": "today"}, socket_file))
+			asyncio.run(serve(socket_file))
+			self.assertIsNone(query_daemon({"command": "today"}, socket_file))
@@ -0,0 +1,104 @@
+from unittest import TestCase
+from datetime import datetime
+import tempfile, os, json
+from replay import RecordingSource, read_recording, generate_snapshots, VirtualClock, replay
+from process_sources import FakeSource
+from storage import JournalStore
+from settings import DEFAULT_SETTINGS, PROFILE_FILES
+from screen_time_bg import create_daemon
+
+class TestReplay(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.settings = dict(DEFAULT_SETTINGS, watch_config=False)
+		for key in PROFILE_FILES:
+			self.settings[key] = os.path.join(self.temp_dir.name, self.settings[key])
+		with open(self.settings["target_file"], "w") as file:
+			json.dump(["chrome.exe", "firefox.exe"], file)
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def test_record_and_read(self):
+		for file_name in ("scans.ndjson", "scans.ndjson.gz"):
+			recording = os.path.join(self.temp_dir.name, file_name)
+			source, clock = FakeSource({1: "chrome.exe", 2: "cmd.exe"}), VirtualClock(1666339200)
+			recorder = RecordingSource(source, recording, clock)
+			recorder.snapshot()
+			source.processes = {1: "chrome.exe", 3: "firefox.exe"}
+			clock.sleep(60)
+			recorder.snapshot()
+			recorder.close()
+			recorder = RecordingSource(source, recording, clock) # A new run starts over from an empty snapshot
+			clock.sleep(60)
+			recorder.snapshot()
+			recorder.close()
+			self.assertEqual(list(read_recording(recording)), [
+				(1666339200, {1: "chrome.exe", 2: "cmd.exe"}), (1666339260, {1: "chrome.exe", 3: "firefox.exe"}),
+				(1666339320, {1: "chrome.exe", 3: "firefox.exe"})
+			])
+
+	def test_killed_recorder(self):
+		for file_name in ("scans.ndjson", "scans.ndjson.gz"):
+			recording = os.path.join(self.temp_dir.name, file_name)
+			source, clock = FakeSource({1: "chrome.exe"}), VirtualClock(1666339200)
+			recorder = RecordingSource(source, recording, clock)
+			recorder.snapshot()
+			recorder.file.write("[16663392") # Killed while writing a line, without being closed
+			recorder.file.close() # The part of a .gz recording is left behind
+			self.assertEqual(list(read_recording(recording)), [(1666339200, {1: "chrome.exe"})])
+			recorder = RecordingSource(source, recording, clock)
+			clock.sleep(60)
+			recorder.snapshot()
+			recorder.close()
+			self.assertEqual(list(read_recording(recording)), [(1666339200, {1: "chrome.exe"}), (1666339260, {1: "chrome.exe"})])
+
+	def test_truncated_gzip_recording(self):
+		recording = os.path.join(self.temp_dir.name, "scans.ndjson.gz")
+		source, clock = FakeSource({1: "chrome.exe"}), VirtualClock(1666339200)
+		recorder = RecordingSource(source, recording, clock)
+		for tick in range(100):
+			recorder.snapshot()
+			clock.sleep(60)
+		recorder.close()
+		with open(recording, "rb+") as file:
+			file.truncate(os.path.getsize(recording) - 20)
+		self.assertEqual(list(read_recording(recording))[0], (1666339200, {1: "chrome.exe"}))
+
+	def test_replay_across_days(self):
+		daemon = create_daemon(self.settings, FakeSource({}))
+		monitor = daemon.monitors[0]
+		start = datetime(2022, 10, 21).timestamp()
+		# chrome runs for two days and firefox for the first hour of the second day
+		snapshots = [
+			(start + tick * 60, {1: "chrome.exe", **({2: "firefox.exe"} if 1440 <= tick <= 1500 else {})}) for tick in range(2881)
+		]
+		results = replay(daemon, snapshots)
+		self.assertEqual(results["ticks"], 2881)
+		self.assertEqual(results["simulated_seconds"], 2 * 86400)
+		self.assertEqual(
+			{date: data["chrome.exe"][1] for date, data in monitor.screen_time_data.items()},
+			{"2022-10-21": 86400, "2022-10-22": 86400, "2022-10-23": 0}
+		)
+		self.assertEqual(monitor.screen_time_data["2022-10-22"]["firefox.exe"][1], 3600)
+		self.assertEqual(JournalStore(monitor.store.data_file, monitor.store.journal_file).load(), monitor.screen_time_data)
+
+	def test_replay_alerts(self):
+		output_file = os.path.join(self.temp_dir.name, "command_output")
+		with open(self.settings["alerts_file"], "w") as file:
+			json.dump([{"process": "chrome.exe", "limit": "1:00", "action": "command", "command": ["touch", output_file]}], file)
+		daemon = create_daemon(self.settings, FakeSource({}))
+		start = datetime(2022, 10, 21, 9).timestamp()
+		replay(daemon, [(start + tick * 60, {1: "chrome.exe"}) for tick in range(121)])
+		self.assertFalse(os.path.exists(output_file)) # Alerts are only logged in a replay
+		with open(self.settings["alerts_log_file"]) as file:
+			# The alert is logged at the virtual time the limit was crossed
+			self.assertEqual(file.read(), "2022-10-21 10:00:00 chrome.exe 1:00: chrome.exe ran 1:00, over its limit of 1:00 (the command action wasn't run)\n")
+
+	def test_generate_snapshots(self):
+		start = datetime(2022, 10, 21).timestamp()
+		snapshots = list(generate_snapshots(start, 1, ["chrome.exe"], processes=10, interval=3600))
+		self.assertEqual(len(snapshots), 25)
+		self.assertEqual(snapshots[-1][0], start + 86400)
+		self.assertTrue(all(len(snapshot) >= 10 for _, snapshot in snapshots))
+		self.assertEqual(snapshots, list(generate_snapshots(start, 1, ["chrome.exe"], processes=10, interval=3600)))
@@ -0,0 +1,44 @@
+from unittest import TestCase
+import tempfile, os
+from resources import RingBuffer, Series, ResourceSampler, read_summaries
+
+class TestResources(TestCase):
+	def test_ring_buffer(self):
+		buffer = RingBuffer(3)
+		self.assertEqual(buffer.to_list(), [])
+		for value in (1, 2):
+			buffer.append(value)
+		self.assertEqual((len(buffer), buffer.to_list()), (2, [1.0, 2.0]))
+		for value in (3, 4, 5):
+			buffer.append(value)
+		self.assertEqual((len(buffer), buffer.to_list()), (3, [3.0, 4.0, 5.0])) # The oldest numbers were overwritten
+		self.assertEqual(len(buffer.values), 3)
+
+	def test_series(self):
+		series = Series(10)
+		for value in range(1, 21):
+			series.add(value)
+		# min, max and avg cover every sample while p95 covers the last 10 held by the ring buffer
+		self.assertEqual(series.summary(), {"min": 1, "avg": 10.5, "max": 20, "p95": 20})
+
+	def test_sampler(self):
+		with tempfile.TemporaryDirectory() as temp_dir:
+			file_name = os.path.join(temp_dir, "screen_time_resources.json")
+			sampler = ResourceSampler(file_name, size=60)
+			instance_targets = {1: "chrome.exe", 2: "chrome.exe", 3: "cmd.exe"}
+			sampler.sample("2022-10-21", instance_targets, {1: (100, 10.0), 2: (50, 5.0), 3: (10, None)}, 60)
+			sampler.sample("2022-10-21", instance_targets, {1: (300, 13.0), 2: (50, 8.0), 3: (30, None)}, 60)
+			self.assertEqual(sampler.to_file_data(), {"2022-10-21": {
+				"chrome.exe": {"cpu": {"min": 10.0, "avg": 10.0, "max": 10.0, "p95": 10.0}, "memory": {"min": 150, "avg": 250, "max": 350, "p95": 350}},
+				"cmd.exe": {"memory": {"min": 10, "avg": 20, "max": 30, "p95": 30}},
+			}})
+			self.assertFalse(sampler.changed)
+			sampler.sample("2022-10-22", {1: "chrome.exe"}, {1: (200, 19.0)}, 60) # A new day starts with empty buffers
+			self.assertTrue(sampler.changed)
+			self.assertEqual(sampler.day_summary(), {"chrome.exe": {
+				"cpu": {"min": 10.0, "avg": 10.0, "max": 10.0, "p95": 10.0}, "memory": {"min": 200, "avg": 200, "max": 200, "p95": 200}
+			}})
+			self.assertEqual(sampler.cpu_times, {1: 19.0}) # Instances that exited are forgotten
+			sampler.save()
+			self.assertEqual(list(read_summaries(file_name)), ["2022-10-21", "2022-10-22"])
+			self.assertEqual(ResourceSampler(file_name).summaries, read_summaries(file_name))
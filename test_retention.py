@@ -0,0 +1,58 @@
+from unittest import TestCase
+import tempfile, os
+from retention import period_of, period_bounds, Rollups, RetentionPolicy
+
+class TestRetention(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.rollups_file = os.path.join(self.temp_dir.name, "screen_time_rollups.json")
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def test_periods(self):
+		self.assertEqual(period_of("2022-10-21", "month"), "2022-10")
+		self.assertEqual(period_of("2022-10-21", "week"), "2022-W42")
+		self.assertEqual(period_of("2023-01-01", "week"), "2022-W52")
+		self.assertEqual(period_bounds("2022-W42"), ("2022-10-17", "2022-10-23"))
+		self.assertEqual(period_bounds("2022-02"), ("2022-02-01", "2022-02-28"))
+		self.assertEqual(period_bounds("2022-12"), ("2022-12-01", "2022-12-31"))
+		self.assertRaises(ValueError, period_of, "2022-10-21", "year")
+
+	def test_plan_rolls_up_whole_periods(self):
+		policy = RetentionPolicy(detail_days=30, rollup_period="month")
+		self.assertEqual(policy.boundary("2022-11-15"), "2022-10-01") # October isn't entirely older than 30 days yet
+		old_data = {
+			"2022-09-29": {"chrome.exe": [False, 600, []], "cmd.exe": [False, 60, []]},
+			"2022-09-30": {"chrome.exe": [False, 300, [[1, 1664521200, 1664521500]]]},
+			"2022-10-02": {"chrome.exe": [False, 100, []]},
+		}
+		rollups = Rollups(self.rollups_file)
+		plan = policy.plan(old_data, "2022-11-15", rollups)
+		self.assertEqual(plan.dates, ["2022-09-29", "2022-09-30"])
+		self.assertEqual(plan.additions, {"2022-09": {"chrome.exe": 900, "cmd.exe": 60}})
+		self.assertEqual(plan.rolled_through, "2022-09-30")
+
+		rollups.apply(plan)
+		rollups.save()
+		rollups = Rollups(self.rollups_file)
+		self.assertEqual(rollups.periods, {"2022-09": {"chrome.exe": 900, "cmd.exe": 60}})
+		# Dates already rolled up (e.g the monitor stopped before removing them) are removed without being added again
+		plan = policy.plan(old_data, "2022-11-15", rollups)
+		self.assertEqual((plan.dates, plan.additions), (["2022-09-29", "2022-09-30"], {}))
+
+	def test_horizon(self):
+		policy = RetentionPolicy(detail_days=7, rollup_period="week", horizon_days=60)
+		rollups = Rollups(self.rollups_file)
+		rollups.periods = {"2022-W30": {"chrome.exe": 600}, "2022-W40": {"chrome.exe": 60}}
+		plan = policy.plan({"2022-08-01": {"chrome.exe": [False, 60, []]}}, "2022-10-21", rollups)
+		self.assertEqual(plan.dates, ["2022-08-01"])
+		self.assertEqual(plan.additions, {})
+		self.assertEqual(plan.expired_periods, ["2022-W30"])
+		self.assertEqual(RetentionPolicy().boundary("2022-10-21"), "") # Every day is kept
+
+	def test_totals(self):
+		rollups = Rollups(self.rollups_file)
+		rollups.periods = {"2022-09": {"chrome.exe": 900}, "2022-10": {"chrome.exe": 60, "cmd.exe": 30}}
+		self.assertEqual(rollups.totals("2022-09-01", "2022-10-31"), {"chrome.exe": 960, "cmd.exe": 30})
+		self.assertEqual(rollups.totals("2022-09-02", "2022-10-31"), {"chrome.exe": 60, "cmd.exe": 30})
@@ -0,0 +1,39 @@
+from unittest import TestCase
+from scheduler import Scheduler
+
+class DummyClock:
+	"""Clock whose time only moves when the test moves it or when something sleeps"""
+	def __init__(self):
+		self.time = 1000.0
+		self.sleeps = []
+
+	def monotonic(self):
+		return self.time
+
+	def sleep(self, seconds):
+		self.sleeps.append(seconds)
+		self.time += seconds
+
+class TestScheduler(TestCase):
+	def setUp(self):
+		self.clock = DummyClock()
+		self.scheduler = Scheduler(60, clock=self.clock)
+
+	def test_elapsed(self):
+		self.assertEqual(self.scheduler.elapsed(), 0)
+		self.clock.time += 59.6
+		self.assertEqual(self.scheduler.elapsed(), 59)
+		self.clock.time += 60.5
+		self.assertEqual(self.scheduler.elapsed(), 61) # 0.6 carried over from the last call
+		self.clock.time += 3600 # The computer was asleep
+		self.assertEqual(self.scheduler.elapsed(), 120)
+
+	def test_wait_does_not_drift(self):
+		self.scheduler.wait() # The first tick is due immediately
+		self.scheduler.wait()
+		self.clock.time += 5 # Time spent scanning and saving
+		self.scheduler.wait()
+		self.clock.time += 70 # A tick that took longer than the interval
+		self.scheduler.wait()
+		self.assertEqual(self.clock.sleeps, [0, 60, 55, 50])
+		self.assertEqual(self.clock.time, 1240) # The tick due at 1180 was skipped
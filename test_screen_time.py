@@ -3,17 +3,14 @@ from unittest.mock import Mock
 from io import StringIO
 import screen_time
 from screen_time import handle_file_exception as hfe
-from screen_time import handle_screen_data_exception as hsde
-import sys
+import sys, tempfile, os, contextlib
+from histogram import new_histogram
+from settings import DEFAULT_SETTINGS
 
 def file_setup():
 	screen_time.open = Mock(return_value=StringIO())
 	hfe()
 
-def mock_hsde():
-	screen_time.open = Mock(return_value=StringIO())
-	hsde()
-
 
 class TestInterface(TestCase):
 
@@ -63,15 +60,8 @@ class TestInterface(TestCase):
 		screen_time.sys.exit.assert_called_with("No process has been added yet! Please add a process with the -add command.")
 
 	def test_change_format(self):
-		self.assertEqual(screen_time.change_format("02:00"), "02 hrs 00 mins")
-
-	def test_handle_screen_data_exception(self):
-		screen_time.print = Mock()
-		screen_time.open = Mock(return_value=StringIO())
-		self.assertRaises(SystemExit, screen_time.handle_screen_data_exception)
-		screen_time.open.assert_called_with("screen_time_data.json", "w")
-		screen_time.print.assert_called_with("Error! damaged or invalid file contents in screen_time_data.json. Reformatting the file...")
-		screen_time.sys.exit.assert_called_with("File has been reformatted and all screen time data has been cleared.")
+		self.assertEqual(screen_time.change_format(7200), "2 hrs 00 mins")
+		self.assertEqual(screen_time.change_format(37260), "10 hrs 21 mins")
 
 	def test_add_processes(self):
 		"""Test for the add_processes function"""
@@ -94,6 +84,21 @@ class TestInterface(TestCase):
 		screen_time.sys.exit.assert_called_with("All valid processes were removed successfully")
 		screen_time.save_data.assert_called()
 
+	def test_groups_and_aliases(self):
+		screen_time.target_processes = ["cmd.exe", {"group": "browsers", "members": ["firefox.exe"]}]
+		screen_time.save_data = Mock()
+		self.assertRaises(SystemExit, screen_time.add_named_item, ["__filename__", "-group", "browsers", "Chrome.exe", "firefox.exe"], "group", "members")
+		self.assertRaises(SystemExit, screen_time.add_named_item, ["__filename__", "-alias", "sublime", "sublime_text.exe"], "alias", "names")
+		self.assertEqual(screen_time.target_processes, [
+			"cmd.exe", {"group": "browsers", "members": ["chrome.exe", "firefox.exe"]}, {"alias": "sublime", "names": ["sublime_text.exe"]}
+		])
+		self.assertEqual(screen_time.describe_target(screen_time.target_processes[1]), "browsers (group of chrome.exe, firefox.exe)")
+		self.assertEqual(screen_time.describe_target(screen_time.target_processes[2]), "sublime (alias of sublime_text.exe)")
+		self.assertRaises(SystemExit, screen_time.remove_processes, ["__filename__", "-remove", "browsers", "cmd.exe"])
+		self.assertEqual(screen_time.target_processes, [{"alias": "sublime", "names": ["sublime_text.exe"]}])
+		self.assertRaises(SystemExit, screen_time.add_named_item, ["__filename__", "-group", "empty"], "group", "members")
+		screen_time.sys.exit.assert_called_with("Invalid use of command!")
+
 	def test_handle_file_read(self):
 		return
 		screen_time.open = Mock(return_value=StringIO('{"test": [1, 2, 3]}'))
@@ -114,29 +119,43 @@ class TestInterface(TestCase):
 		screen_time.handle_file_exception.assert_called()
 
 
+	def read_data_from(self, data_text, journal_text, date):
+		"""Returns read_data(date) of a profile whose data file holds data_text and journal holds journal_text"""
+		backup_get_profile_settings = screen_time.get_profile_settings
+		with tempfile.TemporaryDirectory() as temp_dir:
+			settings = dict(DEFAULT_SETTINGS)
+			for key in ("target_file", "data_file", "journal_file"):
+				settings[key] = os.path.join(temp_dir, settings[key])
+			with open(settings["target_file"], "w") as file:
+				file.write('["chrome.exe"]')
+			for key, text in (("data_file", data_text), ("journal_file", journal_text)):
+				if text is not None:
+					with open(settings[key], "w") as file:
+						file.write(text)
+			screen_time.get_profile_settings = Mock(return_value=settings)
+			try:
+				return screen_time.read_data(date)
+			finally:
+				screen_time.get_profile_settings = backup_get_profile_settings
+				with open(settings["target_file"]) as file:
+					self.assertEqual(file.read(), '["chrome.exe"]') # The target list is never touched
+
 	def test_read_data(self):
-		good_data = StringIO('{"2022-10-21": {"chrome.exe": [false, "0:00"], "notepad.exe": [false, "00:22"]}}')
-		screen_time.open = Mock(return_value=good_data)
-		self.assertEqual(screen_time.read_data("2022-10-21"), {"chrome.exe": [False, "0:00"], "notepad.exe": [False, "00:22"]})
+		good_data = '{"2022-10-21": {"chrome.exe": [false, "0:00"], "notepad.exe": [false, "00:22"]}}'
+		self.assertEqual(self.read_data_from(good_data, None, "2022-10-21"), {"chrome.exe": [False, 0, []], "notepad.exe": [False, 1320, []]})
 
-		good_data = StringIO('{"2022-10-21": {"chrome.exe": [false, "0:00"], "notepad.exe": [false, "00:22"]}}')
-		screen_time.open = Mock(return_value=good_data)
+		good_data = '{"schema_version": 2, "dates": {"2022-10-21": {"chrome.exe": [false, 0], "notepad.exe": [false, 1320]}}}'
 		screen_time.current_date = "2022-10-21"
-		self.assertEqual(screen_time.read_data(None), {"chrome.exe": [False, "0:00"], "notepad.exe": [False, "00:22"]})
+		self.assertEqual(self.read_data_from(good_data, None, None), {"chrome.exe": [False, 0, []], "notepad.exe": [False, 1320, []]})
 
-		def wrapper():
-			screen_time.read_data("2022-10-21")
+		for data_text in ('"test"', "{}"):
+			self.assertRaises(SystemExit, self.read_data_from, data_text, None, "2022-10-21")
+			screen_time.sys.exit.assert_called_with("No screen time data available. Run screen_time_bckground.exe to update screen time data")
 
-		invalid_data = StringIO('"test"')
-		screen_time.open = Mock(return_value=invalid_data)
-		screen_time.handle_screen_data_exception = Mock(side_effect=mock_hsde)
-		self.assertRaises(SystemExit, wrapper)
-		screen_time.sys.exit.assert_called_with("File has been reformatted and all screen time data has been cleared.")
-
-		empty_data = StringIO('{}')
-		screen_time.open = Mock(return_value=empty_data)
-		self.assertRaises(SystemExit, wrapper)
-		screen_time.sys.exit.assert_called_with("No screen time data available. Run screen_time_bckground.exe to update screen time data")
+	def test_read_data_journal_only(self):
+		# The background process stopped before it wrote its first snapshot
+		journal = '["2022-10-21", "chrome.exe", [false, 300, []]]\n'
+		self.assertEqual(self.read_data_from(None, journal, "2022-10-21"), {"chrome.exe": [False, 300, []]})
 
 	def test_print_process_data():
 		return
@@ -197,3 +216,121 @@ class TestInterface(TestCase):
 		self.with_list_command()
 		self.with_help_command()
 		screen_time.get_target_processes = backup_code
+
+	def test_parse_range_options(self):
+		self.assertEqual(screen_time.parse_range_options(["week", "-top", "3", "-average"]), (["week"], 3, True))
+		self.assertEqual(screen_time.parse_range_options(["month", "chrome.exe"]), (["month", "chrome.exe"], None, False))
+		self.assertRaises(SystemExit, screen_time.parse_range_options, ["week", "-top"])
+
+	def test_range_command(self):
+		backup_read_range_totals, backup_current_date = screen_time.read_range_totals, screen_time.current_date
+		screen_time.read_range_totals = Mock(return_value={"chrome.exe": 36000, "cmd.exe": 600, "firefox.exe": 7200})
+		screen_time.current_date = "2022-10-21" # a friday
+		screen_time.print = Mock()
+		try:
+			self.assertRaises(SystemExit, screen_time.range_command, ["week", "-top", "2", "-average"])
+			screen_time.read_range_totals.assert_called_with("2022-10-17", "2022-10-21")
+			self.assertEqual([call.args[0] for call in screen_time.print.call_args_list], [
+				"chrome.exe" + " " * 34 + "10 hrs 00 mins    2 hrs 00 mins a day",
+				"firefox.exe" + " " * 33 + "2 hrs 00 mins    0 hrs 24 mins a day"
+			])
+
+			self.assertRaises(SystemExit, screen_time.range_command, ["-from", "2022-09-01", "-to", "2022-09-30", "cmd.exe"])
+			screen_time.read_range_totals.assert_called_with("2022-09-01", "2022-09-30")
+			screen_time.print.assert_called_with("cmd.exe" + " " * 37 + "0 hrs 10 mins")
+			self.assertRaises(SystemExit, screen_time.range_command, ["-from", "2022-09-01", "-to", "yesterday"])
+			screen_time.sys.exit.assert_called_with("Invalid date! Dates are written as year-month-date e.g 2023-03-17")
+		finally:
+			screen_time.read_range_totals, screen_time.current_date = backup_read_range_totals, backup_current_date
+			del screen_time.print
+
+	def test_export_command(self):
+		history = {"2022-10-19": {"chrome.exe": [False, 600, []]}, "2022-10-20": {"chrome.exe": [False, 60, []], "cmd.exe": [False, 30, []]}}
+		backup_open_range_reader, backup_current_date = screen_time.open_range_reader, screen_time.current_date
+		screen_time.open_range_reader = Mock(return_value=lambda first_date, last_date: {
+			date: data for date, data in history.items() if first_date <= date <= last_date
+		})
+		screen_time.current_date = "2022-10-21"
+		with tempfile.TemporaryDirectory() as temp_dir:
+			output_file, cursor_file = os.path.join(temp_dir, "export.ndjson"), os.path.join(temp_dir, "export.cursor")
+			args = ["ndjson", "-from", "2022-10-01", "-process", "chrome.exe", "-output", output_file, "-cursor", cursor_file]
+			try:
+				self.assertRaises(SystemExit, screen_time.export_command, args)
+				with open(output_file) as file:
+					self.assertEqual(file.read(), (
+						'{"date":"2022-10-19","process":"chrome.exe","seconds":600}\n'
+						'{"date":"2022-10-20","process":"chrome.exe","seconds":60}\n'
+					))
+				history["2022-10-21"] = {"chrome.exe": [True, 60, []]}
+				screen_time.current_date = "2022-10-22"
+				self.assertRaises(SystemExit, screen_time.export_command, args) # Only exports the day after the cursor
+				with open(output_file) as file:
+					self.assertEqual(file.read(), '{"date":"2022-10-21","process":"chrome.exe","seconds":60}\n')
+			finally:
+				screen_time.open_range_reader, screen_time.current_date = backup_open_range_reader, backup_current_date
+		self.assertRaises(SystemExit, screen_time.parse_export_options, ["csv", "-from"])
+
+	def test_first_recorded_date(self):
+		with tempfile.TemporaryDirectory() as temp_dir:
+			settings = dict(
+				DEFAULT_SETTINGS, storage="sqlite", database_file=os.path.join(temp_dir, "screen_time_data.db"),
+				archive_file=os.path.join(temp_dir, "screen_time_archive.bin")
+			)
+			self.assertEqual(screen_time.first_recorded_date(settings), "") # There's no data yet
+			store = screen_time.get_store(settings)
+			store.set_entry("2022-10-20", "chrome.exe", [False, 60, []])
+			store.set_entry("2021-03-05", "chrome.exe", [False, 600, []])
+			store.commit()
+			store.close()
+			self.assertEqual(screen_time.first_recorded_date(settings), "2021-03-05")
+			self.assertEqual(screen_time.first_recorded_date(dict(settings, storage="json")), "") # It's loaded at once anyway
+
+	def test_get_profile_settings(self):
+		backup_get_settings, backup_profile = screen_time.get_settings, screen_time.profile
+		screen_time.get_settings = Mock(return_value=dict(DEFAULT_SETTINGS, profiles=[{"name": "work"}, {"name": "games", "directory": "d"}]))
+		try:
+			self.assertEqual(screen_time.get_profile_settings()["target_file"], os.path.join("profiles", "work", "target_processes.json"))
+			screen_time.profile = "games"
+			self.assertEqual(screen_time.get_profile_settings()["data_file"], os.path.join("d", "screen_time_data.json"))
+			screen_time.profile = "music"
+			self.assertRaises(SystemExit, screen_time.get_profile_settings)
+		finally:
+			screen_time.get_settings, screen_time.profile = backup_get_settings, backup_profile
+
+	def test_resources_command(self):
+		backup_get_profile_settings = screen_time.get_profile_settings
+		with tempfile.TemporaryDirectory() as temp_dir:
+			resources_file = os.path.join(temp_dir, "screen_time_resources.json")
+			with open(resources_file, "w") as file:
+				file.write('{"2022-10-21": {"chrome.exe": {"memory": {"min": 0, "avg": 1048576, "max": 3145728, "p95": 0},'
+					' "cpu": {"min": 0, "avg": 12.5, "max": 0, "p95": 40}}, "cmd.exe": {"memory": {"min": 0, "avg": 0, "max": 0, "p95": 0}}}}')
+			screen_time.get_profile_settings = Mock(return_value={"resources_file": resources_file})
+			output = StringIO()
+			try:
+				with contextlib.redirect_stdout(output):
+					self.assertRaises(SystemExit, screen_time.resources_command, ["2022-10-21"])
+				self.assertRaises(SystemExit, screen_time.resources_command, ["2022-10-22"])
+				self.assertRaises(SystemExit, screen_time.resources_command, ["today"])
+			finally:
+				screen_time.get_profile_settings = backup_get_profile_settings
+		lines = output.getvalue().splitlines()
+		self.assertEqual(lines[1], "chrome.exe" + " " * 34 + "1.0 MB / 3.0 MB" + " " * 13 + "12.5% / 40.0%")
+		self.assertEqual(lines[2], "cmd.exe" + " " * 37 + "0.0 MB / 0.0 MB" + " " * 13 + "-")
+
+	def test_profile_command(self):
+		histogram = new_histogram()
+		histogram[9], histogram[10] = 3600, 1800
+		backup_read_profile = screen_time.read_profile
+		screen_time.read_profile = Mock(return_value=histogram)
+		screen_time.print = Mock()
+		try:
+			self.assertRaises(SystemExit, screen_time.profile_command, ["-from", "2022-10-01", "-to", "2022-10-31", "chrome.exe"])
+			screen_time.read_profile.assert_called_with("2022-10-01", "2022-10-31", "chrome.exe")
+			lines = [call.args[0] for call in screen_time.print.call_args_list]
+			self.assertEqual(len(lines), 24)
+			self.assertEqual(lines[9], "09:00  " + "#" * 40 + "  " + "1 hrs 00 mins")
+			self.assertEqual(lines[10], "10:00  " + "#" * 20 + " " * 22 + "0 hrs 30 mins")
+			self.assertEqual(lines[0], "00:00  " + " " * 42 + "0 hrs 00 mins")
+		finally:
+			screen_time.read_profile = backup_read_profile
+			del screen_time.print
@@ -1,18 +1,24 @@
 from unittest import TestCase, mock
 from unittest.mock import Mock, patch, mock_open
-from datetime import datetime, timedelta
+from datetime import datetime
 from io import StringIO
-import subprocess, json
+import subprocess, json, tempfile, os, asyncio, threading
 import screen_time_bg as test
-
-Monitor = test.Monitor
-
-class TestTime:
-	def strftime(arg1, arg2):
-		return "0:00"
-
-	def date(arg):
-		return "2022-11-21"
+from process_sources import TasklistSource, FakeSource
+from storage import JournalStore
+from retention import RetentionPolicy, Rollups
+from totals import MonthlyTotals
+from settings import DEFAULT_SETTINGS, PROFILE_FILES
+from histogram import new_histogram
+
+Monitor, Daemon = test.Monitor, test.Daemon
+
+def hourly(seconds):
+	"""Returns a histogram with the {hour: seconds} in seconds"""
+	histogram = new_histogram()
+	for hour, hour_seconds in seconds.items():
+		histogram[hour] = hour_seconds
+	return histogram
 
 class TestData:
 	stdout = ('"SynTPEnh.exe","6268","Console","54","15,832 K"\n' +
@@ -28,13 +34,45 @@ class TestData:
 			  '"chrome.exe","1016","Console","54","23,808 K"\n' +
 			  '"cmd.exe","7088","Console","54","2,396 K"\n' +
 			  '"conhost.exe","5576","Console","54","5,612 K"\n')
-	now = TestTime
+
+class DummyScheduler:
+	"""Stands in for Daemon.scheduler and returns a preset number of elapsed seconds"""
+	def __init__(self, seconds):
+		self.seconds = seconds
+
+	def elapsed(self):
+		return self.seconds
+
+	def delay(self):
+		return 0
+
+	def lateness(self):
+		return 0.0
 
 
 class TestScreenTime(TestCase):
 	def setUp(self):
-		Monitor.processes_data = {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:00"], "sublime_text.exe": [False, "0:00"]}
-		Monitor.target_processes = []
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.data_file = os.path.join(self.temp_dir.name, "screen_time_data.json")
+		self.journal_file = os.path.join(self.temp_dir.name, "screen_time_data.journal")
+		self.settings = self.profile_settings(self.temp_dir.name)
+		self.monitor = Monitor(self.settings)
+		self.monitor.processes_data = {"chrome.exe": [False, 0, []], "firefox.exe": [False, 0, []], "sublime_text.exe": [False, 0, []]}
+		self.monitor.target_processes = []
+		self.daemon = Daemon(self.settings, [self.monitor], FakeSource([]))
+
+	def profile_settings(self, directory, target_processes=("chrome.exe", "firefox.exe", "sublime_text.exe")):
+		"""Returns settings whose files are all in directory, with a target list holding target_processes"""
+		settings = dict(DEFAULT_SETTINGS, watch_config=False)
+		for key in PROFILE_FILES:
+			settings[key] = os.path.join(directory, settings[key])
+		with open(settings["target_file"], "w") as file:
+			json.dump(list(target_processes), file)
+		return settings
+
+	def tearDown(self):
+		test.open = open # It is mocked during a few tests so it needs to be restored to default
+		self.temp_dir.cleanup()
 
 	def test_handle_file_read(self):
 		test.open = Mock(return_value=StringIO('["chrome.exe", "firefox.exe", "sublime_text.exe"]'))
@@ -62,8 +100,8 @@ class TestScreenTime(TestCase):
 
 	def with_valid_data(self):
 		test.open = Mock(return_value=StringIO('["chrome.exe", "firefox.exe", "sublime_text.exe"]'))
-		Monitor.target_processes = test.get_target_processes()
-		self.assertEqual(Monitor.target_processes, ["chrome.exe", "firefox.exe", "sublime_text.exe"])
+		self.monitor.target_processes = test.get_target_processes()
+		self.assertEqual(self.monitor.target_processes, ["chrome.exe", "firefox.exe", "sublime_text.exe"])
 
 	def with_invalid_data(self):
 		test.open = Mock(return_value=StringIO('["chrome.exe", "firefox.exe", "sublime_text.exe"'))
@@ -86,111 +124,385 @@ class TestScreenTime(TestCase):
 		self.with_empty_data()
 
 	def test_create_entries_for_target_processes(self):
-		Monitor.target_processes = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
-		self.assertEqual(Monitor.processes_data, {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:00"], "sublime_text.exe": [False, "0:00"]})
+		self.monitor.target_processes = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
+		self.assertEqual(self.monitor.processes_data, {"chrome.exe": [False, 0, []], "firefox.exe": [False, 0, []], "sublime_text.exe": [False, 0, []]})
 
 	def check_data_based_on(self, current_date, dummy_file_data, expected_output, processes_list, side_effect=None):
-		Monitor.current_date = current_date
-		Monitor.target_processes = processes_list
-		dummy_file = StringIO()
-		json.dump(dummy_file_data, dummy_file)
-		dummy_file.seek(0, 0)
+		self.monitor.current_date = current_date
+		self.monitor.target_processes = processes_list
+		self.monitor.store = JournalStore(self.data_file, self.journal_file)
 		if not side_effect:
-			test.open = Mock(return_value=dummy_file)
-		else:
-			test.open = Mock(side_effect=side_effect)
-		Monitor.get_processes_data()
-		self.assertEqual(Monitor.screen_time_data[Monitor.current_date], expected_output)
-		self.assertIs(Monitor.processes_data, Monitor.screen_time_data[Monitor.current_date])
+			with open(self.data_file, "w") as dummy_file:
+				json.dump(dummy_file_data, dummy_file)
+		elif os.path.exists(self.data_file):
+			os.remove(self.data_file)
+		self.monitor.get_processes_data()
+		self.assertEqual(self.monitor.screen_time_data[self.monitor.current_date], expected_output)
+		self.assertIs(self.monitor.processes_data, self.monitor.screen_time_data[self.monitor.current_date])
 
 	def test_get_processes_data(self):
 		processes_list = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
-		file_data = {"2022-10-21": {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:30"], "sublime_text.exe": [False, "2:22"]}}
-		new_data = {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:00"], "sublime_text.exe": [False, "0:00"]}
+		file_data = {"2022-10-21": {"chrome.exe": [False, 0, []], "firefox.exe": [False, 1800, []], "sublime_text.exe": [False, 8520, []]}}
+		new_data = {"chrome.exe": [False, 0, []], "firefox.exe": [False, 0, []], "sublime_text.exe": [False, 0, []]}
 
 		self.check_data_based_on("2022-10-21", file_data, file_data["2022-10-21"], processes_list)
 
 		self.check_data_based_on("2022-11-32", file_data, new_data, processes_list)
 
-		bad_file_data = '{"2022-10-21": {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:30"], "sublime_text.exe": [False, "2:22"}'
+		bad_file_data = '{"2022-10-21": {"chrome.exe": [False, 0, []], "firefox.exe": [False, 1800, []], "sublime_text.exe": [False, 8520}'
 		self.check_data_based_on("2022-10-21", bad_file_data, new_data, processes_list)
 
 		self.check_data_based_on("2022-10-21", None, new_data, processes_list, side_effect=FileNotFoundError)
 
 		processes_list = ["chrome.exe", "firefox.exe", "cmd.exe"]
-		new_data = {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:30"], "cmd.exe": [False, "0:00"]}
+		new_data = {"chrome.exe": [False, 0, []], "firefox.exe": [False, 1800, []], "cmd.exe": [False, 0, []]}
 		self.check_data_based_on("2022-10-21", file_data, new_data, processes_list)
 
 	def test_save_app_data(self):
-		Monitor.screen_time_data = {"2022-10-21": {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:30"], "sublime_text.exe": [False, "2:22"]}}
-		test_file = StringIO()
-		test.open = Mock(side_effect=open)
-		Monitor.save_screen_time_data()
-		test.open.assert_called_with("screen_time_data.json", "w")
-
-	def test_create_timedelta(self):
-		obj = Monitor.create_timedelta("10:30")
-		self.assertIsInstance(obj, timedelta)
-
-	def test_check_and_update_current_date(self):
-		Monitor.screen_time_data = {"2022-10-21": {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:30"], "sublime_text.exe": [False, "2:22"]}}
-		new_screen_time_data = {"2022-10-21": {"chrome.exe": [False, "0:00"], "firefox.exe": [False, "0:30"], "sublime_text.exe": [False, "2:22"]}, "2022-11-21": {}}
-		test.datetime = TestData
-		Monitor.check_and_update_current_date()
-		self.assertEqual(Monitor.current_date, "2022-11-21")
-		self.assertEqual(Monitor.screen_time_data, new_screen_time_data)
-
-	def test_reset_running_flags(self):
-		Monitor.processes_data["firefox.exe"][0] = True
-		Monitor.processes_data["chrome.exe"][0] = True
-		Monitor.reset_running_flags()
-		self.assertEqual(Monitor.processes_data["firefox.exe"][0], False)
-		self.assertEqual(Monitor.processes_data["chrome.exe"][0], False)
+		self.monitor.screen_time_data = {"2022-10-21": {"chrome.exe": [False, 0, []], "firefox.exe": [False, 1800, []], "sublime_text.exe": [False, 8520, []]}}
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.processes_data = self.monitor.screen_time_data["2022-10-21"]
+		self.monitor.save_screen_time_data() # The first save writes the snapshot
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), self.monitor.screen_time_data)
+		self.monitor.processes_data["chrome.exe"][1] = 60
+		self.monitor.record("chrome.exe")
+		self.monitor.save_screen_time_data()
+		with open(self.journal_file) as journal:
+			self.assertEqual(journal.read(), '["2022-10-21", "chrome.exe", [false, 60, []]]\n')
+
+	def test_get_processes_data_replays_journal(self):
+		file_data = {"2022-10-21": {"chrome.exe": [False, 0, []], "firefox.exe": [False, 1800, []]}}
+		with open(self.data_file, "w") as dummy_file:
+			json.dump(file_data, dummy_file)
+		with open(self.journal_file, "w") as journal:
+			journal.write('["2022-10-21", "chrome.exe", [true, 300, []]]\n["2022-10-21", "firefox.exe"]\n["2022-10-21", "chr')
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.target_processes = ["chrome.exe"]
+		self.monitor.get_processes_data()
+		self.assertEqual(self.monitor.screen_time_data, {"2022-10-21": {"chrome.exe": [True, 300, []]}})
+
+	def test_tick(self):
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.set_target_processes(["chrome.exe", "firefox.exe", "sublime_text.exe"])
+		self.monitor.processes_data["chrome.exe"] = [True, 600, []]
+		self.monitor.screen_time_data = {"2022-10-21": self.monitor.processes_data}
+		self.daemon.scanner.process_source = FakeSource(["chrome.exe", "firefox.exe"])
+		self.daemon.scheduler = DummyScheduler(75)
+		now = datetime(2022, 10, 21, 15, 30)
+		self.daemon.tick(now)
+		started = int(now.timestamp())
+		self.assertEqual(self.monitor.processes_data, {
+			"chrome.exe": [True, 675, [[1, started, None]], hourly({15: 75})], "firefox.exe": [True, 0, [[2, started, None]]],
+			"sublime_text.exe": [False, 0, []]
+		})
+		self.assertEqual(self.monitor.totals.months, {"2022-10": {"chrome.exe": 75}})
+
+	def test_tick_across_midnight(self):
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.set_target_processes(["chrome.exe", "firefox.exe", "sublime_text.exe"])
+		started, midnight = int(datetime(2022, 10, 21, 23).timestamp()), int(datetime(2022, 10, 22).timestamp())
+		self.monitor.processes_data["chrome.exe"] = [True, 600, [[1, started, None]]]
+		self.monitor.processes_data["sublime_text.exe"] = [True, 60, [[7, started, None]]]
+		self.monitor.screen_time_data = {"2022-10-21": self.monitor.processes_data}
+		self.daemon.scanner.previous_snapshot = {1: "chrome.exe", 7: "sublime_text.exe"}
+		self.monitor.instance_targets = {1: "chrome.exe", 7: "sublime_text.exe"}
+		self.daemon.scanner.process_source = FakeSource(["chrome.exe"])
+		self.daemon.scheduler = DummyScheduler(60)
+		now = datetime(2022, 10, 22, 0, 0, 20)
+		self.daemon.tick(now) # 40 seconds of the last minute were on 2022-10-21
+
+		self.assertEqual(self.monitor.current_date, "2022-10-22")
+		self.assertEqual(self.monitor.screen_time_data, {
+			"2022-10-21": {
+				"chrome.exe": [False, 640, [[1, started, midnight]], hourly({23: 40})], "firefox.exe": [False, 0, []],
+				"sublime_text.exe": [False, 60, [[7, started, midnight]]]
+			},
+			"2022-10-22": {
+				"chrome.exe": [True, 20, [[1, midnight, None]], hourly({0: 20})], "firefox.exe": [False, 0, []],
+				"sublime_text.exe": [False, 0, [[7, midnight, int(now.timestamp())]]]
+			}
+		})
+		self.assertIs(self.monitor.processes_data, self.monitor.screen_time_data["2022-10-22"])
+		self.assertEqual(self.monitor.totals.months, {"2022-10": {"chrome.exe": 60}})
+
+	def test_end_open_sessions(self):
+		start = int(datetime(2022, 10, 21, 9).timestamp())
+		self.monitor.current_date = "2022-10-22"
+		self.monitor.screen_time_data = {
+			"2022-10-21": {"chrome.exe": [True, 540, [[1, start, None], [2, start, start + 60]]], "firefox.exe": [True, 0, []]},
+			"2022-10-22": {"chrome.exe": [False, 0, [[3, start + 86400, None]]]},
+		}
+		self.monitor.end_open_sessions(start + 600) # The program stopped 10 minutes after chrome started
+		self.assertEqual(self.monitor.screen_time_data, {
+			"2022-10-21": {"chrome.exe": [False, 540, [[1, start, start + 600], [2, start, start + 60]]], "firefox.exe": [False, 0, []]},
+			"2022-10-22": {"chrome.exe": [False, 0, [[3, start + 86400, start + 86400]]]}, # Can't end before it started
+		})
+		self.monitor.screen_time_data["2022-10-22"]["chrome.exe"] = [True, 0, [[3, start + 86400, None]]]
+		self.monitor.end_open_sessions(None) # The time of the last scan isn't known
+		self.assertEqual(self.monitor.screen_time_data["2022-10-22"]["chrome.exe"], [False, 0, [[3, start + 86400, start + 86400]]])
+
+	def test_restart_ends_sessions_at_last_scan(self):
+		start = int(datetime(2022, 10, 21, 9).timestamp())
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.screen_time_data = {"2022-10-21": self.monitor.processes_data}
+		self.monitor.processes_data["chrome.exe"] = [True, 0, [[1, start, None]]]
+		self.monitor.last_scan = start + 180
+		self.monitor.save_screen_time_data()
+		self.assertEqual(test.read_last_scan(self.settings["state_file"]), start + 180)
+
+		monitor = Monitor(self.settings) # Restarted hours later on the same day
+		monitor.current_date = "2022-10-21"
+		asyncio.run(monitor.start())
+		self.assertEqual(monitor.processes_data["chrome.exe"][:3], [False, 0, [[1, start, start + 180]]])
+
+	def test_scan_processes_handles_only_changes(self):
+		self.monitor.set_target_processes(["chrome.exe", "plugin_host-*.exe"])
+		self.daemon.scanner.process_source = FakeSource({10: "chrome.exe", 11: "chrome.exe", 12: "cmd.exe"})
+		self.assertEqual(self.daemon.match(self.daemon.scan())[0], {"chrome.exe"})
+		self.assertEqual(sorted(self.monitor.session_changes[0]), [("chrome.exe", 10), ("chrome.exe", 11)])
+		self.assertEqual(self.monitor.session_changes[1], [])
+
+		self.monitor.session_changes = ([], [])
+		self.monitor.matcher = Mock(wraps=self.monitor.matcher)
+		# 10 exits, 12 is reused by a plugin host and 13 starts
+		self.daemon.scanner.process_source = FakeSource({11: "chrome.exe", 12: "plugin_host-3.8.exe", 13: "notepad.exe"})
+		self.assertEqual(self.daemon.match(self.daemon.scan())[0], {"chrome.exe", "plugin_host-*.exe"})
+		self.assertEqual(self.monitor.session_changes, ([("plugin_host-*.exe", 12)], [("chrome.exe", 10)]))
+		self.assertEqual(sorted(call.args[0] for call in self.monitor.matcher.match.call_args_list), ["notepad.exe", "plugin_host-3.8.exe"])
+
+		self.monitor.session_changes = ([], [])
+		self.monitor.set_target_processes(["plugin_host-*.exe", "notepad.exe"]) # Every process is matched again
+		self.assertEqual(self.daemon.match(self.daemon.scan())[0], {"plugin_host-*.exe", "notepad.exe"})
+		self.assertEqual(self.monitor.session_changes, ([("notepad.exe", 13)], [("chrome.exe", 11)]))
+
+	def test_apply_session_changes(self):
+		self.monitor.processes_data["chrome.exe"][2] = [[10, 1666339200, None]]
+		self.monitor.session_changes = ([("chrome.exe", 11), ("firefox.exe", 12)], [("chrome.exe", 10), ("notepad.exe", 13)])
+		self.monitor.apply_session_changes(1666339260)
+		self.assertEqual(self.monitor.processes_data["chrome.exe"][2], [[10, 1666339200, 1666339260], [11, 1666339260, None]])
+		self.assertEqual(self.monitor.processes_data["firefox.exe"][2], [[12, 1666339260, None]])
+		self.assertEqual(self.monitor.session_changes, ([], []))
+
+	def test_reload_target_processes(self):
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.set_target_processes(["chrome.exe", "firefox.exe", "sublime_text.exe"])
+		self.monitor.processes_data["chrome.exe"] = [True, 600, []]
+		self.monitor.screen_time_data = {"2022-10-21": self.monitor.processes_data}
+		self.monitor.target_cache = Mock()
+		self.monitor.target_cache.get.return_value = self.monitor.target_processes
+		self.monitor.reload_target_processes()
+		self.assertIs(self.monitor.processes_data, self.monitor.screen_time_data["2022-10-21"])
+		self.assertEqual(len(self.monitor.store.pending_records), 0)
+
+		self.monitor.processes_data["firefox.exe"] = [False, 300, []]
+		self.monitor.totals.months = {"2022-10": {"chrome.exe": 1200, "firefox.exe": 900}}
+		self.monitor.target_cache.get.return_value = ["chrome.exe", "notepad.exe", "sublime_text.exe"]
+		self.monitor.reload_target_processes()
+		self.assertEqual(self.monitor.totals.months, {"2022-10": {"chrome.exe": 1200, "firefox.exe": 600}}) # Today's time is removed
+		self.assertEqual(self.monitor.processes_data, {"chrome.exe": [True, 600, []], "notepad.exe": [False, 0, []], "sublime_text.exe": [False, 0, []]})
+		self.assertEqual(self.monitor.store.pending_records, [["2022-10-21", "notepad.exe", [False, 0, []]], ["2022-10-21", "firefox.exe"]])
+		self.assertEqual(self.monitor.matcher.match("notepad.exe"), "notepad.exe")
 
 	def test_scan_processes(self):
 		subprocess.run = Mock(return_value=TestData)
-		Monitor.target_processes = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
-
-		# The function still needs to do it's job outside this test function, that's the reason for the side_effect kwarg.
-		# It's only mocked here to see if it was called with  some specific arguments.
-		Monitor.validate_and_update_process_data = Mock(side_effect=Monitor.validate_and_update_process_data)
-
-		Monitor.scan_processes()
-		Monitor.validate_and_update_process_data.assert_any_call("chrome.exe")
-		Monitor.validate_and_update_process_data.assert_any_call("firefox.exe")
-		Monitor.validate_and_update_process_data.assert_any_call("sublime_text.exe")
+		self.daemon.scanner.process_source = TasklistSource()
+		self.monitor.set_target_processes(["chrome.exe", "firefox.exe", "sublime_text.exe", "plugin_host-*.exe", "notepad.exe"])
+		self.assertEqual(self.daemon.match(self.daemon.scan())[0], {"chrome.exe", "firefox.exe", "sublime_text.exe", "plugin_host-*.exe"})
+		self.assertEqual(self.monitor.target_processes, ["chrome.exe", "firefox.exe", "sublime_text.exe", "plugin_host-*.exe", "notepad.exe"])
  
 	def test_validate_and_update_process_data(self):
-		Monitor.target_processes = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
-		Monitor.validate_and_update_process_data("chrome.exe")
-		self.assertEqual(Monitor.target_processes, ["firefox.exe", "sublime_text.exe"])
-		self.assertEqual(Monitor.processes_data["chrome.exe"][0], True)
-
-		Monitor.target_processes = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
-		Monitor.validate_and_update_process_data("random.exe")
-		self.assertEqual(Monitor.target_processes, ["chrome.exe", "firefox.exe", "sublime_text.exe"])
-
-	def test_update_closed_processes_data(self):
-		Monitor.processes_data["firefox.exe"][0] = True
-		Monitor.processes_data["sublime_text.exe"][0] = True
-		Monitor.processes_data["chrome.exe"][0] = True
-		Monitor.target_processes = ["firefox.exe"]
-		Monitor.update_closed_processes_data()
-		self.assertEqual(Monitor.processes_data["firefox.exe"][0], False)
-		self.assertEqual(Monitor.processes_data["sublime_text.exe"][0], True)
-		self.assertEqual(Monitor.processes_data["chrome.exe"][0], True)
+		self.monitor.processes_data["firefox.exe"] = [True, 0, []]
+		self.monitor.processes_data["sublime_text.exe"] = [True, 35940, []]
+		self.monitor.validate_and_update_process_data({"chrome.exe", "sublime_text.exe", "random.exe"}, 60, 7230)
+		self.assertEqual(self.monitor.processes_data, {
+			"chrome.exe": [True, 0, []], "firefox.exe": [False, 0, []], "sublime_text.exe": [True, 36000, [], hourly({1: 30, 2: 30})]
+		})
+
+	def test_journal_size_per_tick(self):
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.processes_data["chrome.exe"] = [True, 0, [[pid, 1666339200, 1666339260] for pid in range(200)]]
+		self.monitor.screen_time_data = {"2022-10-21": self.monitor.processes_data}
+		self.monitor.record("chrome.exe") # As it's recorded when its sessions start
+		self.monitor.save_screen_time_data()
+		sizes = [os.path.getsize(self.monitor.store.journal_file)]
+		for tick in range(3):
+			self.monitor.validate_and_update_process_data({"chrome.exe"}, 60, 36000 + tick * 60)
+			# A short lived helper process starts on every tick and the one started before exits
+			self.monitor.session_changes = ([("chrome.exe", 1000 + tick)], [("chrome.exe", 999 + tick)] if tick else [])
+			self.monitor.apply_session_changes(1666339300 + tick * 60)
+			self.monitor.save_screen_time_data()
+			sizes.append(os.path.getsize(self.monitor.store.journal_file))
+		# A credit only saves the time and a session start or end only saves that session, not the others
+		self.assertEqual(sizes[3] - sizes[2], sizes[2] - sizes[1])
+		self.assertLess(sizes[2] - sizes[1], 300)
+		saved_data = JournalStore(self.monitor.store.data_file, self.monitor.store.journal_file).load()
+		self.assertEqual(saved_data["2022-10-21"]["chrome.exe"], self.monitor.processes_data["chrome.exe"])
+
+	def test_sample_and_save(self):
+		self.monitor.current_date = str(datetime.now().date()) # sample() scans at the current time
+		self.monitor.set_target_processes(["chrome.exe", "firefox.exe", "sublime_text.exe"])
+		self.monitor.processes_data["chrome.exe"] = [True, 600, []]
+		self.monitor.screen_time_data = {self.monitor.current_date: self.monitor.processes_data}
+		self.daemon.scanner.process_source = FakeSource(["chrome.exe"])
+		self.daemon.scheduler = DummyScheduler(60)
+
+		match_changes, match_threads = self.monitor.match_changes, []
+		def record_thread(*scan):
+			match_threads.append(threading.current_thread())
+			return match_changes(*scan)
+		self.monitor.match_changes = record_thread
+
+		async def sample_and_save():
+			await self.daemon.sample()
+			await self.daemon.save()
+		asyncio.run(sample_and_save())
+		self.assertEqual(match_threads, [threading.main_thread()]) # The monitors are only changed on the event loop
+		self.assertEqual(self.monitor.processes_data["chrome.exe"][:2], [True, 660])
+		self.assertEqual(
+			JournalStore(self.data_file, self.journal_file).load()[self.monitor.current_date]["chrome.exe"], self.monitor.processes_data["chrome.exe"]
+		)
+		self.assertEqual(self.daemon.metrics.latest("tick")["matches"], 1)
+		self.assertGreater(self.daemon.metrics.latest("save")["bytes_written"], 0)
+
+	def test_profiles_share_one_scan(self):
+		settings = dict(DEFAULT_SETTINGS, watch_config=False, profiles=[
+			{"name": "work", "directory": os.path.join(self.temp_dir.name, "work")},
+			{"name": "games", "directory": os.path.join(self.temp_dir.name, "games"), "storage": "sqlite"},
+		])
+		for name, targets in (("work", ["chrome.exe", "sublime_text.exe"]), ("games", ["steam.exe"])):
+			os.makedirs(os.path.join(self.temp_dir.name, name))
+			with open(os.path.join(self.temp_dir.name, name, "target_processes.json"), "w") as file:
+				json.dump(targets, file)
+		source = FakeSource({1: "chrome.exe", 2: "steam.exe", 3: "cmd.exe"})
+		source.snapshot = Mock(side_effect=source.snapshot)
+		daemon = test.create_daemon(settings, source)
+		work, games = daemon.monitors
+		self.assertEqual([work.name, games.name], ["work", "games"])
+		now = datetime(2022, 10, 21, 12)
+		for monitor in daemon.monitors:
+			monitor.current_date = "2022-10-21"
+			monitor.get_processes_data()
+		daemon.scheduler = DummyScheduler(60)
+		daemon.tick(now)
+		daemon.tick(now)
+		self.assertEqual(source.snapshot.call_count, 2) # Once per tick, not once per profile
+		self.assertEqual({process: data[1] for process, data in work.processes_data.items()}, {"chrome.exe": 60, "sublime_text.exe": 0})
+		self.assertEqual({process: data[1] for process, data in games.processes_data.items()}, {"steam.exe": 60})
+
+		daemon.save_screen_time_data()
+		self.assertEqual(JournalStore(work.settings["data_file"], work.settings["journal_file"]).load()["2022-10-21"]["chrome.exe"][1], 60)
+		self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "games", "screen_time_data.db")))
+		self.assertEqual(daemon.answer_query({"command": "date", "date": "2022-10-21", "profile": "games"})["data"]["steam.exe"][1], 60)
+		self.assertIn("chrome.exe", daemon.answer_query({"command": "date", "date": "2022-10-21"})["data"]) # The first profile
+		self.assertFalse(daemon.answer_query({"command": "date", "date": "2022-10-21", "profile": "music"})["ok"])
+		for monitor in daemon.monitors:
+			monitor.store.close()
+
+	def test_sample_resources(self):
+		settings = dict(self.settings, sample_resources=True)
+		monitor = Monitor(settings)
+		monitor.current_date = "2022-10-21"
+		monitor.get_processes_data()
+		source = FakeSource({1: "chrome.exe", 2: "chrome.exe", 3: "cmd.exe"}, {1: (100, 10.0), 2: (50, 2.0), 3: (999, 1.0)})
+		source.resource_usage = Mock(side_effect=source.resource_usage)
+		daemon = Daemon(settings, [monitor], source)
+		daemon.scheduler = DummyScheduler(60)
+		daemon.tick(datetime(2022, 10, 21, 12))
+		source.resource_usage.assert_called_once_with({1, 2}) # Only the instances of target processes are sampled
+		source.usage = {1: (300, 13.0), 2: (50, 5.0)}
+		daemon.tick(datetime(2022, 10, 21, 12, 1))
+		monitor.save_screen_time_data()
+		with open(settings["resources_file"]) as file:
+			summary = json.load(file)["2022-10-21"]["chrome.exe"]
+		self.assertEqual(summary["memory"], {"min": 150, "avg": 250, "max": 350, "p95": 350})
+		self.assertEqual(summary["cpu"]["avg"], 10.0)
+		self.assertIsNone(self.monitor.resources) # Resources aren't sampled unless the setting is on
+
+	def test_alerts(self):
+		with open(self.settings["alerts_file"], "w") as file:
+			json.dump([{"name": "budget", "process": "chrome.exe", "limit": 120}], file)
+		self.monitor.reload_alert_rules() # The rules file didn't exist when the monitor was made
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.set_target_processes(["chrome.exe", "firefox.exe", "sublime_text.exe"])
+		self.monitor.screen_time_data = {self.monitor.current_date: self.monitor.processes_data}
+		self.daemon.scanner.process_source = FakeSource(["chrome.exe"])
+		self.daemon.scheduler = DummyScheduler(60)
+		for minute in range(5):
+			self.daemon.tick(datetime(2022, 10, 21, 12, minute))
+		with open(self.settings["alerts_log_file"]) as file:
+			lines = file.read().splitlines()
+		self.assertEqual(len(lines), 1) # Once, when chrome crossed its limit on the third tick
+		self.assertTrue(lines[0].endswith("budget: chrome.exe ran 0:02, over its limit of 0:02"))
+
+	def test_groups_and_aliases(self):
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.set_target_processes([
+			{"alias": "sublime", "names": ["sublime_text.exe", "plugin_host-*.exe"]},
+			{"group": "browsers", "members": ["chrome.exe", "firefox.exe"]},
+		])
+		self.monitor.create_entries_for_target_processes()
+		self.assertEqual(list(self.monitor.processes_data), ["sublime", "chrome.exe", "firefox.exe", "browsers"])
+		self.daemon.scanner.process_source = FakeSource(
+			{1: "chrome.exe", 2: "chrome.exe", 3: "firefox.exe", 4: "sublime_text.exe", 5: "plugin_host-3.8.exe"}
+		)
+		self.daemon.scheduler = DummyScheduler(60)
+		self.daemon.tick(datetime(2022, 10, 21, 12))
+		self.daemon.tick(datetime(2022, 10, 21, 12, 1))
+		seconds = {process: data[1] for process, data in self.monitor.processes_data.items()}
+		# chrome and firefox run at the same time but the group is credited once
+		self.assertEqual(seconds, {"sublime": 60, "chrome.exe": 60, "firefox.exe": 60, "browsers": 60})
+		self.assertEqual(len(self.monitor.processes_data["sublime"][2]), 2) # A session per instance of any of its names
+
+	def test_get_target_processes_with_groups(self):
+		test.open = Mock(return_value=StringIO('["cmd.exe", {"group": "browsers", "members": ["chrome.exe"]}, "cmd.exe"]'))
+		self.assertEqual(test.get_target_processes(), ["cmd.exe", {"group": "browsers", "members": ["chrome.exe"]}])
+
+	def test_apply_retention(self):
+		self.monitor.current_date = "2022-11-15"
+		self.monitor.screen_time_data = {
+			"2022-09-30": {"chrome.exe": [False, 600, []]}, "2022-10-21": {"chrome.exe": [False, 60, []]},
+			"2022-11-15": self.monitor.processes_data
+		}
+		self.monitor.retention = RetentionPolicy(detail_days=30, rollup_period="month")
+		asyncio.run(self.daemon.apply_retention())
+		self.assertEqual(list(self.monitor.screen_time_data), ["2022-10-21", "2022-11-15"])
+		self.assertEqual(self.monitor.store.pending_records, [["2022-09-30", None]])
+		self.assertEqual(Rollups(self.monitor.rollups.file_name).periods, {"2022-09": {"chrome.exe": 600}})
+		self.assertEqual(
+			self.monitor.answer_query({"command": "range", "from": "2022-09-01", "to": "2022-10-31"})["data"], {"chrome.exe": 660}
+		)
+
+	def test_build_totals(self):
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.rollups.periods = {"2022-09": {"chrome.exe": 600}, "2022-W42": {"chrome.exe": 60}}
+		self.monitor.build_totals({"2022-10-21": {"chrome.exe": [False, 120, []]}})
+		self.assertEqual(MonthlyTotals(self.monitor.totals.file_name).months, {"2022-09": {"chrome.exe": 600}, "2022-10": {"chrome.exe": 120}})
+
+	def test_run_periodically(self):
+		runs = []
+		async def job():
+			runs.append(len(runs))
+			if len(runs) == 3:
+				raise asyncio.CancelledError
+
+		self.assertRaises(asyncio.CancelledError, asyncio.run, test.run_periodically(DummyScheduler(0), job))
+		self.assertEqual(runs, [0, 1, 2])
 
 	def test_reset_data_for_new_day(self):
-		Monitor.processes_data["chrome.exe"][1] = "9:00"
-		Monitor.processes_data["firefox.exe"][1] = "3:45"
-		Monitor.processes_data["sublime_text.exe"][1] = "9:45"
-		Monitor.reset_data_for_new_day()
-		self.assertEqual(Monitor.processes_data["chrome.exe"][1], "0:00")
-		self.assertEqual(Monitor.processes_data["firefox.exe"][1], "0:00")
-		self.assertEqual(Monitor.processes_data["sublime_text.exe"][1], "0:00")
+		self.monitor.current_date = "2022-10-21"
+		self.monitor.target_processes = ["chrome.exe", "firefox.exe", "sublime_text.exe"]
+		self.monitor.processes_data["chrome.exe"] = [True, 32400, []]
+		self.monitor.processes_data["firefox.exe"][1] = 13500
+		self.monitor.processes_data["sublime_text.exe"][1] = 35100
+		self.monitor.screen_time_data = {"2022-10-21": self.monitor.processes_data}
+		self.monitor.reset_data_for_new_day("2022-10-22")
+		self.assertEqual(self.monitor.screen_time_data["2022-10-21"]["chrome.exe"], [False, 32400, []])
+		self.assertEqual(self.monitor.processes_data["chrome.exe"], [True, 0, []])
+		self.assertEqual(self.monitor.processes_data["firefox.exe"][1], 0)
+		self.assertEqual(self.monitor.processes_data["sublime_text.exe"][1], 0)
 
 # open_mock = mock_open()
 # json.dump = Mock()
 # with patch("test.open", open_mock):
-# 	Monitor.save_screen_time_data()
+# 	self.monitor.save_screen_time_data()
 # open_mock.assert_called_with("screen_time_data.json", "w")
\ No newline at end of file
@@ -0,0 +1,358 @@
+from unittest import TestCase
+import tempfile, os, json
+from storage import (
+	JournalStore, SqliteStore, ShardedStore, replay_journal, write_json_atomically, migrate_json_to_sqlite,
+	migrate_json_to_shards, upgrade_screen_time_data, create_file_data, SCHEMA_VERSION
+)
+import sqlite3, gzip
+from histogram import new_histogram, encode
+
+class TestJournalStore(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.data_file = os.path.join(self.temp_dir.name, "screen_time_data.json")
+		self.journal_file = os.path.join(self.temp_dir.name, "screen_time_data.journal")
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def read_journal(self):
+		with open(self.journal_file) as journal:
+			return journal.read()
+
+	def write_snapshot(self, screen_time_data):
+		"""Writes the snapshot a store that already committed would have, so the next commits only append to the journal"""
+		write_json_atomically(create_file_data(screen_time_data), self.data_file)
+
+	def test_write_json_atomically(self):
+		write_json_atomically({"2022-10-21": {}}, self.data_file)
+		with open(self.data_file) as file:
+			self.assertEqual(json.load(file), {"2022-10-21": {}})
+		self.assertFalse(os.path.exists(self.data_file + ".tmp"))
+
+	def test_replay_journal(self):
+		with open(self.journal_file, "w") as journal:
+			journal.write('["2022-10-22"]\n["2022-10-21", "chrome.exe", [true, "0:05"]]\n["2022-10-21", "cmd.exe"]\n["2022-10-21", "fire')
+		screen_time_data = {"2022-10-21": {"chrome.exe": [False, 0, []], "cmd.exe": [False, 3600, []]}}
+		self.assertEqual(replay_journal(screen_time_data, self.journal_file), 3)
+		self.assertEqual(screen_time_data, {"2022-10-21": {"chrome.exe": [True, 300, []]}, "2022-10-22": {}})
+		self.assertEqual(replay_journal(screen_time_data, "missing.journal"), 0)
+
+	def test_torn_journal_tail(self):
+		self.write_snapshot({})
+		store = JournalStore(self.data_file, self.journal_file)
+		with open(self.journal_file, "w") as journal:
+			journal.write('["2022-10-21", "chrome.exe", [true, 60, []]]\n["2022-10-21", "cmd.exe", [tr') # Cut short by a crash
+		store.set_entry("2022-10-21", "firefox.exe", [True, 120, []])
+		store.commit({})
+		store.set_entry("2022-10-21", "chrome.exe", [False, 180, []])
+		store.commit({})
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {
+			"2022-10-21": {"chrome.exe": [False, 180, []], "firefox.exe": [True, 120, []]}
+		})
+
+	def test_time_records(self):
+		self.write_snapshot({})
+		store = JournalStore(self.data_file, self.journal_file)
+		chrome = [True, 60, [[1, 1666339200, None]]]
+		store.set_entry("2022-10-21", "chrome.exe", chrome)
+		store.set_time("2022-10-21", "chrome.exe", chrome) # The whole entry is already pending
+		store.commit({})
+		chrome[1] = 120
+		chrome.append(new_histogram())
+		chrome[3][9] = 120
+		store.set_time("2022-10-21", "chrome.exe", chrome)
+		store.set_time("2022-10-21", "chrome.exe", chrome) # Written once per commit
+		store.commit({})
+		self.assertEqual(self.read_journal().splitlines()[1:], [f'["2022-10-21", "chrome.exe", {{"seconds": 120, "histogram": "{encode(chrome[3])}"}}]'])
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": chrome}})
+		store.set_time("2022-10-21", "chrome.exe", chrome)
+		store.remove_entry("2022-10-21", "chrome.exe")
+		store.set_entry("2022-10-21", "chrome.exe", [False, 0, []]) # Comes after the removal
+		store.commit({})
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": [False, 0, []]}})
+
+	def test_session_records(self):
+		self.write_snapshot({"2022-10-21": {"chrome.exe": [False, 60, [[1, 1666339200, 1666339260]]]}})
+		store = JournalStore(self.data_file, self.journal_file)
+		chrome = store.load()["2022-10-21"]["chrome.exe"]
+		chrome[0] = True
+		store.set_running("2022-10-21", "chrome.exe", chrome)
+		chrome[2].append([2, 1666339300, None])
+		store.set_session("2022-10-21", "chrome.exe", chrome, 1)
+		chrome[2].append([3, 1666339300, None])
+		store.set_session("2022-10-21", "chrome.exe", chrome, 2)
+		store.commit({})
+		# One record holds the fields that changed, and only the sessions that did
+		self.assertEqual(json.loads(self.read_journal()), [
+			"2022-10-21", "chrome.exe", {"running": True, "sessions": {"1": [2, 1666339300, None], "2": [3, 1666339300, None]}}
+		])
+		chrome[2][1][2] = 1666339360
+		store.set_session("2022-10-21", "chrome.exe", chrome, 1)
+		store.commit({})
+		self.assertEqual(self.read_journal().splitlines()[1], '["2022-10-21", "chrome.exe", {"sessions": {"1": [2, 1666339300, 1666339360]}}]')
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": chrome}})
+		with open(self.journal_file, "a") as journal: # Replaying a record twice changes nothing
+			journal.write(self.read_journal())
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": chrome}})
+
+	def test_remove_date(self):
+		self.write_snapshot({})
+		store = JournalStore(self.data_file, self.journal_file)
+		store.set_entry("2022-10-21", "chrome.exe", [False, 60, []])
+		store.set_entry("2022-10-22", "chrome.exe", [False, 120, []])
+		store.remove_date("2022-10-21")
+		store.commit({})
+		self.assertEqual(store.load(), {"2022-10-22": {"chrome.exe": [False, 120, []]}})
+
+	def test_commit_and_load(self):
+		store = JournalStore(self.data_file, self.journal_file, compact_every=3)
+		screen_time_data = {"2022-10-21": {"chrome.exe": [True, 0, []]}}
+		store.set_entry("2022-10-21", "chrome.exe", screen_time_data["2022-10-21"]["chrome.exe"])
+		store.commit(screen_time_data) # A new store writes its snapshot on the first commit
+		self.assertEqual(self.read_journal(), "")
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": [True, 0, []]}})
+
+		screen_time_data["2022-10-21"]["chrome.exe"] = [True, 60, []]
+		store.set_entry("2022-10-21", "chrome.exe", screen_time_data["2022-10-21"]["chrome.exe"])
+		store.commit(screen_time_data)
+		store.commit(screen_time_data) # nothing pending so the journal isn't written to
+		self.assertEqual(self.read_journal(), '["2022-10-21", "chrome.exe", [true, 60, []]]\n')
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": [True, 60, []]}})
+
+		screen_time_data["2022-10-21"]["chrome.exe"] = [True, 120, []]
+		store.set_entry("2022-10-21", "chrome.exe", screen_time_data["2022-10-21"]["chrome.exe"])
+		store.commit(screen_time_data) # third commit since the snapshot compacts the journal
+		self.assertEqual(self.read_journal(), "")
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {"2022-10-21": {"chrome.exe": [True, 120, []]}})
+
+	def test_histogram_round_trip(self):
+		histogram = new_histogram()
+		histogram[9] = 600
+		self.write_snapshot({})
+		store = JournalStore(self.data_file, self.journal_file, compact_every=2)
+		screen_time_data = {"2022-10-21": {"chrome.exe": [False, 600, [], histogram]}}
+		store.set_entry("2022-10-21", "chrome.exe", screen_time_data["2022-10-21"]["chrome.exe"])
+		store.commit(screen_time_data)
+		self.assertEqual(self.read_journal(), f'["2022-10-21", "chrome.exe", [false, 600, [], "{encode(histogram)}"]]\n')
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), screen_time_data)
+		store.commit(screen_time_data) # compacts the journal into the snapshot
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), screen_time_data)
+
+	def test_upgrade_screen_time_data(self):
+		self.assertEqual(upgrade_screen_time_data({"2022-10-21": {"chrome.exe": [False, "10:05"]}}), {"2022-10-21": {"chrome.exe": [False, 36300, []]}})
+		self.assertEqual(upgrade_screen_time_data({"schema_version": 2, "dates": {"2022-10-21": {}}}), {"2022-10-21": {}})
+		self.assertEqual(
+			upgrade_screen_time_data({"schema_version": 2, "dates": {"2022-10-21": {"chrome.exe": [True, 60]}}}),
+			{"2022-10-21": {"chrome.exe": [True, 60, []]}}
+		)
+		self.assertIsNone(upgrade_screen_time_data({"schema_version": 2, "dates": []}))
+		self.assertIsNone(upgrade_screen_time_data("test"))
+
+	def test_compaction_upgrades_file(self):
+		with open(self.data_file, "w") as file:
+			json.dump({"2022-10-21": {"chrome.exe": [False, "0:30"]}}, file)
+		store = JournalStore(self.data_file, self.journal_file)
+		store.compact(store.load())
+		with open(self.data_file) as file:
+			self.assertEqual(json.load(file), {"schema_version": SCHEMA_VERSION, "dates": {"2022-10-21": {"chrome.exe": [False, 1800, []]}}})
+
+	def test_load_invalid_snapshot(self):
+		with open(self.data_file, "w") as file:
+			file.write('"test"')
+		self.assertEqual(JournalStore(self.data_file, self.journal_file).load(), {})
+
+class TestSqliteStore(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.database_file = os.path.join(self.temp_dir.name, "screen_time_data.db")
+		self.store = SqliteStore(self.database_file)
+
+	def tearDown(self):
+		self.store.close()
+		self.temp_dir.cleanup()
+
+	def test_commit_and_read(self):
+		self.store.set_entry("2022-10-21", "chrome.exe", [True, 0, []])
+		self.store.set_entry("2022-10-21", "cmd.exe", [False, 3600, []])
+		self.store.set_entry("2022-10-22", "chrome.exe", [False, 7200, []])
+		self.store.commit()
+		self.store.set_entry("2022-10-21", "chrome.exe", [True, 60, []])
+		self.store.remove_entry("2022-10-21", "cmd.exe")
+		self.store.commit()
+
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [True, 60, []]})
+		self.assertIsNone(self.store.read_date("2022-10-23"))
+		self.assertEqual(self.store.first_date(), "2022-10-21")
+		self.assertEqual(self.store.load("2022-10-22"), {"2022-10-22": {"chrome.exe": [False, 7200, []]}})
+		self.assertEqual(list(self.store.read_range("2022-10-20", "2022-10-22")), ["2022-10-21", "2022-10-22"])
+		self.assertEqual(
+			self.store.read_process("chrome.exe", "2022-10-22", "2022-12-31"), {"2022-10-22": {"chrome.exe": [False, 7200, []]}}
+		)
+
+	def test_remove_date(self):
+		self.store.set_entry("2022-10-21", "chrome.exe", [False, 60, []])
+		self.store.set_entry("2022-10-21", "cmd.exe", [False, 60, []])
+		self.store.set_entry("2022-10-22", "chrome.exe", [False, 120, []])
+		self.store.remove_date("2022-10-21")
+		self.store.commit()
+		self.assertEqual(list(self.store.read_range("2022-10-01", "2022-10-31")), ["2022-10-22"])
+		self.assertEqual(self.store.first_date(), "2022-10-22")
+
+	def test_upgrade_version_1_database(self):
+		self.store.close()
+		os.remove(self.database_file)
+		connection = sqlite3.connect(self.database_file)
+		with connection:
+			connection.execute("CREATE TABLE screen_time (date TEXT, process TEXT, running INTEGER, duration TEXT, PRIMARY KEY (date, process))")
+			connection.execute("INSERT INTO screen_time VALUES ('2022-10-21', 'chrome.exe', 0, '2:22')")
+		connection.close()
+
+		self.store = SqliteStore(self.database_file)
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [False, 8520, []]})
+		self.assertEqual(self.store.connection.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+
+	def test_upgrade_version_2_database(self):
+		self.store.close()
+		os.remove(self.database_file)
+		connection = sqlite3.connect(self.database_file)
+		with connection:
+			connection.execute("CREATE TABLE screen_time (date TEXT, process TEXT, running INTEGER, seconds INTEGER, PRIMARY KEY (date, process))")
+			connection.execute("INSERT INTO screen_time VALUES ('2022-10-21', 'chrome.exe', 1, 8520)")
+			connection.execute("PRAGMA user_version = 2")
+		connection.close()
+
+		self.store = SqliteStore(self.database_file)
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [True, 8520, []]})
+		self.store.set_entry("2022-10-21", "chrome.exe", [True, 8580, [[4120, 1666339200, None]]])
+		self.store.commit()
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [True, 8580, [[4120, 1666339200, None]]]})
+
+	def test_upgrade_version_3_database(self):
+		self.store.close()
+		os.remove(self.database_file)
+		connection = sqlite3.connect(self.database_file)
+		with connection:
+			connection.execute(
+				"CREATE TABLE screen_time (date TEXT, process TEXT, running INTEGER, seconds INTEGER, sessions TEXT, PRIMARY KEY (date, process))"
+			)
+			connection.execute("INSERT INTO screen_time VALUES ('2022-10-21', 'chrome.exe', 0, 60, '[]')")
+			connection.execute("PRAGMA user_version = 3")
+		connection.close()
+
+		self.store = SqliteStore(self.database_file)
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [False, 60, []]})
+		histogram = new_histogram()
+		histogram[23] = 120
+		self.store.set_entry("2022-10-21", "chrome.exe", [False, 120, [], histogram])
+		self.store.commit()
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [False, 120, [], histogram]})
+
+	def test_migrate_json_to_sqlite(self):
+		data_file = os.path.join(self.temp_dir.name, "screen_time_data.json")
+		journal_file = os.path.join(self.temp_dir.name, "screen_time_data.journal")
+		with open(data_file, "w") as file:
+			json.dump({"2022-10-21": {"chrome.exe": [False, "0:30"], "cmd.exe": [False, "1:00"]}}, file)
+		with open(journal_file, "w") as journal:
+			journal.write('["2022-10-21", "chrome.exe", [false, "0:31"]]\n')
+
+		self.assertEqual(migrate_json_to_sqlite(data_file, journal_file, self.database_file), 2)
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [False, 1860, []], "cmd.exe": [False, 3600, []]})
+
+	def test_set_time(self):
+		chrome = [True, 0, [[1, 1666339200, None]]]
+		self.store.set_entry("2022-10-21", "chrome.exe", chrome)
+		self.store.commit()
+		chrome[1] = 60
+		chrome.append(new_histogram())
+		chrome[3][9] = 60
+		chrome[2].append([2, 1666339260, None]) # Not recorded, so the row's sessions don't change
+		self.store.set_time("2022-10-21", "chrome.exe", chrome)
+		self.store.commit()
+		self.assertEqual(self.store.read_date("2022-10-21"), {"chrome.exe": [True, 60, [[1, 1666339200, None]], chrome[3]]})
+
+class TestShardedStore(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.history_dir = os.path.join(self.temp_dir.name, "screen_time_history")
+		self.store = ShardedStore(self.history_dir)
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def read_manifest(self):
+		with open(os.path.join(self.history_dir, "manifest.json")) as file:
+			return json.load(file)["shards"]
+
+	def test_commit_closes_older_months(self):
+		screen_time_data = {"2022-10-31": {"chrome.exe": [True, 600, []]}}
+		self.store.set_entry("2022-10-31", "chrome.exe", screen_time_data["2022-10-31"]["chrome.exe"])
+		self.store.commit(screen_time_data)
+		self.assertEqual(self.read_manifest(), {"2022-10": {"file": "2022-10.json", "closed": False}})
+
+		screen_time_data["2022-11-01"] = {"chrome.exe": [True, 20, []]}
+		self.store.set_entry("2022-10-31", "chrome.exe", [False, 640, []])
+		self.store.set_entry("2022-11-01", "chrome.exe", screen_time_data["2022-11-01"]["chrome.exe"])
+		self.store.commit(screen_time_data)
+
+		self.assertEqual(screen_time_data, {"2022-11-01": {"chrome.exe": [True, 20, []]}}) # October is no longer held in memory
+		self.assertEqual(self.read_manifest(), {
+			"2022-10": {"file": "2022-10.json.gz", "closed": True}, "2022-11": {"file": "2022-11.json", "closed": False}
+		})
+		self.assertEqual(sorted(os.listdir(self.history_dir)), ["2022-10.json.gz", "2022-11.journal", "2022-11.json", "manifest.json"])
+		with gzip.open(os.path.join(self.history_dir, "2022-10.json.gz"), "rt") as file:
+			self.assertEqual(json.load(file)["dates"], {"2022-10-31": {"chrome.exe": [False, 640, []]}})
+
+		self.assertIsNone(ShardedStore(os.path.join(self.temp_dir.name, "empty")).first_date())
+		store = ShardedStore(self.history_dir)
+		self.assertEqual(store.first_date(), "2022-10-31")
+		self.assertEqual(store.read_date("2022-10-31"), {"chrome.exe": [False, 640, []]})
+		self.assertEqual(list(store.read_range("2022-10-01", "2022-11-30")), ["2022-10-31", "2022-11-01"])
+		self.assertEqual(store.read_process("chrome.exe", "2022-11-01", "2022-11-01"), {"2022-11-01": {"chrome.exe": [True, 20, []]}})
+		self.assertEqual(store.load("2022-11-02"), {"2022-11-01": {"chrome.exe": [True, 20, []]}})
+
+	def test_load_closes_months_left_open(self):
+		self.store.set_entry("2022-10-31", "chrome.exe", [False, 600, []])
+		self.store.commit({})
+		store = ShardedStore(self.history_dir, compress=False)
+		self.assertEqual(store.load("2022-11-01"), {})
+		store.commit({})
+		self.assertEqual(self.read_manifest(), {"2022-10": {"file": "2022-10.json", "closed": True}})
+		self.assertEqual(sorted(os.listdir(self.history_dir)), ["2022-10.json", "manifest.json"])
+
+	def test_reopen_closed_month(self):
+		self.store.set_entry("2022-10-31", "chrome.exe", [False, 600, []])
+		self.store.set_entry("2022-11-01", "chrome.exe", [False, 60, []])
+		self.store.commit({})
+		store = ShardedStore(self.history_dir)
+		store.set_entry("2022-10-30", "chrome.exe", [False, 120, []])
+		store.commit({})
+		self.assertFalse(self.read_manifest()["2022-10"]["closed"])
+		self.assertEqual(list(store.read_range("2022-10-01", "2022-10-31")), ["2022-10-30", "2022-10-31"])
+
+	def test_remove_dates_of_closed_month(self):
+		for date in ("2022-09-29", "2022-09-30", "2022-10-01"):
+			self.store.set_entry(date, "chrome.exe", [False, 60, []])
+		self.store.commit({})
+		self.assertEqual(self.store.read_date("2022-09-29"), {"chrome.exe": [False, 60, []]})
+
+		self.store.remove_date("2022-09-29")
+		self.store.commit({})
+		self.assertIsNone(self.store.read_date("2022-09-29")) # The cached shard was dropped when it was rewritten
+		self.assertEqual(list(self.store.read_range("2022-09-01", "2022-09-30")), ["2022-09-30"])
+
+		self.store.remove_date("2022-09-30")
+		self.store.commit({})
+		self.assertNotIn("2022-09.json.gz", os.listdir(self.history_dir))
+		self.assertEqual(ShardedStore(self.history_dir).months("2022-01-01", "2022-12-31"), ["2022-10"])
+
+	def test_migrate_json_to_shards(self):
+		data_file = os.path.join(self.temp_dir.name, "screen_time_data.json")
+		with open(data_file, "w") as file:
+			json.dump({"2022-09-30": {"chrome.exe": [False, "0:30"]}, "2022-10-21": {"chrome.exe": [False, "1:00"]}}, file)
+		self.assertEqual(migrate_json_to_shards(data_file, os.path.join(self.temp_dir.name, "missing.journal"), self.history_dir), 2)
+		store = ShardedStore(self.history_dir)
+		self.assertTrue(self.read_manifest()["2022-09"]["closed"])
+		self.assertEqual(store.read_range("2022-09-01", "2022-10-31"), {
+			"2022-09-30": {"chrome.exe": [False, 1800, []]}, "2022-10-21": {"chrome.exe": [False, 3600, []]}
+		})
@@ -0,0 +1,45 @@
+from unittest import TestCase
+from target_matcher import TargetMatcher, TargetList, is_pattern
+
+class TestTargetMatcher(TestCase):
+	def setUp(self):
+		self.matcher = TargetMatcher(["chrome.exe", "plugin_host-*.exe", "firefox.exe", "note?ad.exe"])
+
+	def test_is_pattern(self):
+		self.assertTrue(is_pattern("plugin_host-*.exe"))
+		self.assertTrue(is_pattern("note[pb]ad.exe"))
+		self.assertFalse(is_pattern("chrome.exe"))
+
+	def test_match(self):
+		self.assertEqual(self.matcher.match("chrome.exe"), "chrome.exe")
+		self.assertEqual(self.matcher.match("plugin_host-3.8.exe"), "plugin_host-*.exe")
+		self.assertEqual(self.matcher.match("notepad.exe"), "note?ad.exe")
+		self.assertIsNone(self.matcher.match("chrome.exe.bak"))
+		self.assertIsNone(self.matcher.match("cmd.exe"))
+
+	def test_matched_targets(self):
+		process_names = ["chrome.exe", "cmd.exe", "plugin_host-3.3.exe", "chrome.exe", "plugin_host-3.8.exe"]
+		self.assertEqual(self.matcher.matched_targets(process_names), {"chrome.exe", "plugin_host-*.exe"})
+		self.assertEqual(TargetMatcher(["chrome.exe"]).matched_targets(["firefox.exe"]), set())
+
+	def test_aliases(self):
+		matcher = TargetMatcher(["chrome.exe"], {"sublime_text.exe": "sublime", "plugin_host-*.exe": "sublime"})
+		self.assertEqual(matcher.match("plugin_host-3.8.exe"), "sublime")
+		self.assertEqual(matcher.match("sublime_text.exe"), "sublime")
+		self.assertEqual(matcher.match("chrome.exe"), "chrome.exe")
+		self.assertIsNone(matcher.match("sublime"))
+
+	def test_target_list(self):
+		targets = TargetList([
+			"cmd.exe", {"alias": "sublime", "names": ["sublime_text.exe", "plugin_host-*.exe"]},
+			{"group": "browsers", "members": ["chrome.exe", "firefox.exe", "chrome.exe"]},
+			{"group": "work", "members": ["sublime", "cmd.exe", "browsers"]}, 5, {"group": "empty"},
+		])
+		self.assertEqual(targets.names, ["cmd.exe", "sublime", "chrome.exe", "firefox.exe", "browsers", "work"])
+		self.assertEqual(targets.processes, ["cmd.exe", "chrome.exe", "firefox.exe"]) # Members that weren't listed are added
+		self.assertEqual(targets.groups, {"browsers": ["chrome.exe", "firefox.exe"], "work": ["sublime", "cmd.exe"]})
+		self.assertEqual(targets.group_index["cmd.exe"], ["work"])
+		self.assertEqual(targets.matcher().match("plugin_host-3.3.exe"), "sublime")
+		self.assertIsNone(targets.matcher().match("browsers")) # Groups aren't process names
+		self.assertEqual(targets.with_groups({"chrome.exe", "firefox.exe"}), {"chrome.exe", "firefox.exe", "browsers"})
+		self.assertEqual(TargetList(["cmd.exe"]).with_groups({"cmd.exe"}), {"cmd.exe"})
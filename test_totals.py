@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import tempfile, os
+from totals import MonthlyTotals, split_range, range_totals, days_in_range, top_processes
+
+class TestTotals(TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.totals_file = os.path.join(self.temp_dir.name, "screen_time_totals.json")
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def test_add_and_save(self):
+		totals = MonthlyTotals(self.totals_file)
+		self.assertFalse(totals.exists)
+		totals.add("2022-10-21", "chrome.exe", 60)
+		totals.add("2022-10-22", "chrome.exe", 30)
+		totals.add("2022-10-22", "cmd.exe", 0)
+		self.assertTrue(totals.changed)
+		totals.save()
+		self.assertFalse(totals.changed)
+		totals = MonthlyTotals(self.totals_file)
+		self.assertTrue(totals.exists)
+		self.assertEqual(totals.months, {"2022-10": {"chrome.exe": 90}})
+
+	def test_remove(self):
+		totals = MonthlyTotals(self.totals_file)
+		totals.months = {"2022-10": {"chrome.exe": 90, "cmd.exe": 30}}
+		totals.remove("2022-10-22", "chrome.exe", 30)
+		totals.remove("2022-10-22", "cmd.exe", 30)
+		totals.remove("2022-11-01", "chrome.exe", 30) # A month without totals is left alone
+		self.assertTrue(totals.changed)
+		self.assertEqual(totals.months, {"2022-10": {"chrome.exe": 60}})
+
+	def test_build(self):
+		totals = MonthlyTotals(self.totals_file)
+		totals.build({"2022-10-21": {"chrome.exe": [False, 60, []]}, "2022-11-01": {"chrome.exe": [True, 30, []]}}, {"2022-09": {"chrome.exe": 5}})
+		self.assertEqual(totals.months, {"2022-09": {"chrome.exe": 5}, "2022-10": {"chrome.exe": 60}, "2022-11": {"chrome.exe": 30}})
+
+	def test_split_range(self):
+		months = {"2022-09": {}, "2022-10": {}, "2022-11": {}}
+		self.assertEqual(
+			split_range("2022-08-20", "2022-11-15", "2022-11-15", months),
+			(["2022-09", "2022-10", "2022-11"], [("2022-08-20", "2022-08-31")]) # November is covered up to today
+		)
+		self.assertEqual(
+			split_range("2022-09-15", "2022-10-10", "2022-12-01", months), ([], [("2022-09-15", "2022-10-10")])
+		)
+		self.assertEqual(
+			split_range("2022-09-02", "2022-11-30", "2022-12-01", months), (["2022-10", "2022-11"], [("2022-09-02", "2022-09-30")])
+		)
+
+	def test_range_totals(self):
+		totals = MonthlyTotals(self.totals_file)
+		totals.months = {"2022-10": {"chrome.exe": 3600, "cmd.exe": 60}}
+		read_range = Mock(return_value={"2022-09-30": {"chrome.exe": [False, 600, []]}})
+		self.assertEqual(
+			range_totals(totals, read_range, "2022-09-30", "2022-10-31", "2022-11-15"), {"chrome.exe": 4200, "cmd.exe": 60}
+		)
+		read_range.assert_called_once_with("2022-09-30", "2022-09-30")
+
+	def test_days_and_top_processes(self):
+		self.assertEqual(days_in_range("2022-10-01", "2022-10-31", "2022-10-10"), 10)
+		self.assertEqual(days_in_range("2022-10-11", "2022-10-31", "2022-10-10"), 0)
+		self.assertEqual(top_processes({"a.exe": 60, "b.exe": 600, "c.exe": 60}, 2), [("b.exe", 600), ("a.exe", 60)])
+		self.assertEqual(len(top_processes({"a.exe": 60, "b.exe": 600})), 2)
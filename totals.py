@@ -0,0 +1,111 @@
+import json
+from datetime import date as Date, timedelta
+from storage import SCHEMA_VERSION, write_json_atomically
+from retention import period_bounds
+
+TOTALS_FILE = "screen_time_totals.json"
+
+class MonthlyTotals:
+	"""
+	Total seconds of each process for every month, kept up to date by the monitor as each tick credits time. A range
+	query reads the months it covers from here and only reads the data of the days at its edges, so a year costs about
+	as much as a day. The file is {"schema_version": ..., "months": {month: {process: seconds}}}.
+	"""
+
+	def __init__(self, file_name=TOTALS_FILE):
+		self.file_name = file_name
+		self.months = {}
+		self.exists = False # False until the totals are read from or written to the file
+		self.changed = False # True when there are changes that haven't been saved
+		try:
+			with open(file_name) as file:
+				file_data = json.load(file)
+		except (FileNotFoundError, json.decoder.JSONDecodeError):
+			return
+		if type(file_data) == dict and type(file_data.get("months")) == dict:
+			self.months = file_data["months"]
+			self.exists = True
+
+	def add(self, date, process, seconds):
+		"""Adds seconds to process's total for date's month. It's called for every credit so it has to stay O(1)."""
+		if seconds:
+			month_totals = self.months.setdefault(date[:7], {})
+			month_totals[process] = month_totals.get(process, 0) + seconds
+			self.changed = True
+
+	def remove(self, date, process, seconds):
+		"""Takes seconds off process's total for date's month, as when process's data for date is removed"""
+		month_totals = self.months.get(date[:7], {})
+		if seconds and process in month_totals:
+			month_totals[process] -= seconds
+			if month_totals[process] <= 0:
+				del month_totals[process]
+			self.changed = True
+
+	def build(self, screen_time_data, month_rollups=None):
+		"""
+		Sets the totals from the data of every date. month_rollups is the {month: {process: seconds}} of the months whose
+		days were removed by the retention policy.
+		"""
+		self.months = {month: dict(totals) for month, totals in (month_rollups or {}).items()}
+		for date, processes_data in screen_time_data.items():
+			for process, process_data in processes_data.items():
+				self.add(date, process, process_data[1])
+		self.changed = True
+
+	def to_file_data(self):
+		"""Returns a copy of the totals to be saved, possibly by another thread, and marks them as saved"""
+		self.changed = False
+		self.exists = True
+		return {"schema_version": SCHEMA_VERSION, "months": {month: dict(totals) for month, totals in self.months.items()}}
+
+	def save(self, file_data=None):
+		write_json_atomically(file_data or self.to_file_data(), self.file_name)
+
+def split_range(start_date, end_date, today, months):
+	"""
+	Splits the range from start_date to end_date (both inclusive) into the months that it covers and that are in
+	months, and the spans of days left over as (first, last) pairs. A month is covered if the range holds all of it
+	up to today, since there's no data after today.
+	"""
+	end_date = min(end_date, today)
+	covered, spans = [], []
+	month_start = Date.fromisoformat(start_date).replace(day=1)
+	while str(month_start) <= end_date:
+		month = str(month_start)[:7]
+		first_date, last_date = period_bounds(month)
+		if start_date <= first_date and min(last_date, today) <= end_date and month in months:
+			covered.append(month)
+		else:
+			span = (max(first_date, start_date), min(last_date, end_date))
+			if spans and str(Date.fromisoformat(spans[-1][1]) + timedelta(days=1)) == span[0]:
+				span = (spans.pop()[0], span[1]) # Joins the days of adjacent months into one read
+			spans.append(span)
+		month_start = Date.fromisoformat(last_date) + timedelta(days=1)
+	return covered, spans
+
+def range_totals(monthly_totals, read_range, start_date, end_date, today):
+	"""
+	Returns the total seconds of each process from start_date to end_date. Whole months come from monthly_totals and
+	the other days from read_range(first, last), which returns {date: {process: process_data}}.
+	"""
+	covered, spans = split_range(start_date, end_date, today, monthly_totals.months)
+	totals = {}
+	for month in covered:
+		for process, seconds in monthly_totals.months[month].items():
+			totals[process] = totals.get(process, 0) + seconds
+	for first_date, last_date in spans:
+		for processes_data in read_range(first_date, last_date).values():
+			for process, process_data in processes_data.items():
+				totals[process] = totals.get(process, 0) + process_data[1]
+	return totals
+
+def days_in_range(start_date, end_date, today):
+	"""Returns the number of days from start_date to end_date, not counting the days after today"""
+	days = (Date.fromisoformat(min(end_date, today)) - Date.fromisoformat(start_date)).days + 1
+	return max(days, 0)
+
+def top_processes(totals, count=None):
+	"""Returns (process, seconds) pairs of the count processes that ran the longest (all of them if count is None)"""
+	ranking = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+	return ranking if count is None else ranking[:count]